@@ -0,0 +1,91 @@
+# deptreepy as a library, for programs that run many queries in the same process:
+# a Corpus is parsed once into columns, and a command compiled once into a Pipe, which
+# gives its results as iterators of DepTree, WordLine or str, or lists of statistics,
+# the same as the command line prints them
+#
+#   corpus = Corpus.from_file('en_ewt-ud-train.conllu')
+#   subjects = compile('match_wordlines DEPREL nsubj | statistics POS')
+#   for (pos,), count in subjects(corpus):
+#       ...
+#
+# Each run builds new trees and wordlines from the columns, so that stages that change
+# them in place do not change the corpus for the next run.
+
+from typing import Iterable
+from trees import *
+from corpus import is_corpus, corpus_columns, CorpusColumns, CorpusStore
+from operations import (Operation, parse_operation_pipe, preprocess_operation, optimize_operation,
+                        corpus_input_operation)
+
+
+class Corpus:
+    "the columns of a corpus, from which each query reads its trees and wordlines"
+
+    def __init__(self, columns: CorpusColumns):
+        self.columns = columns
+
+    @classmethod
+    def from_file(cls, path: str):
+        "a CoNLL-U file, read into memory, or a corpus store, whose arrays are memory-mapped"
+        if is_corpus(path):
+            return cls(CorpusStore(path))
+        with open(path) as file:
+            return cls.from_lines(file)
+
+    @classmethod
+    def from_lines(cls, lines: Iterable[str]):
+        "CoNLL-U lines, read into memory"
+        return cls(CorpusColumns(*corpus_columns(lines)))
+
+    @classmethod
+    def from_trees(cls, trees: Iterable[DepTree]):
+        "trees in memory, kept as the CoNLL-U lines of their comments and wordlines"
+        return cls.from_lines(line for tree in trees
+                                  for line in tree.comments + list(map(str, mark_matches(tree).wordlines())) + [''])
+
+    def __len__(self):
+        return len(self.columns)
+
+    def lines(self) -> Iterable[str]:
+        return self.columns.lines()
+
+    def trees(self) -> Iterable[DepTree]:
+        return self.columns.trees()
+
+    def wordlines(self) -> Iterable[WordLine]:
+        return self.columns.wordlines()
+
+    def query(self, command: str) -> Iterable:
+        "the results of a command on the corpus, compiled for this query only"
+        return compile(command)(self)
+
+
+class Pipe:
+    "a command parsed and type-checked once, which can be run on corpora many times"
+
+    def __init__(self, command: str):
+        self.command = command
+        self.operation = preprocess_operation(parse_operation_pipe(command))
+        self.last = None, None   # the columns of the last corpus and the plan for them
+
+    @property
+    def valtype(self):
+        "the type of the results"
+        return self.operation.valtype
+
+    def plan(self, corpus: Corpus) -> Operation:
+        "the operation that runs the command on the corpus, reading from its columns"
+        columns, oper = self.last
+        if columns is not corpus.columns:
+            oper, _ = optimize_operation(corpus_input_operation(self.operation, corpus.columns))
+            self.last = corpus.columns, oper
+        return oper
+
+    def __call__(self, corpus: Corpus) -> Iterable:
+        "the results on a corpus, as a lazy iterator if the command gives a stream"
+        return self.plan(corpus)(corpus.lines())
+
+
+def compile(command: str) -> Pipe:
+    "compile a command, such as 'match_trees (POS VERB) | count_trees', into a Pipe"
+    return Pipe(command)
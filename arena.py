@@ -0,0 +1,72 @@
+# a corpus in shared memory: the arrays and strings of corpus columns copied into one block,
+# and handles to ranges of sentences that worker processes read without copying the arrays;
+# the string table is decoded once in each worker, since columns look strings up by code
+# in an array of them
+
+from dataclasses import dataclass
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+from corpus import CorpusColumns
+
+ALIGNMENT = 8   # bytes, so that every array starts at an aligned offset
+
+
+@dataclass
+class ArenaHandle:
+    "a range of sentences in an arena, cheap to send to another process"
+    name: str       # the name of the shared memory block
+    layout: tuple   # (array name, dtype, offset, length) for each array
+    meta: dict      # the description of the corpus
+    begin: int
+    end: int
+
+
+class CorpusArena:
+    "corpus columns copied into a block of shared memory, which is removed when the arena is closed"
+
+    def __init__(self, columns: CorpusColumns):
+        arrays = columns.arrays()
+        arrays['strings'] = np.frombuffer('\n'.join(columns.strings.tolist()).encode('utf-8'), dtype=np.uint8)
+        layout = []
+        size = 0
+        for name, arr in arrays.items():
+            layout.append((name, arr.dtype.str, size, len(arr)))
+            size += -(-arr.nbytes // ALIGNMENT) * ALIGNMENT
+        self.shm = SharedMemory(create=True, size=max(size, 1))
+        for (name, dtype, offset, length), arr in zip(layout, arrays.values()):
+            np.ndarray((length,), dtype, buffer=self.shm.buf, offset=offset)[:] = arr
+        self.layout = tuple(layout)
+        self.meta = columns.meta
+        self.sentences = np.array(columns.sentences)
+
+    def handles(self, parts: int, end: int) -> list[ArenaHandle]:
+        "the sentences from 0 to end split into at most parts ranges of about the same number of words"
+        words = self.sentences[end]
+        bounds = np.searchsorted(self.sentences[:end+1], np.linspace(0, words, parts + 1)).tolist()
+        bounds[0], bounds[-1] = 0, end
+        return [ArenaHandle(self.shm.name, self.layout, self.meta, b, e)
+                    for b, e in zip(bounds, bounds[1:]) if b < e]
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+ATTACHED = {}   # the arenas attached in this process: name: (shared memory, columns)
+
+
+def attach(handle: ArenaHandle) -> CorpusColumns:
+    "the columns of the arena of a handle, attached once in each process, with its own copy of the strings"
+    if handle.name not in ATTACHED:
+        shm = SharedMemory(handle.name)
+        arrays = {name: np.ndarray((length,), dtype, buffer=shm.buf, offset=offset)
+                      for name, dtype, offset, length in handle.layout}
+        strings = arrays.pop('strings').tobytes().decode('utf-8').split('\n')
+        ATTACHED[handle.name] = shm, CorpusColumns(handle.meta, arrays, strings)
+    return ATTACHED[handle.name][1]
@@ -0,0 +1,197 @@
+# running pipes on shards of a corpus in worker servers over TCP, with a coordinator that
+# sends requests, collects the results in the order of the shards and retries failed shards
+#
+# A message is a kind byte, J for JSON or P for pickle, a length, and the data. Requests to
+# workers are JSON, so that a worker does not unpickle anything it is sent; results from
+# workers are pickled, so that the coordinator must only connect to workers it trusts.
+
+import json
+import os
+import pickle
+import queue
+import socket
+import socketserver
+import struct
+import threading
+from typing import Iterable, Callable
+
+RETRIES = 3        # times a shard is sent again after a worker has failed
+TIMEOUT = 600      # seconds to wait for a message from a worker
+CHUNK_SIZE = 1000  # items sent in one message
+
+
+class WorkerError(Exception):
+    "an error in running a request in a worker, not caused by the connection"
+    pass
+
+
+def send_message(sock: socket.socket, obj, pickled: bool=True):
+    data = pickle.dumps(obj, pickle.HIGHEST_PROTOCOL) if pickled else json.dumps(obj).encode('utf-8')
+    sock.sendall((b'P' if pickled else b'J') + struct.pack('<Q', len(data)) + data)
+
+
+def receive_exactly(sock: socket.socket, n: int) -> bytes:
+    data = bytearray()
+    while len(data) < n:
+        if not (chunk := sock.recv(min(n - len(data), 1 << 20))):
+            raise ConnectionError('connection closed')
+        data += chunk
+    return bytes(data)
+
+
+def receive_message(sock: socket.socket, pickled: bool=True):
+    "the next message, which must be pickled or JSON as expected"
+    header = receive_exactly(sock, 9)
+    if header[:1] != (b'P' if pickled else b'J'):
+        raise ConnectionError('unexpected kind of message')
+    data = receive_exactly(sock, struct.unpack('<Q', header[1:])[0])
+    return pickle.loads(data) if pickled else json.loads(data)
+
+
+def read_manifest(path: str) -> list[str]:
+    "the shards listed in a manifest file, one path per line, relative to the directory of the file"
+    with open(path) as file:
+        names = [line.strip() for line in file if line.strip() and not line.startswith('#')]
+    return [os.path.abspath(os.path.join(os.path.dirname(path), name)) for name in names]
+
+
+def write_shards(lines: Iterable[str], directory: str, size: int) -> Iterable[str]:
+    "split CoNLL-U lines into shards of size stanzas in directory, with a manifest, yielding the shard names"
+    os.makedirs(directory, exist_ok=True)
+    names = []
+    file = None
+    stanzas = 0
+    for line in lines:
+        if file is None:
+            names.append('shard-%05d.conllu' % len(names))
+            file = open(os.path.join(directory, names[-1]), 'w')
+        file.write(line if line.endswith('\n') else line + '\n')
+        if not line.strip():
+            stanzas += 1
+            if stanzas == size:
+                file.close()
+                file = None
+                stanzas = 0
+                yield names[-1]
+    if file:
+        file.close()
+        yield names[-1]
+    with open(os.path.join(directory, 'manifest.txt'), 'w') as manifest:
+        manifest.write(''.join(name + '\n' for name in names))
+
+
+def serve_worker(host: str, port: int, run: Callable[[dict], Iterable]):
+    """
+    answer requests until stopped: each request gets ('items', chunk) messages with the
+    results of run(request), or one ('part', result) if run gives one, then ('end', None),
+    or ('error', message) if running fails
+    """
+    class Handler(socketserver.BaseRequestHandler):
+        def handle(self):
+            try:
+                request = receive_message(self.request, pickled=False)
+            except (ConnectionError, ValueError):
+                return
+            try:
+                result = run(request)
+                if request.get('merged'):
+                    send_message(self.request, ('part', result))
+                else:
+                    chunk = []
+                    for item in result:
+                        chunk.append(item)
+                        if len(chunk) >= CHUNK_SIZE:
+                            send_message(self.request, ('items', chunk))
+                            chunk = []
+                    send_message(self.request, ('items', chunk))
+            except OSError:
+                return
+            except Exception as e:
+                send_message(self.request, ('error', type(e).__name__ + ': ' + str(e)[:1000]))
+                return
+            send_message(self.request, ('end', None))
+
+    socketserver.ThreadingTCPServer.allow_reuse_address = True
+    with socketserver.ThreadingTCPServer((host, port), Handler) as server:
+        server.serve_forever()
+
+
+def parse_address(address: str) -> tuple[str, int]:
+    "host:port, or just port on localhost"
+    host, _, port = address.rpartition(':')
+    return host or 'localhost', int(port)
+
+
+def request_part(address: tuple[str, int], request: dict, timeout: float=TIMEOUT):
+    "the result of a request from a worker, a list of items or a part to be merged"
+    with socket.create_connection(address, timeout) as sock:
+        send_message(sock, request, pickled=False)
+        items = []
+        while True:
+            kind, value = receive_message(sock)
+            match kind:
+                case 'items':
+                    items.extend(value)
+                case 'part':
+                    items = value
+                case 'end':
+                    return items
+                case 'error':
+                    raise WorkerError(value)
+
+
+def distributed_results(workers: list[tuple[str, int]], requests: list[dict],
+                        retries: int=RETRIES, timeout: float=TIMEOUT) -> Iterable:
+    """
+    the results of requests, in their order, run by the workers in one thread each;
+    a worker whose connection fails is not used again, and its request is given
+    to another worker, at most retries times for each request
+    """
+    pending = queue.Queue()
+    for i in range(len(requests)):
+        pending.put(i)
+    results = {}
+    attempts = [0] * len(requests)
+    state = {'alive': len(workers), 'error': None}
+    changed = threading.Condition()
+    stopped = threading.Event()
+
+    def work(address):
+        while not stopped.is_set():
+            try:
+                i = pending.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            try:
+                part = request_part(address, requests[i], timeout)
+            except WorkerError as e:
+                with changed:
+                    state['error'] = e
+                    changed.notify_all()
+                return
+            except OSError as e:
+                with changed:
+                    attempts[i] += 1
+                    if attempts[i] > retries:
+                        state['error'] = ConnectionError('shard ' + str(i) + ' failed ' + str(attempts[i]) + ' times: ' + str(e))
+                    else:
+                        pending.put(i)
+                    state['alive'] -= 1
+                    changed.notify_all()
+                return
+            with changed:
+                results[i] = part
+                changed.notify_all()
+
+    for address in workers:
+        threading.Thread(target=work, args=(address,), daemon=True).start()
+    try:
+        for i in range(len(requests)):
+            with changed:
+                changed.wait_for(lambda: i in results or state['error'] or not state['alive'])
+                if i not in results:
+                    raise state['error'] or ConnectionError('no workers left')
+                part = results.pop(i)
+            yield part
+    finally:
+        stopped.set()
@@ -0,0 +1,140 @@
+# corpora and helpers shared by the tests: a generated corpus of valid trees, and stanzas
+# that are not regular, with multiword tokens, empty nodes, words out of order, words not
+# reachable from the root, and repeated IDs with and without a cycle
+
+import io
+import random
+import signal
+from contextlib import redirect_stdout
+import pytest
+from operations import (parse_operation_pipe, preprocess_operation, postprocess_operation,
+                        optimize_operation, parse_execution_options, execute_pipe_on_strings, open_input)
+
+POS = 'NOUN VERB ADJ ADP DET PRON AUX ADV PUNCT PROPN CCONJ NUM'.split()
+DEPRELS = 'nsubj obj obl det amod case advmod punct nmod nmod:poss aux cc conj mark ccomp xcomp'.split()
+WORDS = 'the a dog cat saw runs big small in on of I you he she it was is be and or politics that this'.split()
+FEATS = ['_', 'Number=Sing', 'Number=Plur', 'Mood=Ind|Tense=Past|VerbForm=Fin',
+         'Mood=Ind|Tense=Pres|VerbForm=Fin', 'Definite=Def|PronType=Art', 'VerbForm=Inf']
+
+IRREGULAR = """\
+# sent_id = mwt
+1-2	dela	dela	ADP	_	_	_	_	_	_
+1	de	de	ADP	_	_	3	case	_	_
+2	la	la	DET	_	_	3	det	_	_
+3	casa	casa	NOUN	_	_	0	root	_	_
+4	big	big	ADJ	_	_	3	amod	_	_
+
+# sent_id = empty
+1	the	the	DET	_	_	2	det	_	_
+2	dog	dog	NOUN	_	_	0	root	_	_
+2.1	is	is	AUX	_	_	_	_	_	_
+3	big	big	ADJ	_	_	2	amod	_	_
+
+# sent_id = order
+2	dog	dog	NOUN	_	_	0	root	_	_
+1	the	the	DET	_	_	2	det	_	_
+3	runs	runs	VERB	_	Tense=Past	2	nsubj	_	_
+
+# sent_id = unreachable
+1	the	the	DET	_	_	2	det	_	_
+2	dog	dog	NOUN	_	_	0	root	_	_
+3	cat	cat	NOUN	_	_	4	nmod	_	_
+4	big	big	ADJ	_	_	3	amod	_	_
+5	runs	runs	VERB	_	_	2	nsubj	_	_
+
+""".splitlines()
+
+REPEATED_IDS = """\
+# sent_id = repeated
+1	a	a	X	_	_	0	root	_	_
+2	b	b	X	_	_	1	dep	_	_
+2	c	c	X	_	_	1	dep	_	_
+3	d	d	X	_	_	2	dep	_	_
+
+""".splitlines()
+
+REPEATED_ID_CYCLE = """\
+# sent_id = repeated_cycle
+1	a	a	X	_	_	0	root	_	_
+1	b	b	X	_	_	1	dep	_	_
+
+""".splitlines()
+
+
+def generated_corpus(n: int, seed: int=1) -> list[str]:
+    "the lines of n random trees, the same for the same seed"
+    rand = random.Random(seed)
+    lines = []
+    for s in range(n):
+        length = rand.randint(1, 20)
+        attached = [rand.randint(1, length)]
+        heads = {attached[0]: 0}
+        for i in rand.sample([i for i in range(1, length + 1) if i != attached[0]], length - 1):
+            heads[i] = rand.choice(attached)
+            attached.append(i)
+        lines += ['# sent_id = s' + str(s), '# text = sentence ' + str(s)]
+        for i in range(1, length + 1):
+            word = rand.choice(WORDS)
+            deprel = 'root' if heads[i] == 0 else rand.choice(DEPRELS)
+            lines.append('\t'.join([str(i), word, word.lower(), rand.choice(POS), '_',
+                                    rand.choice(FEATS), str(heads[i]), deprel, '_', '_']))
+        lines.append('')
+    return lines
+
+
+@pytest.fixture
+def corpus() -> list[str]:
+    return generated_corpus(200) + IRREGULAR
+
+
+@pytest.fixture
+def corpus_file(tmp_path, corpus) -> str:
+    "the corpus in a CoNLL-U file"
+    path = tmp_path / 'corpus.conllu'
+    path.write_text('\n'.join(corpus) + '\n')
+    return str(path)
+
+
+@pytest.fixture
+def store(tmp_path, corpus_file) -> str:
+    "the corpus in a corpus store"
+    path = str(tmp_path / 'corpus.store')
+    execute(['--input', corpus_file, 'convert_corpus ' + path])
+    return path
+
+
+@pytest.fixture
+def timeout():
+    "fail a test that runs for more than 10 seconds, instead of hanging"
+    def expired(signum, frame):
+        raise TimeoutError
+    previous = signal.signal(signal.SIGALRM, expired)
+    signal.alarm(10)
+    yield
+    signal.alarm(0)
+    signal.signal(signal.SIGALRM, previous)
+
+
+def run_command(command: str, lines: list[str], optimize: bool=True) -> list:
+    "the results of a command on lines, as strings or statistics, with its stages fused or not"
+    op = preprocess_operation(parse_operation_pipe(command))
+    if optimize:
+        op, _ = optimize_operation(op)
+    return list(postprocess_operation(op)(lines))
+
+
+def outcome(command: str, lines: list[str], optimize: bool=True):
+    "the results of a command, or the type of the exception it raises"
+    try:
+        return run_command(command, lines, optimize)
+    except Exception as e:
+        return type(e)
+
+
+def execute(args: list[str], lines: list[str]=()) -> list[str]:
+    "the lines printed by deptreepy.py with args, reading lines or --input, without the header of the pipe"
+    options, (command, *_) = parse_execution_options(args)
+    output = io.StringIO()
+    with redirect_stdout(output):
+        execute_pipe_on_strings(command, open_input(options.input) if options.input else iter(lines), options)
+    return [line for line in output.getvalue().split('\n')[:-1] if not line.startswith('#  ')]
@@ -0,0 +1,274 @@
+# a columnar store of a CoNLL-U corpus in a directory: one array of integer codes per field,
+# a table of the strings they code, head positions, sentence offsets and comments
+#
+# The arrays are .npy files, memory-mapped when read, so that opening a store does not read
+# it and processes reading the same store share its pages. The files are
+#   corpus.json       the number of sentences, words and strings, and a hash of the source
+#   strings.txt       the strings, one per line, coded by their line number from 0
+#   ID.npy ... MISC.npy   codes of the fields of all words, one array per field
+#   heads.npy         for each word, the position of its head in the sentence, -1 if none
+#   roots.npy         for each sentence, the position of its root, -1 if none,
+#                     -2 if the tree must be built by build_deptree, e.g. for repeated IDs
+#   sentences.npy     the offsets of sentences in the word arrays, one more than sentences
+#   comments.npy      codes of the comments of all sentences
+#   comment_offsets.npy  the offsets of sentences in comments.npy
+
+import hashlib
+import json
+import os
+from array import array
+from typing import Iterable
+import numpy as np
+from trees import *
+from vectorstats import count_rows, add_counts
+
+CORPUS_META = 'corpus.json'
+CORPUS_VERSION = 1
+CORPUS_FIELDS = list(WordLine.__dataclass_fields__)
+BLOCK_SIZE = 1000   # sentences decoded at a time
+
+
+def is_corpus(path: str) -> bool:
+    "if path is a directory with a corpus store"
+    return os.path.isfile(os.path.join(path, CORPUS_META))
+
+
+def read_stanzas(lines: Iterable[str]) -> Iterable[tuple[list[str], list[WordLine], bool]]:
+    """
+    comments and wordlines of each stanza, as in conllu2stanzas, and if the stanza was
+    ended by an empty line; the last stanza is given even if it is not ended
+    """
+    comms = []
+    nodes = []
+    for line in lines:
+        if line.startswith('#'):
+            comms.append(line.strip())
+        elif line.strip():
+            nodes.append(read_wordline(line))
+        else:
+            yield comms, nodes, True
+            comms = []
+            nodes = []
+    if comms or nodes:
+        yield comms, nodes, False
+
+
+def stanza_heads(nodes: list[WordLine]) -> tuple[list[int], int]:
+    "the positions of the heads of wordlines and of the root, as described above"
+    positions = {}
+    for i, n in enumerate(nodes):
+        positions.setdefault(n.ID, i)
+    heads = [positions.get(n.HEAD, -1) for n in nodes]
+    if len(positions) < len(nodes) or '0' in positions or any(h == i for i, h in enumerate(heads)):
+        return [-1] * len(nodes), -2
+    root = next((i for i, n in enumerate(nodes) if n.HEAD == '0'), -1)
+    return heads, root
+
+
+CORPUS_ARRAYS = {   # the arrays besides the fields, and their types
+    'heads': np.int32, 'roots': np.int32, 'sentences': np.int64,
+    'comments': np.uint32, 'comment_offsets': np.int64
+    }
+
+
+def corpus_columns(lines: Iterable[str]) -> tuple[dict, dict, list[str]]:
+    "the description, arrays and strings of CoNLL-U lines, as stored in a corpus store"
+    digest = hashlib.blake2b()
+    strings = {}
+
+    def code(s):
+        return strings.setdefault(s, len(strings))
+
+    def hashed(lines):
+        for line in lines:
+            digest.update(line.encode('utf-8'))
+            yield line
+
+    fields = [array('I') for _ in CORPUS_FIELDS]
+    heads, roots = array('i'), array('i')
+    sentences, comments, comment_offsets = array('q', [0]), array('I'), array('q', [0])
+    terminated = True
+    for comms, nodes, terminated in read_stanzas(hashed(lines)):
+        for n in nodes:
+            for column, value in zip(fields, n.as_dict().values()):
+                column.append(code(value))
+        hs, root = stanza_heads(nodes)
+        heads.extend(hs)
+        roots.append(root)
+        sentences.append(len(heads))
+        comments.extend(map(code, comms))
+        comment_offsets.append(len(comments))
+
+    arrays = {name: np.frombuffer(column, dtype=np.uint32) for name, column in zip(CORPUS_FIELDS, fields)}
+    for name, arr in [('heads', heads), ('roots', roots), ('sentences', sentences),
+                      ('comments', comments), ('comment_offsets', comment_offsets)]:
+        arrays[name] = np.frombuffer(arr, dtype=CORPUS_ARRAYS[name])
+    meta = {
+        'version': CORPUS_VERSION,
+        'sentences': len(roots),
+        'words': len(heads),
+        'strings': len(strings),
+        'terminated': terminated,   # if the last sentence was ended by an empty line
+        'digest': digest.hexdigest()
+        }
+    return meta, arrays, list(strings)
+
+
+def write_corpus(path: str, lines: Iterable[str]) -> dict:
+    "convert CoNLL-U lines into a corpus store in directory path, return its description"
+    os.makedirs(path, exist_ok=True)
+    if is_corpus(path):
+        os.remove(os.path.join(path, CORPUS_META))
+    meta, arrays, strings = corpus_columns(lines)
+    for name, arr in arrays.items():
+        np.save(os.path.join(path, name + '.npy'), arr)
+    with open(os.path.join(path, 'strings.txt'), 'w', encoding='utf-8', newline='') as file:
+        file.write('\n'.join(strings))
+    with open(os.path.join(path, CORPUS_META), 'w') as file:
+        json.dump(meta, file)
+    return meta
+
+
+def ranges(offsets: np.ndarray, numbers: np.ndarray) -> np.ndarray:
+    "the positions from offsets[n] to offsets[n+1] for each n in numbers, concatenated"
+    starts, ends = offsets[numbers], offsets[numbers + 1]
+    lengths = ends - starts
+    return np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+
+
+class CorpusColumns:
+    "the arrays and strings of a corpus, with the stanzas, trees and wordlines they code"
+
+    def __init__(self, meta: dict, arrays: dict, strings: list[str]):
+        self.meta = meta
+        self.strings = np.array(strings, dtype=object)
+        self.fields = {name: arrays[name] for name in CORPUS_FIELDS}
+        self.heads = arrays['heads']
+        self.roots = arrays['roots']
+        self.sentences = arrays['sentences']
+        self.comments = arrays['comments']
+        self.comment_offsets = arrays['comment_offsets']
+        self.indexes = {}   # the indexes of corpusindex, opened when first needed
+
+    def arrays(self) -> dict:
+        "all arrays by their names in the store"
+        return {**self.fields, **{name: getattr(self, name) for name in CORPUS_ARRAYS}}
+
+    def __len__(self):
+        "the number of stanzas, including a last one not ended by an empty line"
+        return len(self.roots)
+
+    def trees_end(self) -> int:
+        "the number of stanzas that conllu2trees gives, leaving out a last one not ended by an empty line"
+        return len(self) if self.meta['terminated'] else len(self) - 1
+
+    def digest(self) -> str:
+        "the hash of the source, the same as memo.file_digest of the CoNLL-U file"
+        return self.meta['digest']
+
+    def column(self, field: str, begin: int=0, end: int=None) -> list[str]:
+        "the values of a field in the words from begin to end"
+        return self.strings[self.fields[field][begin:end]].tolist()
+
+    def stanzas(self, begin: int=0, end: int=None) -> Iterable[tuple[list[str], list[WordLine]]]:
+        "comments and wordlines of the stanzas from begin to end, as given by conllu2stanzas"
+        if end is None:
+            end = self.trees_end()
+        for b in range(begin, end, BLOCK_SIZE):
+            e = min(b + BLOCK_SIZE, end)
+            offsets = self.sentences[b:e+1].tolist()
+            words = list(map(WordLine, *(self.column(f, offsets[0], offsets[-1]) for f in CORPUS_FIELDS)))
+            coffsets = self.comment_offsets[b:e+1].tolist()
+            comms = self.strings[self.comments[coffsets[0]:coffsets[-1]]].tolist()
+            for k in range(e - b):
+                yield (comms[coffsets[k]-coffsets[0]:coffsets[k+1]-coffsets[0]],
+                       words[offsets[k]-offsets[0]:offsets[k+1]-offsets[0]])
+
+    def stanzas_of(self, numbers: Iterable[int]) -> Iterable[tuple[list[str], list[WordLine]]]:
+        "comments and wordlines of the stanzas with the given numbers, in their order"
+        numbers = np.asarray(numbers, dtype=np.int64)
+        for b in range(0, len(numbers), BLOCK_SIZE):
+            block = numbers[b:b+BLOCK_SIZE]
+            words = list(map(WordLine, *(self.strings[self.fields[f][ranges(self.sentences, block)]].tolist()
+                                             for f in CORPUS_FIELDS)))
+            comms = self.strings[self.comments[ranges(self.comment_offsets, block)]].tolist()
+            wlengths = (self.sentences[block + 1] - self.sentences[block]).tolist()
+            clengths = (self.comment_offsets[block + 1] - self.comment_offsets[block]).tolist()
+            w = c = 0
+            for wl, cl in zip(wlengths, clengths):
+                yield comms[c:c+cl], words[w:w+wl]
+                w += wl
+                c += cl
+
+    def stanza_tree(self, comms: list[str], nodes: list[WordLine], root: int, offset: int) -> DepTree:
+        "the tree of a stanza, with its root and offset in the word arrays"
+        if root == -2:
+            dt = build_deptree(nodes)
+        elif root == -1:
+            raise NotValidTree(str(nodes))
+        else:
+            ts = [DepTree(n, [], []) for n in nodes]
+            for t, h in zip(ts, self.heads[offset:offset+len(nodes)].tolist()):
+                if h >= 0:
+                    ts[h].subtrees.append(t)
+            dt = ts[root]
+        dt.comments = comms
+        return dt
+
+    def trees(self, begin: int=0, end: int=None) -> Iterable[DepTree]:
+        "the trees of the stanzas from begin to end, as given by conllu2trees"
+        if end is None:
+            end = self.trees_end()
+        for (comms, nodes), root, offset in zip(self.stanzas(begin, end), self.roots[begin:end].tolist(),
+                                                self.sentences[begin:end].tolist()):
+            yield self.stanza_tree(comms, nodes, root, offset)
+
+    def trees_of(self, numbers: Iterable[int]) -> Iterable[DepTree]:
+        "the trees of the stanzas with the given numbers, in their order"
+        numbers = np.asarray(numbers, dtype=np.int64)
+        for (comms, nodes), root, offset in zip(self.stanzas_of(numbers), self.roots[numbers].tolist(),
+                                                self.sentences[numbers].tolist()):
+            yield self.stanza_tree(comms, nodes, root, offset)
+
+    def wordlines(self, begin: int=0, end: int=None) -> Iterable[WordLine]:
+        "the wordlines of the stanzas from begin to end, by default all, as given by conllu2wordlines"
+        for _, nodes in self.stanzas(begin, len(self) if end is None else end):
+            for n in nodes:
+                yield n
+
+    def lines(self) -> Iterable[str]:
+        "the corpus as CoNLL-U lines"
+        for i, (comms, nodes) in enumerate(self.stanzas(0, len(self))):
+            for line in comms:
+                yield line + '\n'
+            for n in nodes:
+                yield str(n) + '\n'
+            if i < len(self) - 1 or self.meta['terminated']:
+                yield '\n'
+
+    def statistics(self, fields: list[str], batch_size: int=100000) -> dict:
+        "frequency table of a combination of fields, the same as wordline_statistics on all wordlines"
+        if not fields:
+            return wordline_statistics(fields, self.wordlines())
+        stats = {}
+        for b in range(0, self.meta['words'], batch_size):
+            matrix = np.column_stack([self.fields[f][b:b+batch_size].astype(np.int64) for f in fields])
+            first, counts = count_rows(matrix)
+            add_counts(stats, map(tuple, matrix[first].tolist()), counts.tolist())
+        return {tuple(self.strings[list(key)].tolist()): count for key, count in stats.items()}
+
+
+class CorpusStore(CorpusColumns):
+    "a corpus store opened for reading, with memory-mapped arrays"
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, CORPUS_META)) as file:
+            meta = json.load(file)
+        if meta['version'] != CORPUS_VERSION:
+            raise ValueError('unknown version of corpus store ' + path)
+        with open(os.path.join(path, 'strings.txt'), encoding='utf-8', newline='') as file:
+            strings = file.read().split('\n')
+        arrays = {name: np.load(os.path.join(path, name + '.npy'), mmap_mode='r')
+                      for name in CORPUS_FIELDS + list(CORPUS_ARRAYS)}
+        super().__init__(meta, arrays, strings)
+        self.path = path
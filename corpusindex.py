@@ -0,0 +1,361 @@
+# indexes of a corpus store, kept in its directory, that give the sentences where a
+# pattern can match, so that only they are built into trees and matched
+#
+# The candidates of a pattern include every sentence that it matches and usually some
+# that it does not, so the pattern is still matched with them. A pattern that an index
+# cannot narrow down gives None, and then all sentences are matched.
+#
+# The positional index has, for each of the fields FORM, LEMMA and POS, the positions of
+# the words in the corpus ordered by the code of the string in the field, and for each
+# code the offset of its first position. Positions within a sentence are only used for
+# the "plain" sentences, where the words are numbered 1, 2, ... in order and all belong
+# to the tree, so that they are in the order of DepTree.wordlines().
+#
+# The edge index has the positions of the head and the dependent of each edge of the
+# trees, in the order in which head_dep_statistics meets them. Sentences whose trees are
+# built by build_deptree, e.g. because of repeated IDs, have no edges in it and are
+# always candidates.
+
+import json
+import os
+from abc import ABC, abstractmethod
+from fnmatch import filter as fnfilter
+import numpy as np
+from trees import WORDLINE_FIELDS, parse_feats
+from patterns import Pattern, match_str, read_values
+from corpus import CorpusColumns
+from vectorstats import count_rows
+from treetypes import head_dep_keys
+
+INDEX_FIELDS = ['FORM', 'LEMMA', 'POS']
+
+
+def save_array(path: str, arr: np.ndarray):
+    "save an array so that readers never see a partly written file"
+    with open(path + '.tmp', 'wb') as file:
+        np.save(file, arr)
+    os.replace(path + '.tmp', path)
+
+
+def word_sentences(columns: CorpusColumns) -> np.ndarray:
+    "the sentence of each word"
+    lengths = np.diff(np.asarray(columns.sentences))
+    return np.repeat(np.arange(len(lengths)), lengths)
+
+
+def plain_sentences(columns: CorpusColumns) -> np.ndarray:
+    "for each sentence, if its words are numbered 1, 2, ... and all of them are in its tree"
+    sentences = np.asarray(columns.sentences)
+    owner = word_sentences(columns)
+    local = np.arange(sentences[-1]) - sentences[owner]
+
+    numbers = np.array([int(s) if s.isdecimal() and len(s) < 10 else -1 for s in columns.strings.tolist()],
+                       dtype=np.int64)
+    numbered = numbers[np.asarray(columns.fields['ID'])] == local + 1
+
+    # follow heads by pointer doubling: the words in the tree end at its root
+    roots = np.asarray(columns.roots).astype(np.int64)
+    heads = np.asarray(columns.heads).astype(np.int64)
+    up = np.where(heads >= 0, sentences[owner] + heads, np.arange(len(heads)))
+    for _ in range(int(np.diff(sentences).max(initial=1)).bit_length() + 1):
+        up = up[up]
+    in_tree = (roots[owner] >= 0) & (up == sentences[owner] + roots[owner])
+
+    plain = roots >= 0
+    plain[owner[~(numbered & in_tree)]] = False
+    return plain
+
+
+def tree_edges(columns: CorpusColumns) -> tuple[np.ndarray, np.ndarray]:
+    "the positions of heads and dependents in the trees, in preorder of heads, dependents in order"
+    heads, deps = [], []
+    for offset, end, root in zip(columns.sentences[:-1].tolist(), columns.sentences[1:].tolist(),
+                                 columns.roots.tolist()):
+        if root < 0:
+            continue
+        children = [[] for _ in range(end - offset)]
+        for i, h in enumerate(columns.heads[offset:end].tolist()):
+            if h >= 0:
+                children[h].append(i)
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            for c in children[node]:
+                heads.append(offset + node)
+                deps.append(offset + c)
+            stack.extend(reversed(children[node]))
+    return np.array(heads, dtype=np.int64), np.array(deps, dtype=np.int64)
+
+
+class StoreIndex(ABC):
+    "an index saved as arrays in the directory of a corpus store, with the digest of the store"
+    META = None    # the file of the digest
+    NAMES = []     # the arrays
+
+    def __init__(self, columns: CorpusColumns, arrays: dict):
+        self.columns = columns
+        self.arrays = arrays
+
+    @classmethod
+    @abstractmethod
+    def build(cls, columns: CorpusColumns) -> dict:
+        "the arrays of the index"
+
+    @classmethod
+    def open_arrays(cls, columns: CorpusColumns) -> dict:
+        "the arrays of the index of a corpus store, built and saved in its directory if they are missing or out of date"
+        if (path := getattr(columns, 'path', None)) is None:
+            return cls.build(columns)
+        meta_path = os.path.join(path, cls.META)
+        if os.path.isfile(meta_path):
+            with open(meta_path) as file:
+                if json.load(file).get('digest') == columns.digest():
+                    return {name: np.load(os.path.join(path, name + '.npy'), mmap_mode='r') for name in cls.NAMES}
+        arrays = cls.build(columns)
+        try:
+            for name in cls.NAMES:
+                save_array(os.path.join(path, name + '.npy'), arrays[name])
+            with open(meta_path + '.tmp', 'w') as file:
+                json.dump({'digest': columns.digest()}, file)
+            os.replace(meta_path + '.tmp', meta_path)
+        except OSError:
+            pass   # a store that cannot be written is indexed again each time
+        return arrays
+
+    @classmethod
+    def load(cls, columns: CorpusColumns):
+        return cls(columns, cls.open_arrays(columns))
+
+    @classmethod
+    def open(cls, columns: CorpusColumns):
+        "the index of the columns, loaded once for each CorpusColumns object"
+        if (index := columns.indexes.get(cls.META)) is None:
+            index = columns.indexes[cls.META] = cls.load(columns)
+        return index
+
+
+class SequenceIndex(StoreIndex):
+    "the positional index of the words of a corpus by FORM, LEMMA and POS"
+    META = 'index.json'
+    NAMES = ['plain'] + [field + suffix for field in INDEX_FIELDS for suffix in ['.positions', '.starts']]
+
+    def __init__(self, columns: CorpusColumns, arrays: dict):
+        super().__init__(columns, arrays)
+        self.codes = None      # string: code, made when first needed
+        self.feats = None      # FEATS string: code, for the strings in FEATS
+
+    @classmethod
+    def build(cls, columns: CorpusColumns) -> dict:
+        arrays = {'plain': plain_sentences(columns)}
+        for field in INDEX_FIELDS:
+            codes = np.asarray(columns.fields[field])
+            arrays[field + '.positions'] = np.argsort(codes, kind='stable').astype(np.int64)
+            counts = np.bincount(codes, minlength=len(columns.strings))
+            arrays[field + '.starts'] = np.concatenate([[0], np.cumsum(counts)])
+        return arrays
+
+    def code_list(self, value: str) -> list[int]:
+        "the codes of the strings that a value matches, with wildcards"
+        if self.codes is None:
+            self.codes = {s: i for i, s in enumerate(self.columns.strings.tolist())}
+        if not any(c in value for c in '*?['):
+            return [self.codes[value]] if value in self.codes else []
+        return [self.codes[s] for s in fnfilter(self.codes, value)]
+
+    def feature_codes(self, feature: str, value: str) -> list[int]:
+        "the codes of the FEATS strings where a feature has a value that matches value"
+        if self.feats is None:
+            strings = self.columns.strings
+            self.feats = {strings[c]: c for c in np.unique(self.columns.fields['FEATS']).tolist()}
+        return [c for s, c in self.feats.items()
+                    if (v := parse_feats(s).get(feature)) is not None and match_str(value, v)]
+
+    def positions(self, field: str, values: list[str]) -> np.ndarray:
+        "the sorted positions of the words whose field matches one of the values"
+        return self.code_positions(field, [c for value in values for c in self.code_list(value)])
+
+    def code_positions(self, field: str, codes: list[int]) -> np.ndarray:
+        "the sorted positions of the words whose field has one of the codes"
+        if field not in INDEX_FIELDS:
+            return np.flatnonzero(np.isin(self.columns.fields[field], codes))
+        positions, starts = self.arrays[field + '.positions'], self.arrays[field + '.starts']
+        parts = [positions[starts[c]:starts[c+1]] for c in codes]
+        return np.sort(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.int64)
+
+    def words(self, patt: Pattern) -> np.ndarray:
+        "the sorted positions of the words that a wordline pattern can match, or None if any word can"
+        match patt:
+            case Pattern(field, ['IN', *forms]) if field in WORDLINE_FIELDS and all(isinstance(f, str) for f in forms):
+                return self.positions(field, forms)
+            case Pattern(field, ['IN_FILE', path]) if field in WORDLINE_FIELDS:
+                return self.positions(field, read_values(path))
+            case Pattern(field, [form]) if field in WORDLINE_FIELDS and isinstance(form, str):
+                return self.positions(field, [form])
+            case Pattern('FEAT', [feature, value]) if isinstance(feature, str) and isinstance(value, str):
+                return self.code_positions('FEATS', self.feature_codes(feature, value))
+            case Pattern('AND', patts):
+                return intersection([self.words(p) for p in patts])
+            case Pattern('OR', patts):
+                return union([self.words(p) for p in patts])
+            case _:
+                return None
+
+    def sentences_of_each(self, words: np.ndarray) -> np.ndarray:
+        "the sentence of each of words"
+        return np.searchsorted(self.columns.sentences, words, 'right') - 1
+
+    def sentences_of(self, words: np.ndarray) -> np.ndarray:
+        "the sorted sentences of words"
+        return np.unique(self.sentences_of_each(words))
+
+    def in_sequence(self, patts: list[Pattern]) -> np.ndarray:
+        "the sentences where the patterns can match consecutive words, or None"
+        known = [(k, ws) for k, p in enumerate(patts) if (ws := self.words(p)) is not None]
+        if not known:
+            return None
+        starts = intersection([ws - k for k, ws in known])
+        sentences = intersection([self.sentences_of(ws) for _, ws in known])
+        plain = self.arrays['plain']
+        starts = self.sentences_of(starts[starts >= 0])
+        return np.union1d(sentences[~plain[sentences]], starts[plain[starts]])
+
+    def sentences(self, patt: Pattern) -> np.ndarray:
+        "the sorted sentences where a tree pattern can match, as in match_trees, or None if all can"
+        match patt:
+            case Pattern('SEQUENCE' | 'SUBSEQUENCE', patts):
+                return self.in_sequence(patts)
+            case Pattern('SEQUENCE_', patts):
+                return intersection([None if (ws := self.words(p)) is None else self.sentences_of(ws)
+                                         for p in patts])
+            case Pattern('AND', patts):
+                return intersection([self.sentences(p) for p in patts])
+            case Pattern('OR', patts):
+                return union([self.sentences(p) for p in patts])
+            case _:
+                # a wordline pattern matches the root, which is one of the words
+                words = self.words(patt)
+                return None if words is None else self.sentences_of(words)
+
+
+class EdgeIndex(StoreIndex):
+    "the head-dependent edges of the trees of a corpus"
+    META = 'edges.json'
+    NAMES = ['edges.heads', 'edges.deps']
+
+    def __init__(self, columns: CorpusColumns, arrays: dict, positional: SequenceIndex):
+        super().__init__(columns, arrays)
+        self.positional = positional   # the index that finds words by their fields
+        self.irregular = np.flatnonzero(np.asarray(columns.roots) == -2)
+
+    @classmethod
+    def build(cls, columns: CorpusColumns) -> dict:
+        heads, deps = tree_edges(columns)
+        return {'edges.heads': heads, 'edges.deps': deps}
+
+    @classmethod
+    def load(cls, columns: CorpusColumns):
+        return cls(columns, cls.open_arrays(columns), SequenceIndex.open(columns))
+
+    def heads_of(self, deps: np.ndarray) -> np.ndarray:
+        "the sorted positions of the heads of some of deps"
+        return np.unique(self.arrays['edges.heads'][np.isin(self.arrays['edges.deps'], deps)])
+
+    def nodes(self, patt: Pattern) -> np.ndarray:
+        "the sorted positions of the words whose subtrees a tree pattern can match, or None if any can"
+        match patt:
+            case Pattern('HAS_SUBTREE', patts):
+                deps = intersection([self.nodes(p) for p in patts])
+                return np.unique(self.arrays['edges.heads']) if deps is None else self.heads_of(deps)
+            case Pattern('TREE' | 'TREE_', [pt, *patts]):
+                return intersection([self.nodes(pt)] + [None if (ns := self.nodes(p)) is None else self.heads_of(ns)
+                                                           for p in patts])
+            case Pattern('AND', patts):
+                return intersection([self.nodes(p) for p in patts])
+            case Pattern('OR', patts):
+                return union([self.nodes(p) for p in patts])
+            case _:
+                # a wordline pattern matches the root of the subtree
+                return self.positional.words(patt)
+
+    def sentences_of(self, nodes: np.ndarray) -> np.ndarray:
+        "the sorted sentences of nodes, and all irregular sentences"
+        return np.union1d(self.positional.sentences_of(nodes), self.irregular)
+
+    def root_sentences(self, patt: Pattern) -> np.ndarray:
+        "the sorted sentences whose whole trees a pattern can match, or None"
+        if (nodes := self.nodes(patt)) is None:
+            return None
+        roots = np.asarray(self.columns.sentences[:-1]) + np.asarray(self.columns.roots)
+        return np.union1d(np.flatnonzero(np.isin(roots, nodes) & (np.asarray(self.columns.roots) >= 0)),
+                          self.irregular)
+
+    def subtree_sentences(self, patt: Pattern) -> np.ndarray:
+        "the sorted sentences where a pattern can match some subtree, or None"
+        return None if (nodes := self.nodes(patt)) is None else self.sentences_of(nodes)
+
+    def partial_sentences(self, patts: list[Pattern]) -> np.ndarray:
+        "the sorted sentences where find_partial_subtrees can find something, or None"
+        if not patts:
+            return np.zeros(0, dtype=np.int64)
+        nodes = intersection([self.positional.words(patts[0])] + [None if (ns := self.nodes(p)) is None else self.heads_of(ns)
+                                                              for p in patts[1:]])
+        return None if nodes is None else self.sentences_of(nodes)
+
+    def head_dep_statistics(self, fields: list[str], end: int) -> dict:
+        "the same as head_dep_statistics_dict of the trees before end, in the same order"
+        if (invalid := np.flatnonzero(np.asarray(self.columns.roots[:end]) == -1)).size:
+            next(self.columns.trees(invalid[0], invalid[0] + 1))   # raises NotValidTree
+        heads, deps = self.arrays['edges.heads'], self.arrays['edges.deps']
+        before = int(np.count_nonzero(deps < self.columns.sentences[end]))
+        matrix = np.column_stack([np.asarray(self.columns.fields[f])[ws[:before]].astype(np.int64)
+                                      for ws in [heads, deps] for f in fields])
+        first, counts = count_rows(matrix)
+        strings = self.columns.strings
+        stats = {}   # key: [count, (sentence, number) of first occurrence]
+        for row, count, s, k in zip(matrix[first], counts.tolist(),
+                                    self.positional.sentences_of_each(deps[first]).tolist(), first.tolist()):
+            key = (tuple(strings[row[:len(fields)]].tolist()), tuple(strings[row[len(fields):]].tolist()))
+            stats[key] = [count, (s, k)]
+        irregular = self.irregular[self.irregular < end]
+        for s, tree in zip(irregular.tolist(), self.columns.trees_of(irregular)):
+            for k, key in enumerate(head_dep_keys([tree], fields)):
+                if key in stats:
+                    stats[key][0] += 1
+                else:
+                    stats[key] = [1, (s, k)]
+        return {key: count for key, (count, _) in sorted(stats.items(), key=lambda it: it[1][1])}
+
+
+def intersection(arrays: list[np.ndarray]) -> np.ndarray:
+    "the intersection of the sorted arrays that are not None, or None if all are"
+    if not (known := [a for a in arrays if a is not None]):
+        return None
+    result = known[0]
+    for a in known[1:]:
+        result = np.intersect1d(result, a, assume_unique=True)
+    return result
+
+
+def union(arrays: list[np.ndarray]) -> np.ndarray:
+    "the union of sorted arrays, or None if any of them is None"
+    if not arrays or any(a is None for a in arrays):
+        return None
+    return np.unique(np.concatenate(arrays))
+
+
+def candidate_sentences(columns: CorpusColumns, name: str, patts: list[Pattern]) -> np.ndarray:
+    "the sorted sentences that a stage that matches trees with patterns must be given, or None if all"
+    edges = EdgeIndex.open(columns)
+    match name, patts:
+        case 'match_trees', [patt]:
+            sentences = intersection([edges.positional.sentences(patt), edges.root_sentences(patt)])
+        case 'match_subtrees' | 'match_found_in_tree', [patt]:
+            sentences = edges.subtree_sentences(patt)
+        case 'find_partial_subtrees', _:
+            sentences = edges.partial_sentences(patts)
+        case _:
+            sentences = None
+    if sentences is None:
+        return None
+    # sentences without a root are given, so that they are reported as before
+    return np.union1d(sentences, np.flatnonzero(np.asarray(columns.roots) == -1))
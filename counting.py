@@ -0,0 +1,184 @@
+# counting keys for frequency tables: exact, top-k, approximate in bounded memory,
+# and exact with partial counts spilled to disk
+
+import heapq
+import os
+import pickle
+import tempfile
+from dataclasses import dataclass
+from itertools import islice
+from operator import itemgetter
+from typing import Iterable, Callable
+
+
+@dataclass
+class CountOptions:
+    "options shared by all statistics operations"
+    top: int = None        # only the top most frequent keys
+    min_count: int = 1     # only keys with at least this count
+    approx: int = None     # number of counters in approximate mode
+    spill: int = None      # number of distinct keys kept in memory in external mode
+
+
+def count_keys(keys: Iterable) -> dict:
+    "exact frequency table of a stream of keys"
+    stats = {}
+    for key in keys:
+        stats[key] = stats.get(key, 0) + 1
+    return stats
+
+
+class SpaceSaving:
+    """
+    Space-Saving summary (Metwally, Agrawal & El Abbadi 2005) with a fixed number m of counters.
+    After a stream of N keys, every key whose true count is above N/m has a counter, and
+    every counted key satisfies  true <= count <= true + error,  where error <= N/m.
+    """
+
+    def __init__(self, m: int):
+        self.m = m
+        self.counts = {}   # key: count
+        self.errors = {}   # key: overestimation bound
+        self.heap = []     # (count, seqno, key), one entry per key, possibly with a stale count
+        self.seqno = 0
+        self.total = 0
+
+    def add(self, key):
+        self.total += 1
+        if key in self.counts:
+            self.counts[key] += 1
+            return
+        if len(self.counts) < self.m:
+            self.counts[key] = 1
+            self.errors[key] = 0
+        else:
+            minkey, mincount = self.pop_minimum()
+            del self.counts[minkey]
+            del self.errors[minkey]
+            self.counts[key] = mincount + 1
+            self.errors[key] = mincount
+        self.seqno += 1
+        heapq.heappush(self.heap, (self.counts[key], self.seqno, key))
+
+    def pop_minimum(self):
+        "remove the key with the smallest count from the heap, refreshing stale entries on the way"
+        while True:
+            count, seqno, key = heapq.heappop(self.heap)
+            if count == self.counts[key]:
+                return key, count
+            heapq.heappush(self.heap, (self.counts[key], seqno, key))
+
+    def bound(self) -> int:
+        "the maximal overestimation of any count"
+        return self.total // self.m
+
+
+def approximate_counts(keys: Iterable, m: int) -> dict:
+    "approximate frequency table of at most m keys, see SpaceSaving for the error bounds"
+    summary = SpaceSaving(m)
+    for key in keys:
+        summary.add(key)
+    return summary.counts
+
+
+def select_statistics(stats: dict, options: CountOptions) -> list:
+    "frequency table filtered by min_count, sorted in descending order, truncated to top"
+    items = stats.items()
+    if options.min_count > 1:
+        items = [it for it in items if it[1] >= options.min_count]
+    if options.top is not None:
+        return heapq.nlargest(options.top, items, key=lambda it: it[1])
+    return sorted(items, key=lambda it: -it[1])
+
+
+MAX_OPEN_RUNS = 256  # run files merged at a time
+
+
+def write_run(records: Iterable[tuple], directory: str) -> str:
+    "write records into a new run file in directory, return the file name"
+    with tempfile.NamedTemporaryFile('wb', dir=directory, suffix='.run', delete=False) as file:
+        for record in records:
+            pickle.dump(record, file, pickle.HIGHEST_PROTOCOL)
+    return file.name
+
+
+def read_run(filename: str) -> Iterable[tuple]:
+    with open(filename, 'rb') as file:
+        while True:
+            try:
+                yield pickle.load(file)
+            except EOFError:
+                return
+
+
+def merge_runs(runs: list[str], directory: str, key: Callable) -> Iterable[tuple]:
+    "merge run files sorted by key, in several rounds if there are too many to open at once"
+    while len(runs) > MAX_OPEN_RUNS:
+        group, runs = runs[:MAX_OPEN_RUNS], runs[MAX_OPEN_RUNS:]
+        runs.append(write_run(heapq.merge(*map(read_run, group), key=key), directory))
+        for run in group:
+            os.remove(run)
+    return heapq.merge(*map(read_run, runs), key=key)
+
+
+def spill_counts(keys: Iterable, max_keys: int, directory: str) -> list[str]:
+    """
+    count keys in memory, and whenever there are max_keys distinct ones, write the partial
+    counts into a run of records (repr(key), count, first position, key) sorted by repr(key)
+    """
+    runs = []
+    stats = {}   # key: [count, first position]
+
+    def spill():
+        records = sorted(((repr(key), count, first, key) for key, (count, first) in stats.items()),
+                         key=itemgetter(0))
+        runs.append(write_run(records, directory))
+        stats.clear()
+
+    for position, key in enumerate(keys):
+        if (entry := stats.get(key)) is None:
+            stats[key] = [1, position]
+            if len(stats) >= max_keys:
+                spill()
+        else:
+            entry[0] += 1
+    if stats:
+        spill()
+    return runs
+
+
+def total_counts(records: Iterable[tuple]) -> Iterable[tuple]:
+    "add up the counts in records sorted by repr(key), yielding (count, first position, key)"
+    current = None
+    for canon, count, first, key in records:
+        if current and current[0] == canon:
+            current[1] += count
+            current[2] = min(current[2], first)
+        else:
+            if current:
+                yield tuple(current[1:])
+            current = [canon, count, first, key]
+    if current:
+        yield tuple(current[1:])
+
+
+def external_statistics(keys: Iterable, options: CountOptions) -> Iterable[tuple]:
+    """
+    exact frequency table with at most options.spill keys in memory, in descending order
+    with ties in order of first occurrence, like select_statistics on the complete table
+    """
+    order = lambda it: (-it[0], it[1])
+    with tempfile.TemporaryDirectory(prefix='deptreepy-') as directory:
+        runs = spill_counts(keys, options.spill, directory)
+        totals = ((count, first, key)
+                      for count, first, key in total_counts(merge_runs(runs, directory, itemgetter(0)))
+                      if count >= options.min_count)
+        if options.top is not None:
+            ranked = heapq.nsmallest(options.top, totals, key=order)
+        else:
+            runs = []
+            while chunk := list(islice(totals, options.spill)):
+                runs.append(write_run(sorted(chunk, key=order), directory))
+            ranked = merge_runs(runs, directory, order)
+        for count, first, key in ranked:
+            yield key, count
@@ -0,0 +1,116 @@
+# deduplication of a stream of keys: exact, with a set of their hashes; in fixed memory with
+# a Bloom filter, which can take a few new keys for duplicates but never a duplicate for new;
+# and of near duplicates, sentences with similar sets of word n-grams, with MinHash
+
+import hashlib
+from math import exp
+import numpy as np
+
+DIGEST_SIZE = 16          # bytes of the hash of each key
+BLOOM_HASHES = 7          # bits set for each key in a Bloom filter
+MINHASH_NGRAM = 3         # words in the n-grams compared by MinHash
+MINHASH_BANDS = 16        # bands of the MinHash signature, compared as wholes to find candidates
+MINHASH_ROWS = 4          # values in each band
+MINHASH_PRIME = (1 << 61) - 1
+
+
+def key_digest(key: str) -> bytes:
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=DIGEST_SIZE).digest()
+
+
+class ExactFilter:
+    "the hashes of all keys seen, a duplicate for a new key only if their hashes collide"
+
+    def __init__(self):
+        self.digests = set()
+
+    def seen(self, key: str) -> bool:
+        "if the key was seen before, adding it if not"
+        digest = key_digest(key)
+        if digest in self.digests:
+            return True
+        self.digests.add(digest)
+        return False
+
+    def note(self) -> str:
+        return str(len(self.digests)) + ' distinct'
+
+
+class BloomFilter:
+    """
+    a Bloom filter of a fixed number of bytes, with BLOOM_HASHES bits for each key, computed
+    from the two halves of its hash (Kirsch & Mitzenmacher 2006)
+    """
+
+    def __init__(self, megabytes: int):
+        self.bits = bytearray(megabytes << 20)
+        self.size = len(self.bits) * 8
+        self.count = 0   # keys added
+
+    def seen(self, key: str) -> bool:
+        "if all bits of the key were set, setting them if not"
+        digest = key_digest(key)
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        found = True
+        for i in range(BLOOM_HASHES):
+            position = (h1 + i * h2) % self.size
+            byte, bit = position >> 3, 1 << (position & 7)
+            if not self.bits[byte] & bit:
+                self.bits[byte] |= bit
+                found = False
+        self.count += not found
+        return found
+
+    def false_positive_rate(self) -> float:
+        "the expected rate of new keys taken for duplicates, after the keys added so far"
+        return (1 - exp(-BLOOM_HASHES * self.count / self.size)) ** BLOOM_HASHES
+
+    def note(self) -> str:
+        return 'new keys taken for duplicates about %.4f%%' % (100 * self.false_positive_rate())
+
+
+class MinHashFilter:
+    """
+    near duplicates: the MinHash signatures of the word n-grams of the sentences kept so far,
+    indexed by bands, and a sentence is a duplicate of one that shares a band with it and
+    has at least threshold of the same signature values, an estimate of their Jaccard similarity
+    """
+
+    def __init__(self, threshold: float):
+        size = MINHASH_BANDS * MINHASH_ROWS
+        random = np.random.default_rng(0)   # the same permutations in every run
+        self.a = random.integers(1, 1 << 31, size, dtype=np.uint64)
+        self.b = random.integers(0, 1 << 31, size, dtype=np.uint64)
+        self.threshold = threshold
+        self.signatures = []   # of the sentences kept
+        self.buckets = {}      # (band, values): indices of signatures
+
+    def signature(self, words: list[str]) -> np.ndarray:
+        "the minima of the hashes of the n-grams of words in each permutation"
+        n = MINHASH_NGRAM
+        ngrams = {' '.join(words[i:i+n]) for i in range(max(1, len(words) - n + 1))}
+        hashes = np.array([int.from_bytes(hashlib.blake2b(g.encode('utf-8'), digest_size=4).digest(), 'little')
+                           for g in ngrams], dtype=np.uint64)
+        return ((np.outer(self.a, hashes) + self.b[:, None]) % MINHASH_PRIME).min(axis=1)
+
+    def seen(self, words: list[str]) -> bool:
+        "if a similar sentence was seen before, adding the words if not"
+        signature = self.signature(words)
+        bands = [(i, signature[i*MINHASH_ROWS:(i+1)*MINHASH_ROWS].tobytes()) for i in range(MINHASH_BANDS)]
+        candidates = {j for band in bands for j in self.buckets.get(band, [])}
+        if any((self.signatures[j] == signature).mean() >= self.threshold for j in candidates):
+            return True
+        for band in bands:
+            self.buckets.setdefault(band, []).append(len(self.signatures))
+        self.signatures.append(signature)
+        return False
+
+    def note(self) -> str:
+        return str(len(self.signatures)) + ' kept'
+
+
+def duplicate_report(name: str, total: int, duplicates: int, note: str) -> str:
+    "the number and rate of duplicates in a stream"
+    rate = 100 * duplicates / total if total else 0.0
+    return '# %s: %d items, %d duplicates (%.2f%%), %s' % (name, total, duplicates, rate, note)
@@ -3,7 +3,8 @@
 import sys
 from trees import *
 from patterns import *
-from operations import execute_pipe_on_strings
+from operations import execute_pipe_on_strings, parse_execution_options, open_input, serve
+from vectorstats import coded_wordline_statistics
 
 def print_help_message():
     with open('README.md') as file:
@@ -26,13 +27,18 @@ if __name__ == '__main__':
                 cond = lambda x: match_wordline(patt, x)
                 fields = fields[:-1]
             with open(file1) as lines1:
-                stats1 = wordline_statistics(fields, filter(cond, read_wordlines(lines1)))
+                stats1 = coded_wordline_statistics(fields, filter(cond, read_wordlines(lines1)))
             with open(file2) as lines2:
-                stats2 = wordline_statistics(fields, filter(cond, read_wordlines(lines2)))
+                stats2 = coded_wordline_statistics(fields, filter(cond, read_wordlines(lines2)))
             print(cosine_similarity(stats1, stats2))
         case 'help':
             print_help_message()
-        case command:
-            execute_pipe_on_strings(sys.argv[1], sys.stdin)
+        case 'worker':
+            manifest, port, host = sys.argv[2], sys.argv[3], sys.argv[4] if sys.argv[4:] else 'localhost'
+            serve(manifest, host, int(port))
+        case _:
+            options, (command, *_) = parse_execution_options(sys.argv[1:])
+            strs = open_input(options.input) if options.input else sys.stdin
+            execute_pipe_on_strings(command, strs, options)
             
 
@@ -0,0 +1,160 @@
+# evaluation of parsed CoNLL-U against a gold treebank: stanzas of the two are joined by
+# sent_id, or by position, and their words compared by HEAD and DEPREL, giving the UAS and LAS
+# of all words and of the words of each gold DEPREL and POS
+#
+# The join reads both streams in turn and keeps a stanza only until the other stream gives
+# the one with the same key. When the streams are in the same order, each stanza is joined
+# as soon as it is read, like in a merge join, and memory does not grow with the input; when
+# they are not, the stanzas that have no partner yet wait in a hash table of each side.
+
+import sys
+from dataclasses import dataclass, field
+from itertools import zip_longest
+from typing import Iterable
+from trees import *
+from corpus import read_stanzas
+
+SCORE_DIGITS = 4
+
+
+def keyed_stanzas(lines: Iterable[str], by_position: bool=False) -> Iterable[tuple[str, list[str], list[WordLine]]]:
+    "the key, comments and wordlines of each stanza: its sent_id, or its number from 1 if none or by_position"
+    for number, (comms, nodes, _) in enumerate(read_stanzas(lines), 1):
+        id = None if by_position else comment_sent_id(comms)
+        yield str(number) if id is None else id, comms, nodes
+
+
+def joined_stanzas(gold: Iterable[str], system: Iterable[str], by_position: bool=False):
+    """
+    pairs of gold and system stanzas with the same key, as (key, gold, system), with None for
+    a stanza that has no partner in the other stream; the stanzas without partners come last.
+    A key repeated while a stanza with it is waiting is reported in stderr, and the stanza
+    waits with the number of its repetition added to the key, so that it is not lost; it is
+    joined with a later stanza of the other stream with the same key, after the first one
+    """
+    golds, systems = {}, {}
+    repeats = {}, {}   # sent_id: the keys of its repetitions waiting, in golds and systems
+    for g, s in zip_longest(keyed_stanzas(gold, by_position), keyed_stanzas(system, by_position)):
+        for item, own, other, gold_first in [(g, golds, systems, True), (s, systems, golds, False)]:
+            if item is None:
+                continue
+            key, comms, nodes = item
+            own_repeats, other_repeats = repeats if gold_first else repeats[::-1]
+            if key in own:
+                print('# compare: sent_id ' + key + ' repeated in the ' + ('gold' if gold_first else 'system') +
+                      ' input', file=sys.stderr)
+                n = 2
+                while key + '#' + str(n) in own:
+                    n += 1
+                own_repeats.setdefault(key, []).append(key + '#' + str(n))
+                key = key + '#' + str(n)
+            elif key not in other and (keys := other_repeats.get(key)):
+                repeated = keys.pop(0)
+                if not keys:
+                    del other_repeats[key]
+                key = repeated
+            if key in other:
+                partner = other.pop(key)
+                yield (key, (comms, nodes), partner) if gold_first else (key, partner, (comms, nodes))
+            else:
+                own[key] = comms, nodes
+    for key, stanza in golds.items():
+        yield key, stanza, None
+    for key, stanza in systems.items():
+        yield key, None, stanza
+
+
+def compared_words(gold: list[WordLine], system: list[WordLine]) -> list[tuple[WordLine, WordLine]]:
+    "pairs of the gold and system words of a sentence, not ranges or empty nodes; empty if their numbers differ"
+    gold = [w for w in gold if w.ID.isdigit()]
+    system = [w for w in system if w.ID.isdigit()]
+    return list(zip(gold, system)) if len(gold) == len(system) else []
+
+
+@dataclass
+class Attachments:
+    "counts of words, and of words whose HEAD, and HEAD and DEPREL, are right"
+    words: int = 0
+    heads: int = 0
+    labels: int = 0
+
+    def add(self, head: bool, label: bool):
+        self.words += 1
+        self.heads += head
+        self.labels += head and label
+
+    def scores(self) -> tuple[float, float]:
+        "UAS and LAS"
+        return (round(self.heads / self.words, SCORE_DIGITS) if self.words else 0.0,
+                round(self.labels / self.words, SCORE_DIGITS) if self.words else 0.0)
+
+
+@dataclass
+class Evaluation:
+    "the counts of a comparison, updated one sentence at a time"
+    sentences: int = 0
+    missing: int = 0      # gold sentences without system sentence
+    extra: int = 0        # system sentences without gold sentence
+    misaligned: int = 0   # sentences whose numbers of words differ, not compared
+    total: Attachments = field(default_factory=Attachments)
+    deprels: dict = field(default_factory=dict)
+    poss: dict = field(default_factory=dict)
+
+    def add(self, gold: list[WordLine], system: list[WordLine]) -> list[WordLine]:
+        "count the words of a sentence, giving the system words that are not right"
+        if gold is None:
+            self.extra += 1
+            return []
+        if system is None:
+            self.missing += 1
+            return []
+        self.sentences += 1
+        if not (pairs := compared_words(gold, system)):
+            self.misaligned += 1
+            return []
+        wrong = []
+        for g, s in pairs:
+            head, label = g.HEAD == s.HEAD, g.DEPREL == s.DEPREL
+            for counts in [self.total,
+                           self.deprels.setdefault(g.DEPREL, Attachments()),
+                           self.poss.setdefault(g.POS, Attachments())]:
+                counts.add(head, label)
+            if not (head and label):
+                wrong.append(s)
+        return wrong
+
+    def rows(self) -> list:
+        "the counts and scores as rows of statistics: key tuples and values"
+        rows = [(('sentences',), self.sentences), (('missing',), self.missing),
+                (('extra',), self.extra), (('misaligned',), self.misaligned),
+                (('words',), self.total.words)]
+        uas, las = self.total.scores()
+        rows += [(('UAS',), uas), (('LAS',), las)]
+        for name, table in [('DEPREL', self.deprels), ('POS', self.poss)]:
+            for value, counts in sorted(table.items(), key=lambda it: -it[1].words):
+                uas, las = counts.scores()
+                rows += [((name, value, 'words'), counts.words),
+                         ((name, value, 'UAS'), uas), ((name, value, 'LAS'), las)]
+        return rows
+
+
+def attachment_scores(gold: Iterable[str], system: Iterable[str], by_position: bool=False) -> list:
+    "UAS and LAS of the system lines against the gold lines, in all and by gold DEPREL and POS"
+    evaluation = Evaluation()
+    for key, g, s in joined_stanzas(gold, system, by_position):
+        evaluation.add(g and g[1], s and s[1])
+    return evaluation.rows()
+
+
+def differing_stanzas(gold: Iterable[str], system: Iterable[str], by_position: bool=False) -> Iterable[str]:
+    """
+    the gold and system stanzas of the sentences where some word is not right, with a comment
+    telling which is which, and MATCH_MARK in the MISC of the system words that are not right
+    """
+    evaluation = Evaluation()
+    for key, g, s in joined_stanzas(gold, system, by_position):
+        if g and s and (wrong := evaluation.add(g[1], s[1])):
+            for w in wrong:
+                w.MISC = w.MISC + MATCH_MARK
+            for (comms, nodes), name in [(g, 'gold'), (s, 'system')]:
+                yield from comms + ['# compare = ' + name] + [str(n) for n in nodes] + ['']
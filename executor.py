@@ -0,0 +1,132 @@
+# running the stages of an operation pipe in separate threads connected by bounded queues
+
+import queue
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Iterable
+
+QUEUE_SIZE = 64    # chunks waiting between two stages
+CHUNK_SIZE = 256   # items passed between stages at a time
+SWITCH_INTERVAL = 0.05  # seconds before a thread is asked to release the GIL, longer than default
+
+END = object()     # marks the end of a stream in a queue
+
+
+@dataclass
+class QueueMetrics:
+    "what happened in the queue after a stage"
+    stage: str
+    items: int = 0            # items put in the queue
+    chunks: int = 0           # chunks put in the queue
+    max_length: int = 0       # largest number of chunks waiting
+    producer_wait: float = 0  # seconds the stage waited for a full queue
+    consumer_wait: float = 0  # seconds the next stage waited for an empty queue
+
+    def __str__(self):
+        return '\t'.join([self.stage, str(self.items), str(self.chunks), str(self.max_length),
+                          '%.3f' % self.producer_wait, '%.3f' % self.consumer_wait])
+
+
+METRICS_HEADER = '\t'.join(['stage', 'items', 'chunks', 'max_queue', 'stage_wait', 'next_wait'])
+
+
+class Failure:
+    "an exception raised in a stage, passed on to the next stage"
+    def __init__(self, exception):
+        self.exception = exception
+
+
+def threaded(items: Iterable, metrics: QueueMetrics,
+             queue_size: int=QUEUE_SIZE, chunk_size: int=CHUNK_SIZE) -> Iterable:
+    """
+    iterate over items in a separate thread, which waits when queue_size chunks
+    have not yet been consumed, so that memory stays bounded
+    """
+    chunks = queue.Queue(queue_size)
+    stopped = threading.Event()
+
+    def put(x):
+        start = time.perf_counter()
+        while not stopped.is_set():
+            try:
+                chunks.put(x, timeout=0.1)
+                break
+            except queue.Full:
+                pass
+        metrics.producer_wait += time.perf_counter() - start
+        metrics.max_length = max(metrics.max_length, chunks.qsize())
+
+    def produce():
+        chunk = []
+        try:
+            for item in items:
+                chunk.append(item)
+                if len(chunk) >= chunk_size:
+                    metrics.items += len(chunk)
+                    metrics.chunks += 1
+                    put(chunk)
+                    chunk = []
+                    if stopped.is_set():
+                        return
+            if chunk:
+                metrics.items += len(chunk)
+                metrics.chunks += 1
+                put(chunk)
+            put(END)
+        except BaseException as e:
+            put(Failure(e))
+
+    threading.Thread(target=produce, name=metrics.stage, daemon=True).start()
+    try:
+        while True:
+            start = time.perf_counter()
+            chunk = chunks.get()
+            metrics.consumer_wait += time.perf_counter() - start
+            if chunk is END:
+                return
+            if isinstance(chunk, Failure):
+                raise chunk.exception
+            for item in chunk:
+                yield item
+    finally:
+        stopped.set()
+
+
+def pipelined(stages: list, strs: Iterable[str], selected: str='all', queue_size: int=QUEUE_SIZE,
+              chunk_size: int=CHUNK_SIZE) -> tuple[Iterable, list[QueueMetrics]]:
+    """
+    apply a list of operations to a stream of strings, running the selected stages that return
+    streams in their own threads: 'all', or names separated by commas, where 'read' is reading
+    the input; return the resulting stream, to be consumed in the calling thread, and the metrics
+    of the queues
+    """
+    names = selected.split(',')
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(SWITCH_INTERVAL)  # fewer GIL handovers between busy stages
+    metrics = []
+    items = strs
+    try:
+        for name, stage in [('read', None)] + [(stage.name, stage) for stage in stages]:
+            if stage:
+                items = stage(items)
+            if ('all' in names or name in names) and not isinstance(items, (list, str)):
+                metrics.append(QueueMetrics(name))
+                items = threaded(items, metrics[-1], queue_size, chunk_size)
+    except BaseException:
+        sys.setswitchinterval(interval)
+        raise
+    if isinstance(items, (list, str)):
+        sys.setswitchinterval(interval)
+        return items, metrics
+    return restoring_interval(items, interval), metrics
+
+
+def restoring_interval(items: Iterable, interval: float) -> Iterable:
+    "the items of a stream, setting the switch interval of threads back to interval when it ends"
+    try:
+        for item in items:
+            yield item
+    finally:
+        sys.setswitchinterval(interval)
@@ -0,0 +1,88 @@
+# memoized trees of pipe prefixes, keyed by a hash of the input and the commands of the prefix,
+# stored in a directory with a size limit, the least recently used results removed first
+
+import hashlib
+import os
+import tempfile
+from typing import Iterable, TextIO
+from trees import *
+from treebin import MAGIC, TreeEncoder, decode_trees
+
+MEMO_SUFFIX = '.trees'
+MEMO_SIZE = 1024   # megabytes
+
+
+def file_digest(path: str) -> str:
+    "the hash of the contents of a file"
+    h = hashlib.blake2b()
+    with open(path, 'rb') as file:
+        while chunk := file.read(1 << 20):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def spooled_digest(lines: Iterable[str]) -> tuple[str, TextIO]:
+    """
+    the hash of a stream of lines, the same as file_digest of a file with these lines, and
+    a temporary file with the lines, from which they are read again after hashing
+    """
+    h = hashlib.blake2b()
+    file = tempfile.TemporaryFile('w+', encoding='utf-8', newline='')
+    for line in lines:
+        h.update(line.encode('utf-8'))
+        file.write(line)
+    file.seek(0)
+    return h.hexdigest(), file
+
+
+def memo_path(directory: str, digest: str, prefix: str) -> str:
+    "the file of the result of the pipe prefix on the input with the digest"
+    key = hashlib.blake2b((digest + '\n' + prefix).encode('utf-8'), digest_size=20).hexdigest()
+    return os.path.join(directory, key + MEMO_SUFFIX)
+
+
+def read_memo(path: str) -> Iterable[DepTree]:
+    "the trees of a memoized result, marking the result as recently used"
+    os.utime(path)
+    with open(path, 'rb') as file:
+        for tree in decode_trees(file):
+            yield tree
+
+
+def writing_memo(path: str, trees: Iterable[DepTree], size: int=MEMO_SIZE) -> Iterable[DepTree]:
+    """
+    pass on trees, writing them into a memo file before later stages can change them;
+    the file is only put in place if all trees were passed, and then the least recently
+    used files are removed until the directory is at most size megabytes
+    """
+    temp = path + '.' + str(os.getpid())
+    try:
+        with open(temp, 'wb') as file:
+            file.write(MAGIC)
+            encoder = TreeEncoder()
+            for tree in trees:
+                if block := encoder.add(tree):
+                    file.write(block)
+                yield tree
+            file.write(encoder.flush())
+        os.replace(temp, path)
+        evict_memos(os.path.dirname(path), size)
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+
+
+def evict_memos(directory: str, size: int):
+    "remove the least recently used memo files until their total size is at most size megabytes"
+    entries = []
+    for name in os.listdir(directory):
+        if name.endswith(MEMO_SUFFIX):
+            st = os.stat(os.path.join(directory, name))
+            entries.append((st.st_mtime_ns, st.st_size, name))
+    total = sum(e[1] for e in entries)
+    entries.sort()
+    for _, bytes, name in entries:
+        if total <= size << 20:
+            break
+        os.remove(os.path.join(directory, name))
+        total -= bytes
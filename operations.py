@@ -2,11 +2,27 @@
 
 import sys
 import os  # temporarily, to call VisualizeUD.hs
-from dataclasses import dataclass
+import multiprocessing
+from functools import partial
+from dataclasses import dataclass, field, replace
 from typing import Iterable, Callable
 from trees import *
 from patterns import *
-from treetypes import treetype_statistics_dict, head_dep_statistics_dict
+from treetypes import treetype_statistics_dict, head_dep_statistics_dict, treetype_keys, head_dep_keys, TreeTypeDictionary
+from counting import CountOptions, approximate_counts, select_statistics, external_statistics
+from executor import pipelined, QUEUE_SIZE, METRICS_HEADER
+from sinks import *
+from treebin import encode_trees
+from treecache import cached_trees
+from corpus import is_corpus, write_corpus, corpus_columns, CorpusColumns, CorpusStore
+from corpusindex import EdgeIndex, candidate_sentences
+from arena import ArenaHandle, CorpusArena, attach
+from cluster import WorkerError, serve_worker, distributed_results, read_manifest, write_shards, parse_address
+from validation import ConlluError, error_message, numbered_stanzas, stanza_errors, stanza_sent_id, conllu_errors, file_errors
+from evaluation import attachment_scores, differing_stanzas
+from dedup import ExactFilter, BloomFilter, MinHashFilter, duplicate_report
+from memo import MEMO_SIZE, file_digest, spooled_digest, memo_path, read_memo, writing_memo
+from vectorstats import add_counts, coded_wordline_statistics, coded_ngram_statistics, coded_column_statistics
 from visualize_ud import conll2svg
 from udpipe2_client import process
 from yaml import safe_load
@@ -25,12 +41,22 @@ class Operation:
     valtype: type
     name: str
     doc: str
+    args: tuple = ()   # the words after the name in the command
+    stages: list = field(default=None, repr=False)  # the operations of a pipe
     
     def __call__(self, arg):
         return self.oper(arg)
     def __doc__(self):
         return doc
 
+    def command(self) -> str:
+        "the command that gives this operation"
+        return ' '.join([self.name, *self.args])
+
+    def parts(self) -> list:
+        "the operations of a pipe, or the operation itself"
+        return self.stages or [self]
+
     def pipe_two(self, oper2):
         "apply self, then apply another operation on the result"
         if (t1 := self.valtype) == (t2 := oper2.argtype):
@@ -39,7 +65,8 @@ class Operation:
                 self.argtype,
                 oper2.valtype,
                 self.name + ' | ' + oper2.name,
-                '\n'.join([self.doc, 'then' + oper2.doc])
+                '\n'.join([self.doc, 'then' + oper2.doc]),
+                stages=self.parts() + oper2.parts()
                 )
         else:
             raise TypeError(' '.join(
@@ -86,9 +113,8 @@ def conllu2wordlines(lines: CoNLLU) -> Iterable[WordLine]:
             pass
 
 
-@operation
-def conllu2trees(lines: CoNLLU) -> Iterable[DepTree]:
-    "convert a stream of lines into a stream of deptrees"
+def conllu2stanzas(lines: CoNLLU) -> Iterable[tuple[list[str], list[WordLine]]]:
+    "convert a stream of lines into a stream of comments and wordlines of each stanza"
     comms = []
     nodes = []
     for line in lines:
@@ -98,12 +124,55 @@ def conllu2trees(lines: CoNLLU) -> Iterable[DepTree]:
             t = read_wordline(line)
             nodes.append(t)
         else:
-            dt = build_deptree(nodes)
-            dt.comments = comms
-            yield dt
+            yield comms, nodes
             comms = []
             nodes = []
 
+
+@operation
+def conllu2trees(lines: CoNLLU) -> Iterable[DepTree]:
+    "convert a stream of lines into a stream of deptrees"
+    for comms, nodes in conllu2stanzas(lines):
+        dt = build_deptree(nodes)
+        dt.comments = comms
+        yield dt
+
+
+def conllu2valid_trees(source: str) -> Operation:
+    "the same as conllu2trees, but skipping the stanzas that validate finds errors in, reported in stderr"
+    def valid_trees(lines):
+        for stanza, terminated in numbered_stanzas(lines):
+            if not terminated:
+                break
+            errors = stanza_errors(stanza)
+            if not errors:
+                try:
+                    dt = build_deptree([read_wordline(line) for _, line in stanza if not line.startswith('#')])
+                except Exception:
+                    errors = [ConlluError(stanza[0][0], stanza_sent_id(stanza), 'not a valid tree')]
+            if errors:
+                print(error_message(source, errors[0]) + ': stanza skipped', file=sys.stderr)
+                continue
+            dt.comments = [line.strip() for _, line in stanza if line.startswith('#')]
+            yield dt
+    return Operation(
+        valid_trees,
+        CoNLLU,
+        Iterable[DepTree],
+        'conllu2valid_trees',
+        "convert a stream of lines into a stream of deptrees, skipping the stanzas with errors"
+        )
+
+
+def validate(source: str='<stdin>') -> Operation:
+    return Operation(
+        lambda lines: (error_message(source, e) for e in conllu_errors(lines)),
+        CoNLLU,
+        Iterable[str],
+        'validate',
+        "check that the input is valid CoNLL-U, giving each error as file:line: sent_id: message"
+        )
+
             
 @operation
 def wordlines2wordliness(lines: Iterable[WordLine]) -> Iterable[list[WordLine]]:
@@ -132,7 +201,7 @@ def wordlines2strs(lines: Iterable[WordLine]) -> Iterable[str]:
 def trees2strs(trees: Iterable[DepTree]) -> Iterable[str]:
     "convert wordlines to tab-separated strings line by line"
     for tree in trees:
-        yield str(tree)
+        yield str(mark_matches(tree))
         yield ''
 
 
@@ -140,14 +209,14 @@ def trees2strs(trees: Iterable[DepTree]) -> Iterable[str]:
 def trees2wordliness(trees: Iterable[DepTree]) -> Iterable[list[WordLine]]:
     "convert a stream of deptrees to a stream of relabeled lists of wordlines"
     for tree in trees:
-        tree = relabel_deptree(tree)
+        tree = relabel_deptree(mark_matches(tree))
         yield tree.wordlines()
 
 @operation
 def trees2conllu(trees: Iterable[DepTree]) -> Iterable[str]:
     "convert a stream of deptrees to a stream of relabeled lists of wordlines"
     for tree in trees:
-        tree = relabel_deptree(tree)
+        tree = relabel_deptree(mark_matches(tree))
         for line in tree.comments + list(map(str, tree.wordlines())):
             yield line
         yield ''
@@ -157,7 +226,7 @@ def trees2conllu(trees: Iterable[DepTree]) -> Iterable[str]:
 def trees2wordlines(trees: Iterable[DepTree]) -> Iterable[WordLine]:
     "convert a stream of deptrees to a stream wordlines"
     for tree in trees:
-        for line in tree.wordlines():
+        for line in mark_matches(tree).wordlines():
             yield line
 
 
@@ -205,6 +274,26 @@ def extract_fields(fields: list[str]) -> Operation:
         )
 
 
+def convert_corpus(path: str) -> Operation:
+    return Operation (
+        lambda lines: [' '.join(['#', path] + ['%s=%s' % it for it in write_corpus(path, lines).items()])],
+        CoNLLU,
+        Iterable[str],
+        'convert_corpus',
+        "write the input into a columnar corpus store in directory <path>, to be read with --input <path>"
+        )
+
+
+def split_shards(path: str, size: int) -> Operation:
+    return Operation (
+        lambda lines: write_shards(lines, path, size),
+        CoNLLU,
+        Iterable[str],
+        'split_shards',
+        "split the input into shards of <size> sentences in directory <path>, listed in <path>/manifest.txt"
+        )
+
+        
 def take_trees(begin: int, end: int) -> Operation:
     
     def take(ts):
@@ -222,9 +311,41 @@ def take_trees(begin: int, end: int) -> Operation:
         )
 
         
-def statistics(fields: list[str]) -> Operation:
+@dataclass
+class CountedStatistics:
+    "the body of a statistics operation: exact counts by default, approximate or external if requested"
+    exact: Callable   # the frequency table of a stream
+    keys: Callable    # the keys counted in the frequency table
+    options: CountOptions
+    parts_add_up: bool = True   # if the exact tables of consecutive parts of a stream add up to its table
+
+    def __call__(self, xs):
+        if self.options.approx:
+            stats = approximate_counts(self.keys(xs), self.options.approx)
+        elif self.options.spill:
+            return external_statistics(self.keys(xs), self.options)
+        else:
+            stats = self.exact(xs)
+        return select_statistics(stats, self.options)
+
+    def mergeable(self) -> bool:
+        "if the result can be merged from exact tables of parts of a stream, e.g. counted in separate processes"
+        return self.parts_add_up and not (self.options.approx or self.options.spill)
+
+    def merge(self, tables: Iterable[dict]) -> list:
+        "the result from the exact tables of consecutive parts of a stream"
+        stats = {}
+        for table in tables:
+            add_counts(stats, table.keys(), table.values())
+        return select_statistics(stats, self.options)
+
+
+def statistics(fields: list[str], options: CountOptions=CountOptions()) -> Operation:
     return Operation (
-        lambda ws: sorted_statistics(wordline_statistics(fields, ws)),
+        CountedStatistics(
+            lambda ws: coded_wordline_statistics(fields, ws),
+            lambda ws: wordline_keys(fields, ws),
+            options),
         Iterable[WordLine],
         list,
         'statistics',
@@ -232,10 +353,13 @@ def statistics(fields: list[str]) -> Operation:
         )
 
 
-def ngram_statistics(n: int, fields: list[str]) -> Operation:
+def ngram_statistics(n: int, fields: list[str], options: CountOptions=CountOptions()) -> Operation:
     return Operation (
-        lambda ws: sorted_statistics(wordline_ngram_statistics(fields,
-                        wordline_ngrams(n, wordlines2wordliness(ws)))),
+        CountedStatistics(
+            lambda ws: coded_ngram_statistics(n, fields, wordlines2wordliness(ws)),
+            lambda ws: wordline_ngram_keys(fields, wordline_ngrams(n, wordlines2wordliness(ws))),
+            options,
+            parts_add_up=False),  # the last sentence of a stream of wordlines is not counted
         Iterable[WordLine],
         list,
         'statistics',
@@ -243,9 +367,12 @@ def ngram_statistics(n: int, fields: list[str]) -> Operation:
         )
 
 
-def tree_ngram_statistics(n: int, fields: list[str]) -> Operation:
+def tree_ngram_statistics(n: int, fields: list[str], options: CountOptions=CountOptions()) -> Operation:
     return Operation (
-        lambda ws: sorted_statistics(wordline_ngram_statistics(fields, ngrams(n, ws))),
+        CountedStatistics(
+            lambda ts: coded_ngram_statistics(n, fields, (t.wordlines() for t in ts)),
+            lambda ts: wordline_ngram_keys(fields, ngrams(n, ts)),
+            options),
         Iterable[DepTree],
         list,
         'statistics',
@@ -253,9 +380,12 @@ def tree_ngram_statistics(n: int, fields: list[str]) -> Operation:
         )
 
 
-def treetype_statistics(fields: list[str]) -> Operation:
+def treetype_statistics(fields: list[str], options: CountOptions=CountOptions()) -> Operation:
     return Operation(
-        lambda trees: sorted_statistics(treetype_statistics_dict(trees, fields)),
+        CountedStatistics(
+            lambda trees: treetype_statistics_dict(trees, fields),
+            lambda trees: treetype_keys(trees, fields),
+            options),
         Iterable[DepTree],
         list,
         'treetype_statistics',
@@ -263,9 +393,12 @@ def treetype_statistics(fields: list[str]) -> Operation:
         )
 
 
-def head_dep_statistics(fields: list[str]) -> Operation:
+def head_dep_statistics(fields: list[str], options: CountOptions=CountOptions()) -> Operation:
     return Operation(
-        lambda trees: sorted_statistics(head_dep_statistics_dict(trees, fields)),
+        CountedStatistics(
+            lambda trees: head_dep_statistics_dict(trees, fields),
+            lambda trees: head_dep_keys(trees, fields),
+            options),
         Iterable[DepTree],
         list,
         'head_dep_statistics',
@@ -273,6 +406,101 @@ def head_dep_statistics(fields: list[str]) -> Operation:
         )
 
 
+def treetype_dictionary(path: str, fields: list[str]) -> Operation:
+
+    def update(trees):
+        dictionary = TreeTypeDictionary.load(path, fields)
+        counts = dictionary.add(trees)
+        dictionary.save(path)
+        types = dictionary.types()
+        for i, n in sorted(counts.items(), key=lambda it: -it[1]):
+            yield '\t'.join([str(i), str(n), str(types[i]), ' '.join(dictionary.examples[i])])
+
+    return Operation (
+        update,
+        Iterable[DepTree],
+        Iterable[str],
+        'treetype_dictionary',
+        "add the types of trees to the dictionary in <file>, give their ids, counts and examples"
+        )
+
+
+DEDUP_OPTIONS = {'--bloom': int, '--minhash': float}
+
+
+def parse_dedup_options(ww: list[str]) -> tuple[list[str], dict]:
+    "separate the options of dedup_trees, --bloom <megabytes> and --minhash <threshold>, from its key fields"
+    fields, options = [], {}
+    words = iter(ww)
+    for w in words:
+        if w in DEDUP_OPTIONS:
+            try:
+                options[w[2:]] = DEDUP_OPTIONS[w](next(words))
+            except (StopIteration, ValueError):
+                raise ParseError('expected a number after ' + w)
+        elif w in WORDLINE_FIELDS or w == 'tree':
+            fields.append(w)
+        else:
+            raise ParseError('expected a field or tree as key of dedup_trees, not ' + w)
+    return fields, options
+
+
+def dedup_key(fields: list[str], minhash: float=None) -> Callable:
+    "the key of a sentence by which duplicates are found, from its wordlines"
+    if minhash:
+        return lambda ws: [w.FORM.lower() for w in ws]
+    if not fields:
+        return lambda ws: ' '.join(w.FORM for w in ws)
+    if 'tree' in fields:
+        return lambda ws: '\n'.join(map(str, ws))
+    return lambda ws: '\n'.join('\t'.join(getattr(w, f) for f in fields) for w in ws)
+
+
+def deduplicated(items: Iterable, wordlines: Callable, fields: list[str], bloom: int=None, minhash: float=None) -> Iterable:
+    "the items whose key was not seen before, reporting the rate of duplicates in stderr at the end"
+    if minhash:
+        filter = MinHashFilter(minhash)
+    else:
+        filter = BloomFilter(bloom) if bloom else ExactFilter()
+    key = dedup_key(fields, minhash)
+    total = duplicates = 0
+    for item in items:
+        total += 1
+        if filter.seen(key(wordlines(item))):
+            duplicates += 1
+        else:
+            yield item
+    print(duplicate_report('dedup_trees', total, duplicates, filter.note()), file=sys.stderr)
+
+
+def dedup_trees(fields: list[str], bloom: int=None, minhash: float=None) -> Operation:
+    return Operation (
+        lambda trees: deduplicated(trees, DepTree.wordlines, fields, bloom, minhash),
+        Iterable[DepTree],
+        Iterable[DepTree],
+        'dedup_trees',
+        "remove trees whose sentence, fields or whole tree was seen before, reporting the rate in stderr"
+        )
+
+
+def compare(path: str, by_position: bool=False, diffs: bool=False) -> Operation:
+    if diffs:
+        return Operation (
+            lambda lines: differing_stanzas(open_input(path), lines, by_position),
+            CoNLLU,
+            Iterable[str],
+            'compare',
+            "the gold stanzas in <file> and the input stanzas of sentences where they differ, wrong words marked"
+            )
+    return Operation (
+        lambda lines: attachment_scores(open_input(path), lines, by_position),
+        CoNLLU,
+        list,
+        'compare',
+        "UAS and LAS of the input against the gold stanzas in <file>, in all and by gold DEPREL and POS"
+        )
+
+
 def count_wordlines() -> Operation:
     return Operation (
         lambda ws: [len(list(ws))],
@@ -295,7 +523,7 @@ def count_trees() -> Operation:
 
 def match_wordlines(patt: Pattern) -> Operation:
     return Operation (
-        lambda ws: (w for w in ws if match_wordline(patt, w)),
+        lambda ws: filter(wordline_predicate(patt), ws),
         Iterable[WordLine],
         Iterable[WordLine],
         'match_wordlines',
@@ -306,9 +534,7 @@ def match_wordlines(patt: Pattern) -> Operation:
 def match_trees(patt: Pattern) -> Operation:
 
     def matcht(ts):
-        for tr in ts:
-            for t in matches_of_deptree(patt, tr):
-                yield t
+        return filter(deptree_predicate(patt), ts)
                 
     return Operation (
         matcht,
@@ -322,8 +548,9 @@ def match_trees(patt: Pattern) -> Operation:
 def match_subtrees(patt: Pattern) -> Operation:
 
     def matcht(ts):
+        match = deptree_predicate(patt)
         for tr in ts:
-            for t in matches_in_deptree(patt, tr):
+            for t in matches_in_deptree(patt, tr, match):
                 yield t
                 
     return Operation (
@@ -338,8 +565,9 @@ def match_subtrees(patt: Pattern) -> Operation:
 def match_found_in_tree(patt: Pattern) -> Operation:
 
     def matcht(ts):
+        match = deptree_predicate(patt)
         for tr in ts:
-            for t in match_found_in_deptree(patt, tr):
+            for t in match_found_in_deptree(patt, tr, match):
                 yield t
                 
     return Operation (
@@ -368,18 +596,13 @@ def match_segments(patt: Pattern) -> Operation:
         
 
 def change_wordlines(patt: Pattern) -> Operation:
-    return Operation (
-        lambda ws: (change_wordline(patt, w) for w in ws),
-        Iterable[WordLine],
-        Iterable[WordLine],
-        'change_wordlines',
-        'pattern-based changes in wordlines'
-        )    
+    return rewrite_wordlines([patt])
 
 
 def change_trees(patt: Pattern) -> Operation:
+    rewrite = Rewriter().add(patt, recursive=False)
     return Operation (
-        lambda ws: (change_deptree(patt, w) for w in ws),
+        lambda ts: map(rewrite, ts),
         Iterable[DepTree],
         Iterable[DepTree],
         'change_subtrees',
@@ -387,15 +610,46 @@ def change_trees(patt: Pattern) -> Operation:
         )
 
 
-def change_subtrees(patt: Pattern) -> Operation:
+def change_subtrees(patt: Pattern, fixpoint: bool=False) -> Operation:
+    rewrite = Rewriter().add(patt, fixpoint=fixpoint)
     return Operation (
-        lambda ws: (changes_in_deptree(patt, w) for w in ws),
+        lambda ts: map(rewrite, ts),
         Iterable[DepTree],
         Iterable[DepTree],
         'change_subtrees',
         'pattern-based changes recursively in subtrees, top-down'
         )
 
+
+def rewrite_wordlines(patts: list[Pattern]) -> Operation:
+    change = changes_in_order([wordline_change(patt) for patt in patts])
+
+    def changed(word):
+        change(word)
+        return word
+
+    return Operation (
+        lambda ws: map(changed, ws),
+        Iterable[WordLine],
+        Iterable[WordLine],
+        'rewrite_wordlines',
+        'pattern-based changes in wordlines'
+        )
+
+
+def rewrite_trees(stages: list[Operation]) -> Operation:
+    rewrite = Rewriter()
+    for op in stages:
+        fixpoint = op.args[:1] == ('--fixpoint',)
+        rewrite.add(parse_pattern(' '.join(op.args[fixpoint:])), op.name == 'change_subtrees', fixpoint)
+    return Operation (
+        lambda ts: map(rewrite, ts),
+        Iterable[DepTree],
+        Iterable[DepTree],
+        'rewrite_trees',
+        "the same as consecutive change_subtrees and change_trees, in one loop over trees"
+        )
+
 def find_paths(patts: [Pattern]) -> Operation:
     return Operation (
         lambda ts: (p for t in ts for p in find_paths_in_subtrees(patts, t)),
@@ -466,8 +720,36 @@ def from_script(filename: str) -> Operation:
         return parse_operation_pipe(script.read())
             
 
+COUNT_OPTIONS = {
+    '--top': 'top', '--min-count': 'min_count', '--approx': 'approx', '--spill': 'spill'
+    }
+
+
+def parse_count_options(ww: list[str]) -> tuple[list[str], CountOptions]:
+    "separate the options of statistics operations, --option <int>, from other arguments"
+    args = []
+    options = CountOptions()
+    words = iter(ww)
+    for w in words:
+        if w in COUNT_OPTIONS:
+            try:
+                setattr(options, COUNT_OPTIONS[w], int(next(words)))
+            except (StopIteration, ValueError):
+                raise ParseError('expected an integer after ' + w)
+        else:
+            args.append(w)
+    return args, options
+
+
 def parse_operation(ss: list[str]) -> Operation:
     "operation parser for files and command line arguments"
+    op = parse_operation_words(ss)
+    if op.stages:  # a script or a predefined pipe, whose stages already have their names
+        return op
+    return replace(op, name=ss[0], args=tuple(ss[1:]))
+
+
+def parse_operation_words(ss: list[str]) -> Operation:
     match ss:
         case ['count_wordlines', *ww]:
             return count_wordlines()
@@ -487,6 +769,8 @@ def parse_operation(ss: list[str]) -> Operation:
             return change_wordlines(parse_pattern(' '.join([*ww])))
         case ['change_trees', *ww]:
             return change_trees(parse_pattern(' '.join([*ww])))
+        case ['change_subtrees', '--fixpoint', *ww]:
+            return change_subtrees(parse_pattern(' '.join([*ww])), True)
         case ['change_subtrees', *ww]:
             return change_subtrees(parse_pattern(' '.join([*ww])))
         case ['find_paths', *ww]:
@@ -501,18 +785,34 @@ def parse_operation(ss: list[str]) -> Operation:
             return trees2conllu
         case ['trees2wordlines']:
             return trees2wordlines
+        case ['convert_corpus', path]:
+            return convert_corpus(path)
+        case ['split_shards', path, size]:
+            return split_shards(path, int(size))
         case ['take_trees', begin, end]:
             return take_trees(int(begin), int(end))
         case ['statistics', *ww]:
-            return statistics(ww)
-        case ['ngram_statistics', n, *ww]:
-            return ngram_statistics(int(n), ww)
-        case ['tree_ngram_statistics', n, *ww]:
-            return tree_ngram_statistics(int(n), ww)
+            return statistics(*parse_count_options(ww))
+        case ['ngram_statistics', *ww]:
+            (n, *ww), options = parse_count_options(ww)
+            return ngram_statistics(int(n), ww, options)
+        case ['tree_ngram_statistics', *ww]:
+            (n, *ww), options = parse_count_options(ww)
+            return tree_ngram_statistics(int(n), ww, options)
         case ['treetype_statistics', *ww]:
-            return treetype_statistics(ww)
+            return treetype_statistics(*parse_count_options(ww))
         case ['head_dep_statistics', *ww]:
-            return head_dep_statistics(ww)
+            return head_dep_statistics(*parse_count_options(ww))
+        case ['dedup_trees', *ww]:
+            fields, options = parse_dedup_options(ww)
+            return dedup_trees(fields, **options)
+        case ['compare', *ww, path]:
+            for w in ww + [path] * path.startswith('--'):
+                if w not in ['--by-position', '--diffs'] or w == path:
+                    raise ParseError('unknown option ' + w + ' of compare, expected --by-position or --diffs before the file')
+            return compare(path, '--by-position' in ww, '--diffs' in ww)
+        case ['treetype_dictionary', path, *ww]:
+            return treetype_dictionary(path, ww)
         case ['extract_fields', *ww]:
             return extract_fields(ww)
         case ['underscore_fields', *ww]:
@@ -527,6 +827,10 @@ def parse_operation(ss: list[str]) -> Operation:
             return txt2conllu_yaml
         case ['conllu2trees']:
             return conllu2trees
+        case ['validate']:
+            return validate()
+        case [name] if name in CONVERSIONS:
+            return CONVERSIONS[name]
         case _:
             raise ParseError(' '.join(['operation'] + ss + ['not matched']))
 
@@ -558,18 +862,628 @@ def postprocess_operation(op: Operation) -> Operation:
         return op
 
     
-# an example of "static typing", i.e. checked and rejected before applied to input
-# invalid_operation = pipe([conllu2wordlines, conllu2wordlines])
+@dataclass
+class ExecutionOptions:
+    "how a pipe is executed, given as --flags before the command"
+    explain: bool = False      # show the stages and their fusions instead of running
+    threads: str = None        # stages run in separate threads: all, or names separated by commas
+    queue_size: int = QUEUE_SIZE  # chunks of items waiting between threads
+    metrics: bool = False      # show the metrics of the queues between threads in stderr
+    format: str = None         # output format: conllu, tsv, jsonl, or bin
+    output: str = None         # output file, stdout by default
+    input: str = None          # input file, stdin by default
+    cache: bool = False        # read the trees of the input file from its cache, if valid
+    memo: str = None           # directory of memoized trees of pipe prefixes
+    memo_size: int = MEMO_SIZE  # megabytes in the memo directory, least recently used removed first
+    processes: int = None      # worker processes sharing the input in memory
+    shards: str = None         # manifest of the shards of the input, run by --workers
+    workers: str = None        # addresses of worker servers, host:port separated by commas
+    skip_invalid: bool = False  # skip the stanzas with errors, reported in stderr
+
+
+def parse_execution_options(args: list[str]) -> tuple[ExecutionOptions, list[str]]:
+    "separate --flags and --options <value> of ExecutionOptions from other arguments"
+    options = ExecutionOptions()
+    types = {name: f.type for name, f in ExecutionOptions.__dataclass_fields__.items()}
+    rest = []
+    words = iter(args)
+    for w in words:
+        if w.startswith('--') and (name := w[2:].replace('-', '_')) in types:
+            if types[name] is bool:
+                setattr(options, name, True)
+            else:
+                try:
+                    setattr(options, name, types[name](next(words)))
+                except (StopIteration, ValueError):
+                    raise ParseError('expected a value of type ' + types[name].__name__ + ' after ' + w)
+        else:
+            rest.append(w)
+    return options, rest
+
+
+# conversions of results to lines, or bytes, in the formats given by --format
+OUTPUT_CONVERSIONS = {
+    ('conllu', Iterable[DepTree]): trees2conllu,
+    ('conllu', Iterable[WordLine]): wordlines2strs,
+    ('conllu', Iterable[list[WordLine]]): wordliness2conllu,
+    ('conllu', Iterable[str]): lambda lines: lines,
+    ('tsv', list): statistics2tsv,
+    ('tsv', list[int]): lambda counts: map(str, counts),
+    ('tsv', Iterable[WordLine]): wordlines2strs,
+    ('tsv', Iterable[str]): lambda lines: lines,
+    ('jsonl', list): statistics2jsonl,
+    ('jsonl', list[int]): counts2jsonl,
+    ('jsonl', Iterable[DepTree]): items2jsonl,
+    ('jsonl', Iterable[WordLine]): items2jsonl,
+    ('jsonl', Iterable[list[WordLine]]): items2jsonl,
+    ('jsonl', Iterable[str]): items2jsonl,
+    ('bin', Iterable[DepTree]): lambda trees: encode_trees(map(mark_matches, trees)),
+    }
 
 
-def execute_pipe_on_strings(command: str, strs: Iterable[str]):
-    "apply a command to a stream of strings, with pre- and postprocessing if needed"
+def format_operation(op: Operation, format: str) -> Operation:
+    "convert the output of operations to strings, or to bytes in the bin format"
+    if format is None:
+        return postprocess_operation(op)
+    if format not in OUTPUT_FORMATS:
+        raise ParseError('unknown output format ' + format + ', expected one of ' + ' '.join(OUTPUT_FORMATS))
+    if (conversion := OUTPUT_CONVERSIONS.get((format, op.valtype))) is None:
+        raise TypeError(' '.join(['output type', str(op.valtype), 'of', op.name,
+                                  'cannot be written in format', format]))
+    if isinstance(conversion, Operation):
+        return pipe([op, conversion])
+    return pipe([op, Operation(
+        conversion,
+        op.valtype,
+        Iterable[bytes] if format == 'bin' else Iterable[str],
+        'to_' + format,
+        'convert the output to the ' + format + ' format'
+        )])
+
+
+# pipe optimization: adjacent stages are fused into single loops,
+# and trees are not built if no stage needs their structure
+
+@operation
+def conllu2conllu(lines: CoNLLU) -> Iterable[str]:
+    "the same as conllu2trees | trees2conllu, without building trees"
+    for comms, nodes in conllu2stanzas(lines):
+        for line in comms + list(map(str, relabel_wordlines(nodes))):
+            yield line
+        yield ''
+
+
+@operation
+def conllu2sentences(lines: CoNLLU) -> Iterable[str]:
+    "the same as conllu2trees | extract_sentences, without building trees"
+    for _, nodes in conllu2stanzas(lines):
+        words = relabel_wordlines(nodes) if repeated_ids(nodes) else stanza_wordlines(nodes)
+        yield ' '.join([word.FORM for word in words])
+
+
+@operation
+def conllu2treewordlines(lines: CoNLLU) -> Iterable[WordLine]:
+    "the same as conllu2trees | trees2wordlines, without building trees"
+    for _, nodes in conllu2stanzas(lines):
+        for line in stanza_wordlines(nodes):
+            yield line
+
+
+@operation
+def trees2sentences(trees: Iterable[DepTree]) -> Iterable[str]:
+    "the same as extract_sentences, relabelling only the trees with repeated IDs"
+    for tree in trees:
+        if repeated_ids(tree.wordlines()):
+            yield ' '.join([word.FORM for word in relabel_deptree(tree).wordlines()])
+        else:
+            yield tree.sentence()
+
+
+def conllu_count_trees() -> Operation:
+
+    def count(lines):
+        n = 0
+        for _, nodes in conllu2stanzas(lines):
+            if not any(node.HEAD == '0' for node in nodes):
+                raise NotValidTree(str(nodes))
+            if repeated_ids(nodes):
+                build_deptree(nodes)   # fails where the repeated IDs make a cycle
+            n += 1
+        return [n]
+    
+    return Operation (
+        count,
+        CoNLLU,
+        list[int],
+        'conllu_count_trees',
+        "the same as conllu2trees | count_trees, without building trees"
+        )
+
+
+def conllu_dedup_trees(fields: list[str], bloom: int=None, minhash: float=None) -> Operation:
+
+    def trees(lines):
+        for comms, nodes in deduplicated(conllu2stanzas(lines), lambda s: stanza_wordlines(s[1]), fields, bloom, minhash):
+            dt = build_deptree(nodes)
+            dt.comments = comms
+            yield dt
+
+    return Operation (
+        trees,
+        CoNLLU,
+        Iterable[DepTree],
+        'conllu_dedup_trees',
+        "the same as conllu2trees | dedup_trees, building only the trees that are kept"
+        )
+
+
+def conllu_dedup_treewordlines(fields: list[str], bloom: int=None, minhash: float=None) -> Operation:
+
+    def wordlines(lines):
+        for words in deduplicated((stanza_wordlines(nodes) for _, nodes in conllu2stanzas(lines)),
+                                  lambda ws: ws, fields, bloom, minhash):
+            for word in words:
+                yield word
+
+    return Operation (
+        wordlines,
+        CoNLLU,
+        Iterable[WordLine],
+        'conllu_dedup_treewordlines',
+        "the same as conllu2trees | dedup_trees | trees2wordlines, without building trees"
+        )
+
+
+def conllu_statistics(patt: Pattern, fields: list[str], options: CountOptions=CountOptions()) -> Operation:
+    indices = [WORDLINE_FIELD_INDEX[field] for field in fields]
+
+    def rows(lines):
+        match = wordline_predicate(patt) if patt is not None else None
+        for line in lines:
+            cols = line.strip().split('\t')
+            if len(cols) == 10 and cols[0][:1].isdigit():
+                if match is None or match(WordLine(*cols)):
+                    yield cols
+
+    return Operation (
+        CountedStatistics(
+            lambda lines: coded_column_statistics(indices, rows(lines)),
+            lambda lines: (tuple(cols[i] for i in indices) for cols in rows(lines)),
+            options),
+        CoNLLU,
+        list,
+        'conllu_statistics',
+        "the same as conllu2wordlines | match_wordlines | statistics, in one loop over lines"
+        )
+
+
+def leading_stages(stages: list[Operation], names: list[str]) -> int:
+    "the number of stages from the start that have one of the names"
+    n = 0
+    while n < len(stages) and stages[n].name in names:
+        n += 1
+    return n
+
+
+def fuse_stages(stages: list[Operation]) -> tuple[list[Operation], str]:
+    "fuse the first adjacent stages that have a fused implementation, return None if there are none"
+    for i in range(len(stages)):
+        match [op.name for op in stages[i:i+3]]:
+            case ['conllu2wordlines', 'match_wordlines', 'statistics']:
+                patt = parse_pattern(' '.join(stages[i+1].args))
+                fused, n = conllu_statistics(patt, *parse_count_options(stages[i+2].args)), 3
+            case ['conllu2wordlines', 'statistics', *_]:
+                fused, n = conllu_statistics(None, *parse_count_options(stages[i+1].args)), 2
+            case ['conllu2trees', 'trees2conllu', *_]:
+                fused, n = conllu2conllu, 2
+            case ['trees2wordliness', 'wordlines2sentences', *_]:
+                fused, n = trees2sentences, 2
+            case ['conllu2trees', 'trees2sentences', *_]:
+                fused, n = conllu2sentences, 2
+            case ['conllu2trees', 'trees2wordlines', *_]:
+                fused, n = conllu2treewordlines, 2
+            case ['conllu2trees', 'dedup_trees', 'trees2wordlines']:
+                fields, options = parse_dedup_options(stages[i+1].args)
+                fused, n = conllu_dedup_treewordlines(fields, **options), 3
+            case ['conllu2trees', 'dedup_trees', *_]:
+                fields, options = parse_dedup_options(stages[i+1].args)
+                fused, n = conllu_dedup_trees(fields, **options), 2
+            case ['conllu2trees', 'count_trees', *_]:
+                fused, n = conllu_count_trees(), 2
+            case ['change_wordlines', 'change_wordlines', *_]:
+                n = leading_stages(stages[i:], ['change_wordlines'])
+                fused = rewrite_wordlines([parse_pattern(' '.join(op.args)) for op in stages[i:i+n]])
+            case ['change_subtrees' | 'change_trees', 'change_subtrees' | 'change_trees', *_]:
+                n = leading_stages(stages[i:], ['change_subtrees', 'change_trees'])
+                fused = rewrite_trees(stages[i:i+n])
+            case _:
+                continue
+        note = ' | '.join(op.command() for op in stages[i:i+n]) + '  =>  ' + fused.name
+        return stages[:i] + [fused] + stages[i+n:], note
+    return None
+
+
+def optimize_operation(op: Operation) -> tuple[Operation, list[str]]:
+    "fuse the stages of a pipe as long as possible, return the result and notes on the fusions"
+    stages = op.parts()
+    notes = []
+    while fusion := fuse_stages(stages):
+        stages, note = fusion
+        notes.append(note)
+    return pipe(stages), notes
+
+
+def cached_input_operation(op: Operation, path: str) -> Operation:
+    "if op starts by parsing trees, read them from the cache of the file instead"
+    if (stages := op.parts())[0].name != 'conllu2trees':
+        return op
+    cached = Operation(
+        lambda lines: cached_trees(path, conllu2trees),
+        CoNLLU,
+        Iterable[DepTree],
+        'cached_conllu2trees',
+        "the trees of the input file from its cache, which is created if not valid"
+        )
+    return pipe([cached] + stages[1:])
+
+
+def skipping_input_operation(op: Operation, source: str) -> Operation:
+    "if op starts by parsing trees, skip the stanzas with errors instead of failing"
+    if (stages := op.parts())[0].name != 'conllu2trees':
+        return op
+    return pipe([conllu2valid_trees(source)] + stages[1:])
+
+
+def validated_input_operation(op: Operation, path: str, processes: int=None) -> Operation:
+    "if op starts by validating, check the input file itself, in parts by processes"
+    if (stages := op.parts())[0].name != 'validate':
+        return op
+    checked = Operation(
+        lambda lines: (error_message(path, e) for e in file_errors(path, processes or 1)),
+        CoNLLU,
+        Iterable[str],
+        'validate_file',
+        "check that the input file is valid CoNLL-U, in parts by processes"
+        )
+    return pipe([checked] + stages[1:])
+
+
+def corpus_input_operation(op: Operation, store: CorpusColumns) -> Operation:
+    "if op starts by reading wordlines or trees, read them from the arrays of a corpus store, or other columns, instead"
+    stages = op.parts()
+    match [s.name for s in stages[:2]]:
+        case ['conllu2wordlines', 'statistics']:
+            fields, options = parse_count_options(stages[1].args)
+            first, n = Operation(
+                CountedStatistics(
+                    lambda lines: store.statistics(fields),
+                    lambda lines: wordline_keys(fields, store.wordlines()),
+                    options),
+                CoNLLU,
+                list,
+                'corpus_statistics',
+                "the same as conllu2wordlines | statistics, counted on the arrays of the store"
+                ), 2
+        case ['conllu2trees', 'trees2conllu']:
+            first, n = Operation(
+                lambda lines: (line for comms, nodes in store.stanzas()
+                                   for line in comms + list(map(str, relabel_wordlines(nodes))) + ['']),
+                CoNLLU,
+                Iterable[str],
+                'corpus_conllu',
+                "the same as conllu2trees | trees2conllu, without building trees"
+                ), 2
+        case ['conllu2wordlines', *_]:
+            first, n = Operation(
+                lambda lines: store.wordlines(),
+                CoNLLU,
+                Iterable[WordLine],
+                'corpus_wordlines',
+                "the wordlines of the store"
+                ), 1
+        case ['conllu2trees', 'match_trees' | 'match_subtrees' | 'match_found_in_tree' | 'find_partial_subtrees', *_]:
+            first, n = Operation(
+                partial(indexed_trees, store, stages[1]),
+                CoNLLU,
+                Iterable[DepTree],
+                'corpus_indexed_trees',
+                "the trees of the store where the indexes find that the patterns of the next stage can match"
+                ), 1
+        case ['conllu2trees', 'head_dep_statistics']:
+            fields, options = parse_count_options(stages[1].args)
+            first, n = Operation(
+                CountedStatistics(
+                    lambda lines: EdgeIndex.open(store).head_dep_statistics(fields, store.trees_end()),
+                    lambda lines: head_dep_keys(store.trees(), fields),
+                    options),
+                CoNLLU,
+                list,
+                'corpus_head_dep_statistics',
+                "the same as conllu2trees | head_dep_statistics, counted on the edge index of the store"
+                ), 2
+        case ['conllu2trees', *_]:
+            first, n = Operation(
+                lambda lines: store.trees(),
+                CoNLLU,
+                Iterable[DepTree],
+                'corpus_trees',
+                "the trees of the store"
+                ), 1
+        case _:
+            return op
+    return pipe([first] + stages[n:])
+
+
+def indexed_trees(store: CorpusColumns, stage: Operation, lines: CoNLLU) -> Iterable[DepTree]:
+    "the trees of a store where the patterns of a stage can match, which the stage still matches, or all trees"
+    if stage.name == 'find_partial_subtrees':
+        patts = parse_pattern(' '.join(['PATH', *stage.args])).subtrees
+    else:
+        patts = [parse_pattern(' '.join(stage.args))]
+    if (numbers := candidate_sentences(store, stage.name, patts)) is None:
+        return store.trees()
+    return store.trees_of(numbers[numbers < store.trees_end()])
+
+
+def open_input(path: str) -> Iterable[str]:
+    "the lines of an input file, or of a corpus store as CoNLL-U"
+    if is_corpus(path):
+        return CorpusStore(path).lines()
+    return open(path)
+
+
+def input_digest(path: str) -> str:
+    "the hash of the contents of an input file, or of the source of a corpus store"
+    if is_corpus(path):
+        return CorpusStore(path).digest()
+    return file_digest(path)
+
+
+def memoized_operation(op: Operation, digest: str, directory: str, size: int=MEMO_SIZE) -> Operation:
+    """
+    if op starts by parsing trees, read the trees of its longest prefix memoized for the input
+    with the digest, and memoize the trees after each later stage that gives trees
+    """
+    if (stages := op.parts())[0].name != 'conllu2trees':
+        return op
+    paths = {k: memo_path(directory, digest, ' | '.join(s.command() for s in stages[:k]))
+                 for k in range(2, len(stages) + 1) if stages[k-1].valtype == Iterable[DepTree]}
+    if start := max((k for k in paths if os.path.exists(paths[k])), default=0):
+        memoized = [Operation(
+            lambda lines, path=paths[start]: read_memo(path),
+            CoNLLU,
+            Iterable[DepTree],
+            'memo_read',
+            "the memoized trees of " + ' | '.join(s.command() for s in stages[:start])
+            )]
+    else:
+        memoized, start = stages[:1], 1
+    for k in range(start + 1, len(stages) + 1):
+        memoized.append(stages[k-1])
+        if k in paths:
+            memoized.append(Operation(
+                lambda trees, path=paths[k]: writing_memo(path, trees, size),
+                Iterable[DepTree],
+                Iterable[DepTree],
+                'memo_write',
+                "memoize the trees of " + ' | '.join(s.command() for s in stages[:k])
+                ))
+    return pipe(memoized)
+
+
+# parallel execution: the input is loaded once into an arena in shared memory, and worker
+# processes run the stages that treat each tree or wordline separately on ranges of sentences
+
+# the conversions that pipes get between stages, parsed by their names, so that every
+# stage of a pipe can be given as a command, e.g. to a worker process
+CONVERSIONS = {op.name: op for op in [
+    conllu2wordlines, wordlines2wordliness, wordlines2strs, trees2strs, trees2wordliness,
+    wordlines2sentences, wordliness2conllu, trees2sentences
+    ]}
+
+# the stages that give results for each item independently of the other items
+PER_ITEM_STAGES = {
+    'match_wordlines', 'match_trees', 'match_subtrees', 'match_found_in_tree',
+    'change_wordlines', 'change_trees', 'change_subtrees', 'find_paths', 'find_partial_subtrees',
+    'underscore_fields', 'extract_fields', 'trees2conllu', 'trees2wordlines', 'trees2sentences',
+    'trees2strs', 'trees2wordliness', 'wordlines2sentences', 'wordlines2strs', 'wordliness2conllu'
+    }
+
+PARTS_PER_PROCESS = 4   # ranges of sentences for each process, to balance the load
+
+
+def parallel_operation(command: str, options: ExecutionOptions) -> Operation:
+    "the operation of a command as run in parallel: without cache, memo or corpus store input"
+    oper = preprocess_operation(parse_operation_pipe(command))
+    if options.skip_invalid:
+        oper = skipping_input_operation(oper, options.input or '<stdin>')
+    return format_operation(oper, options.format)
+
+
+def mergeable_stage(op: Operation) -> bool:
+    "if the results of op on parts of a stream can be merged into its result on the stream"
+    return (op.name in ['count_trees', 'count_wordlines'] or
+            isinstance(op.oper, CountedStatistics) and op.oper.mergeable())
+
+
+def parallel_plan(op: Operation) -> tuple:
+    """
+    split the stages of op into the source of trees or wordlines, the stages run on ranges,
+    the stage whose results on ranges are merged, if any, and the rest; None if op does not
+    start by reading trees or wordlines
+    """
+    stages = op.parts()
+    if stages[0].name not in ['conllu2trees', 'conllu2wordlines']:
+        return None
+    k = 1
+    while k < len(stages) and stages[k].name in PER_ITEM_STAGES:
+        k += 1
+    merged = None
+    if k < len(stages) and mergeable_stage(stages[k]):
+        merged = stages[k]
+    return stages[0], stages[1:k], merged, stages[k+1:] if merged else stages[k:]
+
+
+def run_stages(items: Iterable, command: str, merged: str):
+    "the results of the command on items, or the part to be merged from them"
+    if command:
+        items = parse_operation_pipe(command)(items)
+    if merged:
+        op = parse_operation(merged.split())
+        return op.oper.exact(items) if isinstance(op.oper, CountedStatistics) else op(items)
+    return items
+
+
+def run_part(handle: ArenaHandle, source: str, command: str, merged: str):
+    "the results of a command on a range of an arena, in a worker process"
+    columns = attach(handle)
+    items = (columns.trees if source == 'conllu2trees' else columns.wordlines)(handle.begin, handle.end)
+    result = run_stages(items, command, merged)
+    return result if merged else list(result)
+
+
+def merged_results(plan: tuple, parts: Iterable) -> Iterable:
+    "the results of an operation split by parallel_plan, from the results of its parts in order"
+    source, stages, merged, rest = plan
+    if merged is None:
+        results = (x for part in parts for x in part)
+    elif isinstance(merged.oper, CountedStatistics):
+        results = merged.oper.merge(parts)
+    else:
+        results = [sum(part[0] for part in parts)]
+    if rest:
+        results = pipe(rest)(results)
+    return results
+
+
+def parallel_results(plan: tuple, columns: CorpusColumns, processes: int) -> Iterable:
+    "the results of an operation split by parallel_plan, on columns shared by processes"
+    source, stages, merged, rest = plan
+    end = columns.trees_end() if source.name == 'conllu2trees' else len(columns)
+    run = partial(run_part, source=source.name, command=' | '.join(s.command() for s in stages),
+                  merged=merged.command() if merged else None)
+    with CorpusArena(columns) as arena, multiprocessing.get_context('fork').Pool(processes) as pool:
+        parts = pool.imap(run, arena.handles(processes * PARTS_PER_PROCESS, end))
+        for x in merged_results(plan, parts):
+            yield x
+
+
+def run_request(request: dict, shards: set[str]):
+    """
+    the results of a request from a coordinator on the shard in it, in a worker server;
+    only shards in the manifest of the worker are read, and only the stages of parallel_plan run
+    """
+    if request['shard'] not in shards:
+        raise WorkerError('shard not in the manifest of the worker: ' + request['shard'])
+    if request['source'] not in ['conllu2trees', 'conllu2wordlines']:
+        raise WorkerError('not a source of trees or wordlines: ' + request['source'])
+    if request['command']:
+        for stage in parse_operation_pipe(request['command']).parts():
+            if stage.name not in PER_ITEM_STAGES:
+                raise WorkerError('stage not run by workers: ' + stage.name)
+    if request['merged'] and not mergeable_stage(parse_operation(request['merged'].split())):
+        raise WorkerError('stage not merged from workers: ' + request['merged'])
+    items = parse_operation([request['source']])(open_input(request['shard']))
+    return run_stages(items, request['command'], request['merged'])
+
+
+def serve(manifest: str, host: str, port: int):
+    "run a worker server for a coordinator started with --shards and --workers, on the shards of the manifest"
+    serve_worker(host, port, partial(run_request, shards=set(read_manifest(manifest))))
+
+
+def cluster_results(plan: tuple, shards: list[str], workers: list[tuple[str, int]]) -> Iterable:
+    "the results of an operation split by parallel_plan, run on shards by worker servers"
+    source, stages, merged, rest = plan
+    requests = [{'shard': shard,
+                 'source': source.name,
+                 'command': ' | '.join(s.command() for s in stages),
+                 'merged': merged.command() if merged else None} for shard in shards]
+    return merged_results(plan, distributed_results(workers, requests))
+
+
+def prepare_operation(command: str, options: ExecutionOptions, digest: str=None) -> Operation:
+    """
+    the operation that executes a command on input strings and gives output strings or bytes;
+    the digest of the input is needed for memoization
+    """
     oper = parse_operation_pipe(command)
     oper = preprocess_operation(oper)
-    oper = postprocess_operation(oper)
-    print('# ', oper)
+    if options.skip_invalid:
+        oper = skipping_input_operation(oper, options.input or '<stdin>')
+    if options.memo and digest:
+        oper = memoized_operation(oper, digest, options.memo, options.memo_size)
+    if options.input and is_corpus(options.input):
+        oper = corpus_input_operation(oper, CorpusStore(options.input))
+    elif options.cache and options.input:
+        oper = cached_input_operation(oper, options.input)
+    if options.input and not is_corpus(options.input):
+        oper = validated_input_operation(oper, options.input, options.processes)
+    return format_operation(oper, options.format)
+
+
+def explain_pipe(command: str, options: ExecutionOptions=ExecutionOptions(),
+                 digest: str=None) -> Iterable[str]:
+    "show how a command is executed: the stages of the pipe before and after optimization"
+    oper = prepare_operation(command, options, digest)
+    optimized, notes = optimize_operation(oper)
+    yield '# pipe:  ' + ' | '.join(op.command() for op in oper.parts())
+    for note in notes:
+        yield '# fused: ' + note
+    yield '# plan:  ' + ' | '.join(op.name for op in optimized.parts())
+    if options.processes and (plan := parallel_plan(parallel_operation(command, options))):
+        source, stages, merged, rest = plan
+        yield '# parts: ' + ' | '.join(op.name for op in [source, *stages] + ([merged] if merged else []))
+        yield '# then:  ' + ' | '.join(['merge'] * bool(merged) + [op.name for op in rest])
+
 
-    for t in oper(strs):
-        print(t)
+# an example of "static typing", i.e. checked and rejected before applied to input
+# invalid_operation = pipe([conllu2wordlines, conllu2wordlines])
 
 
+def execute_pipe_on_strings(command: str, strs: Iterable[str],
+                            options: ExecutionOptions=ExecutionOptions()):
+    "apply a command to a stream of strings, with pre- and postprocessing if needed"
+    digest = None
+    if options.memo:
+        os.makedirs(options.memo, exist_ok=True)
+        if options.input:
+            digest = input_digest(options.input)
+        else:
+            digest, strs = spooled_digest(strs)
+    if options.explain:
+        for line in explain_pipe(command, options, digest):
+            print(line)
+        return
+    oper, _ = optimize_operation(prepare_operation(command, options, digest))
+
+    plan = parallel_plan(parallel_operation(command, options)) if options.processes or options.shards else None
+
+    if options.shards:
+        if not (plan and options.workers):
+            raise ParseError('--shards needs --workers and a command that reads trees or wordlines')
+        workers = [parse_address(w) for w in options.workers.split(',')]
+        results, metrics = cluster_results(plan, read_manifest(options.shards), workers), []
+    elif plan:
+        if options.input and is_corpus(options.input):
+            columns = CorpusStore(options.input)
+        else:
+            columns = CorpusColumns(*corpus_columns(strs))
+        results, metrics = parallel_results(plan, columns, options.processes), []
+    elif options.threads:
+        results, metrics = pipelined(oper.parts(), strs, options.threads, options.queue_size)
+    else:
+        results, metrics = oper(strs), []
+
+    with output_file(options.output, options.format == 'bin') as file:
+        if options.format == 'bin':
+            write_bytes(results, file)
+        else:
+            if options.format is None:
+                file.write('#  ' + str(oper) + '\n')
+            write_lines(results, file)
+
+    if options.metrics:
+        print(METRICS_HEADER, file=sys.stderr)
+        for m in metrics:
+            print(m, file=sys.stderr)
@@ -1,6 +1,9 @@
 from dataclasses import dataclass
+from collections import deque
+from functools import lru_cache
 from typing import Iterable, Callable
-from fnmatch import fnmatch
+from fnmatch import fnmatch, translate
+import re
 from pyparsing import nestedExpr
 from trees import *
 
@@ -10,6 +13,52 @@ def match_str(patt: str, word: str) ->bool:
     return fnmatch(word, patt)
 
 
+def has_wildcards(patt: str) -> bool:
+    return any(c in patt for c in '*?[')
+
+
+class ValueSet:
+    """
+    the strings that match some of a list of string patterns, as with match_str: literal
+    strings in a set, patterns like abc* and *abc as sets of prefixes and suffixes by
+    length, and the rest in one regular expression
+    """
+
+    def __init__(self, patts: list[str]):
+        self.literals = set()
+        self.prefixes = {}   # length: prefixes
+        self.suffixes = {}   # length: suffixes
+        others = []
+        for patt in patts:
+            if not has_wildcards(patt):
+                self.literals.add(patt)
+            elif patt.endswith('*') and not has_wildcards(patt[:-1]):
+                self.prefixes.setdefault(len(patt) - 1, set()).add(patt[:-1])
+            elif patt.startswith('*') and not has_wildcards(patt[1:]):
+                self.suffixes.setdefault(len(patt) - 1, set()).add(patt[1:])
+            else:
+                others.append(patt)
+        self.regex = re.compile('|'.join(map(translate, others))) if others else None
+
+    def __contains__(self, word: str) -> bool:
+        return (word in self.literals
+                or any(word[:n] in ps for n, ps in self.prefixes.items())
+                or any(word[-n:] in ss for n, ss in self.suffixes.items())
+                or (self.regex is not None and self.regex.match(word) is not None))
+
+
+@lru_cache
+def read_values(path: str) -> tuple[str]:
+    "the values listed in a file, one per line, ignoring empty lines"
+    with open(path, encoding='utf-8') as file:
+        return tuple(line for line in file.read().splitlines() if line)
+
+
+@lru_cache
+def file_value_set(path: str) -> ValueSet:
+    return ValueSet(read_values(path))
+
+
 def intpred(n, x):
     "condition compared with a number: =8, <8, >8, !8"
     number = int(n[1:])
@@ -51,10 +100,14 @@ def match_wordline(patt: Pattern, word: WordLine) ->bool:
     "matching individual wordlines"
     match patt:
         case Pattern(field, ['IN', *forms]) if field in WORDLINE_FIELDS:
-            wfield = word.as_dict()[field]
+            wfield = getattr(word, field)
             return any(match_str(form, wfield) for form in forms)
+        case Pattern(field, ['IN_FILE', path]) if field in WORDLINE_FIELDS:
+            return getattr(word, field) in file_value_set(path)
         case Pattern(field, [form]) if field in WORDLINE_FIELDS:
-            return match_str(form, word.as_dict()[field])
+            return match_str(form, getattr(word, field))
+        case Pattern('FEAT', [feature, value]):
+            return (v := parse_feats(word.FEATS).get(feature)) is not None and match_str(value, v)
         case Pattern('HEAD_DISTANCE', [n]):
             return intpred(n, int(word.HEAD) - int(word.ID)) if word.ID.isdigit() else False
         case Pattern('AND', patts):
@@ -67,6 +120,96 @@ def match_wordline(patt: Pattern, word: WordLine) ->bool:
             return False
 
         
+def wordline_predicate(patt: Pattern) -> Callable[[WordLine], bool]:
+    "a function that does match_wordline(patt, word), with the field patterns in it compiled once"
+    match patt:
+        case Pattern(field, ['IN', *forms]) if field in WORDLINE_FIELDS and all(isinstance(f, str) for f in forms):
+            values = ValueSet(forms)
+            return lambda word: getattr(word, field) in values
+        case Pattern(field, ['IN_FILE', path]) if field in WORDLINE_FIELDS:
+            values = file_value_set(path)
+            return lambda word: getattr(word, field) in values
+        case Pattern(field, [form]) if field in WORDLINE_FIELDS and isinstance(form, str) and form != 'IN':
+            if not has_wildcards(form):
+                return lambda word: getattr(word, field) == form
+            regex = re.compile(translate(form))
+            return lambda word: regex.match(getattr(word, field)) is not None
+        case Pattern('FEAT', [feature, value]) if isinstance(feature, str) and isinstance(value, str):
+            if not has_wildcards(value):
+                return lambda word: parse_feats(word.FEATS).get(feature) == value
+            regex = re.compile(translate(value))
+            def pred(word):
+                v = parse_feats(word.FEATS).get(feature)
+                return v is not None and regex.match(v) is not None
+            return pred
+        case Pattern('AND', patts):
+            return Branches([wordline_predicate(p) for p in patts], list(map(pattern_cost, patts)), True)
+        case Pattern('OR', patts):
+            return Branches([wordline_predicate(p) for p in patts], list(map(pattern_cost, patts)), False)
+        case Pattern('NOT', [patt]):
+            pred = wordline_predicate(patt)
+            return lambda word: not pred(word)
+        case _:
+            return lambda word: match_wordline(patt, word)
+
+
+def pattern_cost(patt: Pattern) -> float:
+    "a static estimate of the time it takes to match a pattern, 1 for comparing a field"
+    match patt:
+        case Pattern(field, ['IN' | 'IN_FILE', *_]) if field in WORDLINE_FIELDS:
+            return 1.5
+        case Pattern(field, [form]) if field in WORDLINE_FIELDS and isinstance(form, str):
+            return 2 if has_wildcards(form) else 1
+        case Pattern('FEAT', _):
+            return 1.5
+        case Pattern('AND' | 'OR' | 'NOT', patts):
+            return 0.5 + sum(map(pattern_cost, patts))
+        case Pattern('HEAD_DISTANCE' | 'METADATA', _):
+            return 3
+        case Pattern('TREE' | 'TREE_', patts):
+            return 2 + sum(map(pattern_cost, patts))
+        case Pattern('HAS_SUBTREE' | 'HAS_NO_SUBTREE', patts):
+            return 5 + 5 * sum(map(pattern_cost, patts))
+        case Pattern('SEQUENCE' | 'SUBSEQUENCE' | 'SEQUENCE_', patts):
+            return 20 + 10 * sum(map(pattern_cost, patts))
+        case Pattern('LENGTH' | 'DEPTH', _):
+            return 20
+        case _:
+            return 50   # IS_NONPROJECTIVE, CONTAINS_SUBTREE and others
+
+
+class Branches:
+    """
+    the AND (all) or OR (any) of predicates, tried in the order of their cost per
+    decisive result: cost divided by the share of results that decide the whole,
+    False for AND, True for OR, which is counted and the order updated now and then
+    """
+    REORDER = 1000   # calls between updates of the order
+
+    def __init__(self, preds: list[Callable], costs: list[float], conjunction: bool):
+        self.preds = preds
+        self.costs = costs
+        self.conjunction = conjunction
+        self.order = sorted(range(len(preds)), key=lambda i: costs[i])  # stable: ties in the written order
+        self.tried = [0] * len(preds)
+        self.decided = [0] * len(preds)
+        self.calls = 0
+
+    def reorder(self):
+        self.order.sort(key=lambda i: self.costs[i] * (self.tried[i] + 2) / (self.decided[i] + 1))
+
+    def __call__(self, x) -> bool:
+        self.calls += 1
+        if self.calls % self.REORDER == 0:
+            self.reorder()
+        for i in self.order:
+            self.tried[i] += 1
+            if bool(self.preds[i](x)) != self.conjunction:
+                self.decided[i] += 1
+                return not self.conjunction
+        return self.conjunction
+
+        
 def match_deptree(patt: Pattern, tree: DepTree) -> bool:
     "matching entire trees - either their root wordline or the whole tree"
     if match_wordline(patt, tree.root):
@@ -118,6 +261,75 @@ def match_deptree(patt: Pattern, tree: DepTree) -> bool:
                 return False
 
             
+def deptree_predicate(patt: Pattern) -> Callable[[DepTree], bool]:
+    """
+    a function that does match_deptree(patt, tree), compiled once: the root wordline is
+    only matched by the patterns that can match it, and AND and OR try their cheapest
+    and most decisive parts first
+    """
+    match patt:
+        case Pattern(field, _) if field in WORDLINE_FIELDS or field in ('FEAT', 'HEAD_DISTANCE'):
+            pred = wordline_predicate(patt)
+            return lambda tree: pred(tree.root)
+        case Pattern('AND', patts):
+            return Branches([deptree_predicate(p) for p in patts], list(map(pattern_cost, patts)), True)
+        case Pattern('OR', patts):
+            return Branches([deptree_predicate(p) for p in patts], list(map(pattern_cost, patts)), False)
+        case Pattern('NOT', [pt]):
+            # as in match_deptree, where a NOT that fails on the root wordline cannot succeed on the tree
+            pred = wordline_predicate(pt)
+            return lambda tree: not pred(tree.root)
+        case Pattern('LENGTH', [n]):
+            return lambda tree: intpred(n, len(tree))
+        case Pattern('DEPTH', [n]):
+            return lambda tree: intpred(n, tree.depth())
+        case Pattern('METADATA', [strpatt]):
+            return lambda tree: match_str(strpatt, '\n'.join(tree.comments))
+        case Pattern('IS_NONPROJECTIVE', []):
+            return nonprojective
+        case Pattern('TREE', [pt, *patts]):
+            pred, preds = deptree_predicate(pt), [deptree_predicate(p) for p in patts]
+            return lambda tree: (len(preds) == len(sts := tree.subtrees) and pred(tree)
+                                 and all(p(st) for p, st in zip(preds, sts)))
+        case Pattern('TREE_', [pt, *patts]):
+            pred, preds = deptree_predicate(pt), [deptree_predicate(p) for p in patts]
+            return lambda tree: (pred(tree)
+                                 and bool(different_matches(lambda p, st: p(st), preds, tree.subtrees)))
+        case Pattern('SEQUENCE', patts):
+            preds = [wordline_predicate(p) for p in patts]
+            return lambda tree: (len(preds) == len(ws := tree.wordlines())
+                                 and all(p(w) for p, w in zip(preds, ws)))
+        case Pattern('SUBSEQUENCE', patts):
+            preds = [wordline_predicate(p) for p in patts]
+
+            def subsequence(tree):
+                ws = tree.wordlines()
+                return any(all(p(w) for p, w in zip(preds, ws[i:i+len(preds)]))
+                               for i in range(len(ws) - len(preds)))
+            return subsequence
+        case Pattern('SEQUENCE_', patts):
+            preds = [wordline_predicate(p) for p in patts]
+
+            def sequence_(tree):
+                ws = tree.wordlines()
+                return all(any(p(w) for w in ws) for p in preds)
+            return sequence_
+        case Pattern('HAS_SUBTREE', patts):
+            preds = [deptree_predicate(p) for p in patts]
+            return lambda tree: any(all(p(st) for p in preds) for st in tree.subtrees)
+        case Pattern('HAS_NO_SUBTREE', patts):
+            preds = [deptree_predicate(p) for p in patts]
+            return lambda tree: not any(all(p(st) for p in preds) for st in tree.subtrees)
+        case Pattern('CONTAINS_SUBTREE', patts):
+            preds = [deptree_predicate(p) for p in patts]
+
+            def contains(tree):
+                return all(p(tree) for p in preds) or any(contains(st) for st in tree.subtrees)
+            return contains
+        case _:
+            return lambda tree: match_deptree(patt, tree)
+
+            
 def matches_of_deptree(patt: Pattern, tree: DepTree) -> list[DepTree]:
     "return singleton list if the tree matches, otherwise empty"
     if match_deptree(patt, tree):
@@ -126,163 +338,215 @@ def matches_of_deptree(patt: Pattern, tree: DepTree) -> list[DepTree]:
         return []
 
 
-def matches_in_deptree(patt: Pattern, tree: DepTree) -> list[DepTree]:
-    "finding all subtrees that match a pattern"
+def matches_in_deptree(patt: Pattern, tree: DepTree, match: Callable=None) -> list[DepTree]:
+    "finding all subtrees that match a pattern, or its deptree_predicate if given"
+    match = match or (lambda t: match_deptree(patt, t))
     ts = []
-    if match_deptree(patt, tree):
+    if match(tree):
         ts.append(tree)
     for subtree in tree.subtrees:
-        ts.extend(matches_in_deptree(patt, subtree))
+        ts.extend(matches_in_deptree(patt, subtree, match))
     return ts
 
 
-def match_found_in_deptree(patt: Pattern, tree: DepTree) -> list[DepTree]:
-    "return a tree that has at least one matching subtree"
+def match_found_in_deptree(patt: Pattern, tree: DepTree, match: Callable=None) -> list[DepTree]:
+    "return a tree that has at least one matching subtree, matched with the deptree_predicate of the pattern if given"
+    match = match or (lambda t: match_deptree(patt, t))
+    found = False
+    stack = [tree]
+    while stack:
+        t = stack.pop()
+        if match(t):
+            t.matched = found = True
+        stack.extend(t.subtrees)
+    return [tree] if found else []
 
-    def found_in(tr):
-        if match_deptree(patt, tr):
-            tr.add_misc('MATCH')
-        for subtree in tr.subtrees:
-            found_in(subtree)
 
-    found_in(tree)
-
-    if any(w.MISC.endswith('+MATCH') for w in tree.wordlines()):
-        ### +MATCH should not appear in MISC for another reason
-        return [tree]
-    else:
-        return []
-
-
-def len_segment_pattern(patt: Pattern) -> int:
+def segment_patterns(patt: Pattern) -> list[Pattern]:
+    "the tree patterns that the trees of a segment must match one after another"
     match patt:
         case Pattern('SEGMENT', patts):
-            return sum(len_segment_pattern(pt) for pt in patts)
-        case Pattern('REPEAT', [n, patt]):
-            return int(n) * len_segment_pattern(patt)
+            return [p for pt in patts for p in segment_patterns(pt)]
+        case Pattern('REPEAT', [n, pt]):
+            return int(n) * segment_patterns(pt)
         case _:
-            return 1
-
-
-def match_segment(patt: Pattern, trees: list[DepTree]) -> bool:
-    "matching a contiguous segment of trees"
-    if len_segment_pattern(patt) == len(trees):
-        match patt:
-            case Pattern('SEGMENT', patts):
-                for pt in patts:
-                    if match_segment(pt, trees[:len_segment_pattern(pt)]):
-                        trees = trees[len_segment_pattern(pt):]
-                        continue
-                    else:
-                        return False
-                return True
-            case Pattern('REPEAT', [n, pt]):
-                for _ in range(int(n)):
-                    if match_segment(pt, trees[:len_segment_pattern(pt)]):
-                        trees = trees[len_segment_pattern(pt):]
-                        continue
-                    else:
-                        return False
-                return True
-            case _:
-                return match_deptree(patt, trees[0])  # must be a singleton
+            return [patt]
 
-        
+    
 def matches_in_tree_stream(patt: Pattern,
                            trees: Iterable[DepTree]) -> Iterable[list[DepTree]]:
+    """
+    the segments of trees that match a pattern, in one pass over the trees: REPEAT >n
+    gives each maximal run of more than n matching trees, other patterns a sliding window
+    of trees, where a tree is matched with each distinct pattern at most once
+    """
+    trees = iter(trees)
     match patt:
         case Pattern('REPEAT', [n, pt]) if n[0] == '>':
+            n = int(n[1:])
+            match_tree = deptree_predicate(pt)
             segment = []
-            while trees:
-                try:
-                    tr = next(trees)
-                except StopIteration:
-                    break
-                while match_deptree(pt, tr):
+            for tr in trees:
+                if match_tree(tr):
                     segment.append(tr)
-                    if trees:
-                        try:
-                            tr = next(trees)
-                        except StopIteration:
-                            break
-                    else:
-                        break
-                if len(segment) > int(n[1:]):
-                    yield segment
-                segment = []
+                else:
+                    if len(segment) > n:
+                        yield segment
+                    segment = []
+            if segment and len(segment) > n:
+                yield segment
             
         case _:
-            lenp = len_segment_pattern(patt)
-            try:
-                segment = [next(trees) for _ in range(lenp)]
-            except StopIteration:
+            patts = segment_patterns(patt)
+            if not patts:
                 return
-            while trees:
-                if match_segment(patt, segment):
-                    yield segment
-                    try:
-                        segment = [next(trees) for _ in range(lenp)]  # segments may not overlap
-                    except StopIteration:
-                        return
+            first = [patts.index(p) for p in patts]  # equal patterns are matched once with each tree
+            preds = {i: deptree_predicate(patts[i]) for i in set(first)}
+            window = deque()  # (tree, {pattern index: matched})
+
+            def matches(i, tree, matched):
+                if (m := matched.get(first[i])) is None:
+                    m = matched[first[i]] = preds[first[i]](tree)
+                return m
+            
+            for tr in trees:
+                window.append((tr, {}))
+                if len(window) < len(patts):
+                    continue
+                if all(matches(i, *w) for i, w in enumerate(window)):
+                    yield [t for t, _ in window]
+                    window.clear()  # segments may not overlap
                 else:
-                    try:
-                        segment.pop(0)
-                        segment.append(next(trees))
-                    except StopIteration:
-                        return
+                    window.popleft()
         
 
-def change_wordline(patt: Pattern, word: WordLine) ->WordLine:
-    "changing the value of some field in accordance with a pattern"
+# the rewrite engine: change patterns compiled into functions that change a tree or a
+# wordline in place and tell if they changed something, applied to all nodes of a tree
+# in one traversal
+
+REWRITE_PASSES = 100   # the most traversals of a tree when changing it to a fixed point
+
+
+def changes_in_order(changes: list[Callable]) -> Callable[..., bool]:
+    "a function that makes all changes in order, telling if some of them changed something"
+    def change_all(x):
+        changed = False
+        for change in changes:
+            changed = change(x) or changed
+        return changed
+    return change_all
+
+
+def wordline_change(patt: Pattern) -> Callable[[WordLine], bool]:
+    "a function that changes a wordline in accordance with a pattern, in place, telling if it changed"
     match patt:
         case Pattern('IF', [condpatt, changepatt]):
-            if match_wordline(condpatt, word):
-                return change_wordline(changepatt, word)
-            else:
-                return word
+            cond, change = wordline_predicate(condpatt), wordline_change(changepatt)
+            return lambda word: cond(word) and change(word)
         case Pattern(field, [oldval, newval]) if field in WORDLINE_FIELDS:
-            wdict = word.as_dict()
-            if match_str(oldval, wdict[field]):
-                wdict[field] = newval
-                return WordLine(**wdict)
-            else:
-                return word
-        case Pattern('AND', patts):  # cumulative changes in the order of patts
-            for patt in patts:
-                word = change_wordline(patt, word)
-            return word
+            regex = re.compile(translate(oldval))
+            def change(word):
+                if (value := getattr(word, field)) != newval and regex.match(value) is not None:
+                    setattr(word, field, newval)
+                    return True
+                return False
+            return change
+        case Pattern('AND', patts):
+            return changes_in_order([wordline_change(p) for p in patts])
         case _:
-            return word
+            return lambda word: False
 
 
-def change_deptree(patt: Pattern, tree: DepTree) -> DepTree:
-    "change a tree in accordance with a pattern"
+def deptree_change(patt: Pattern) -> Callable[[DepTree], bool]:
+    "a function that changes a tree at its root in accordance with a pattern, in place, telling if it changed"
     match patt:
         case Pattern('IF', [condpatt, changepatt]):
-            if match_deptree(condpatt, tree):
-                return change_deptree(changepatt, tree)
-            else:
-                return tree
+            cond, change = deptree_predicate(condpatt), deptree_change(changepatt)
+            return lambda tree: cond(tree) and change(tree)
         case Pattern('PRUNE', [depth]):
             depth = int(depth)
-            return prune_subtrees_below(tree, depth)
-        case Pattern('FILTER_SUBTREES', [condpatt]):  ## to revisit
-            tree.subtrees = [t for t in tree.subtrees if match_deptree(condpatt, t)]
-            return tree
+            def prune(tree):
+                changed = tree.depth() > max(depth, 1)
+                prune_subtrees_below(tree, depth)
+                return changed
+            return prune
+        case Pattern('FILTER_SUBTREES', [condpatt]):
+            cond = deptree_predicate(condpatt)
+            def filter_subtrees(tree):
+                n = len(tree.subtrees)
+                tree.subtrees = [t for t in tree.subtrees if cond(t)]
+                return len(tree.subtrees) < n
+            return filter_subtrees
         case Pattern('AND', patts):
-            for patt in patts:
-                tree = change_deptree(patt, tree)
-            return tree
+            return changes_in_order([deptree_change(p) for p in patts])
         case _:
-            tree.root = change_wordline(patt, tree.root)
-            return tree
+            change = wordline_change(patt)
+            return lambda tree: change(tree.root)
 
-    
-def changes_in_deptree(patt: Pattern, tree: DepTree) -> DepTree:
-    "performing change in a tree and recursively in all changed subtrees"
-    tree = change_deptree(patt, tree)
-    tree.subtrees = [change_deptree(patt, t) for t in tree.subtrees]
-    return tree
+
+def is_wordline_pattern(patt: Pattern) -> bool:
+    "if a tree pattern only looks at the root wordline"
+    match patt:
+        case Pattern(field, _) if field in WORDLINE_FIELDS or field in ('FEAT', 'HEAD_DISTANCE'):
+            return True
+        case Pattern('AND' | 'OR' | 'NOT', patts):
+            return all(map(is_wordline_pattern, patts))
+        case _:
+            return False
+
+
+def is_local_change(patt: Pattern) -> bool:
+    "if a change of a tree only looks at and changes the root wordline"
+    match patt:
+        case Pattern('IF', [condpatt, changepatt]):
+            return is_wordline_pattern(condpatt) and is_local_change(changepatt)
+        case Pattern('AND', patts):
+            return all(map(is_local_change, patts))
+        case Pattern('PRUNE' | 'FILTER_SUBTREES', _):
+            return False
+        case _:
+            return True
+
+
+def rewrite_deptree(changes: list[Callable[[DepTree], bool]], tree: DepTree, recursive: bool=True) -> bool:
+    "make the changes in order at each node, top-down, or only at the root, telling if something changed"
+    changed = False
+    stack = [tree]
+    while stack:
+        t = stack.pop()
+        for change in changes:
+            changed = change(t) or changed
+        if recursive:
+            stack.extend(reversed(t.subtrees))
+    return changed
+
+
+class Rewriter:
+    """
+    the changes of a sequence of change_subtrees and change_trees steps, made in place in
+    one loop over trees; a change that only looks at and changes the node where it is made
+    is made in the same traversal as the previous step, since it cannot see the difference
+    """
+
+    def __init__(self):
+        self.passes = []   # (changes, recursive, fixpoint)
+
+    def add(self, patt: Pattern, recursive: bool=True, fixpoint: bool=False):
+        "add the step of changing all nodes with patt, or only the root, possibly to a fixed point"
+        change = deptree_change(patt)
+        if (self.passes and not fixpoint and is_local_change(patt)
+                and self.passes[-1][1:] == (recursive, False)):
+            self.passes[-1][0].append(change)
+        else:
+            self.passes.append(([change], recursive, fixpoint))
+        return self
+
+    def __call__(self, tree: DepTree) -> DepTree:
+        for changes, recursive, fixpoint in self.passes:
+            for _ in range(REWRITE_PASSES if fixpoint else 1):
+                if not rewrite_deptree(changes, tree, recursive):
+                    break
+        return tree
 
 
 def find_paths_in_tree(patts: list[Pattern], tree: DepTree) -> list[DepTree]:
@@ -301,13 +565,49 @@ def find_paths_in_tree(patts: list[Pattern], tree: DepTree) -> list[DepTree]:
         return []
 
     
-def find_paths_in_subtrees(patts: list[Pattern], tree: DepTree) -> list[DepTree]:
-    "find parts in tree and all subtrees"
-    paths = find_paths_in_tree(patts, tree)
-    for st in tree.subtrees:
-        for p in find_paths_in_subtrees(patts, st):
-            paths.append(p)
-    return paths
+def find_paths_in_subtrees(patts: list[Pattern], tree: DepTree) -> Iterable[DepTree]:
+    """
+    find paths in tree and all subtrees, in the same order as find_paths_in_tree from
+    each node in preorder, but in one traversal: the active states of a node are the
+    depths of the path starts whose patterns have matched down to it;
+    the paths of a tree are buffered and sorted by their starts before the first is
+    given, since a path from a node can be found after paths from its subtrees
+    """
+    if not patts:
+        return
+    last = len(patts) - 1
+    first = [patts.index(p) for p in patts]  # equal patterns are matched once in each node
+    preds = [wordline_predicate(p) for p in patts]
+    found = []   # (preorder number of start, nodes of path)
+    path = []    # (node, preorder number) from the root down to the current node
+    stack = [(tree, 0, ())]
+    number = 0
+    while stack:
+        t, depth, starts = stack.pop()
+        del path[depth:]
+        path.append((t, number))
+        number += 1
+        matched = {}
+        active = []
+        for s in starts + (depth,):
+            i = first[depth - s]
+            if (m := matched.get(i)) is None:
+                m = matched[i] = preds[i](t.root)
+            if not m:
+                continue
+            if depth - s == last:
+                found.append((path[s][1], [node for node, _ in path[s:]]))
+            else:
+                active.append(s)
+        if t.subtrees:
+            active = tuple(active)
+            stack.extend((st, depth + 1, active) for st in reversed(t.subtrees))
+    found.sort(key=lambda f: f[0])
+    for _, nodes in found:
+        p = DepTree(nodes[-1].root, [], [])
+        for node in reversed(nodes[:-1]):
+            p = DepTree(node.root, [p], [])
+        yield p
 
     
 def find_partial_local_trees(patts: list[Pattern], tree: DepTree) -> list[DepTree]:
@@ -331,8 +631,9 @@ class ParseError(Exception):
     pass
 
 
+@lru_cache(maxsize=256)
 def parse_pattern(s: str) ->Pattern:
-    "to get a pattern from a string"
+    "to get a pattern from a string; the same string gives the same pattern, which is not to be changed"
     if not s.startswith('('):  # add outer parentheses if missing
         s = '(' + s + ')'
     parse = nestedExpr().parseString(s)
@@ -0,0 +1,105 @@
+# writing results in blocks, and machine-readable formats of results
+
+import json
+import sys
+from contextlib import contextmanager
+from typing import Iterable, TextIO, BinaryIO
+from trees import *
+from treetypes import TreeType
+
+BLOCK_SIZE = 1 << 20   # characters or bytes written at a time
+
+OUTPUT_FORMATS = ['conllu', 'tsv', 'jsonl', 'bin']
+
+
+def write_lines(lines: Iterable, file: TextIO, block_size: int=BLOCK_SIZE):
+    "write str(line) for each line, followed by a newline, in blocks of at least block_size characters"
+    block = []
+    size = 0
+    for line in lines:
+        line = str(line)
+        block.append(line)
+        size += len(line) + 1
+        if size >= block_size:
+            block.append('')
+            file.write('\n'.join(block))
+            block = []
+            size = 0
+    if block:
+        block.append('')
+        file.write('\n'.join(block))
+    file.flush()
+
+
+def write_bytes(chunks: Iterable[bytes], file: BinaryIO, block_size: int=BLOCK_SIZE):
+    "write byte strings in blocks of at least block_size bytes"
+    block = bytearray()
+    for chunk in chunks:
+        block += chunk
+        if len(block) >= block_size:
+            file.write(block)
+            block = bytearray()
+    file.write(block)
+    file.flush()
+
+
+@contextmanager
+def output_file(filename: str, binary: bool):
+    "a file to write to, or stdout if filename is None"
+    if filename is None:
+        sys.stdout.flush()
+        yield sys.stdout.buffer if binary else sys.stdout
+    else:
+        with open(filename, 'wb' if binary else 'w') as file:
+            yield file
+
+
+def json_value(x):
+    "keys of statistics as JSON values: strings, lists, objects for tree types"
+    match x:
+        case str() | int():
+            return x
+        case TreeType():
+            return {'head': json_value(x.head), 'deps': json_value(x.deps)}
+        case WordLine():
+            return x.as_dict()
+        case DepTree():
+            return {'comments': x.comments, 'wordlines': [w.as_dict() for w in mark_matches(x).wordlines()]}
+        case _:
+            return [json_value(y) for y in x]
+
+
+def tsv_value(x) -> str:
+    "a key of statistics as one TSV column: values of a tuple separated by spaces"
+    match x:
+        case str():
+            return x
+        case TreeType():
+            return ' + '.join([tsv_value(x.head)] + [tsv_value(d) for d in x.deps])
+        case _:
+            return ' '.join(tsv_value(y) for y in x)
+
+
+def statistics2tsv(rows: list) -> Iterable[str]:
+    "rows of statistics as lines with one column for each part of the key, and the count last"
+    for key, count in rows:
+        if isinstance(key, tuple):
+            yield '\t'.join([tsv_value(k) for k in key] + [str(count)])
+        else:
+            yield tsv_value(key) + '\t' + str(count)
+
+
+def statistics2jsonl(rows: list) -> Iterable[str]:
+    for key, count in rows:
+        yield json.dumps({'key': json_value(key), 'count': count}, ensure_ascii=False)
+
+
+def counts2jsonl(counts: list[int]) -> Iterable[str]:
+    for count in counts:
+        yield json.dumps({'count': count})
+
+
+def items2jsonl(items: Iterable) -> Iterable[str]:
+    "trees, wordlines, or strings as JSON lines"
+    for item in items:
+        yield json.dumps(json_value(item), ensure_ascii=False)
@@ -0,0 +1,79 @@
+# commands compiled once and run in the same process give the same results as the command
+# line, on corpora from lines, files, stores and trees, and do not change the corpus
+
+from typing import Iterable
+import pytest
+from conftest import generated_corpus, run_command
+from api import Corpus, compile
+from operations import conllu2trees, trees2strs, wordlines2strs, wordliness2conllu
+from patterns import ParseError
+from trees import DepTree, WordLine
+
+COMMANDS = [
+    'trees2conllu', 'extract_sentences', 'count_trees', 'count_wordlines', 'statistics POS DEPREL',
+    'match_trees (LENGTH >5)', 'match_wordlines DEPREL nsubj', 'match_subtrees HAS_SUBTREE (POS DET)',
+    'match_found_in_tree POS NOUN', 'treetype_statistics --top 5 POS', 'head_dep_statistics POS',
+    'change_subtrees (IF (DEPREL nsubj) (FORM * X))', 'trees2wordlines', 'statistics --approx 5 FORM',
+    'match_trees SEQUENCE_ (FORM dog) (POS *) | extract_sentences', 'dedup_trees',
+    ]
+
+
+def as_printed(pipe, results: Iterable) -> list:
+    "the results as run_command gives them"
+    if pipe.valtype == Iterable[DepTree]:
+        return list(trees2strs(results))
+    elif pipe.valtype == Iterable[WordLine]:
+        return list(wordlines2strs(results))
+    elif pipe.valtype == Iterable[list[WordLine]]:
+        return list(wordliness2conllu(results))
+    return list(results)
+
+
+@pytest.mark.parametrize('command', COMMANDS)
+def test_same_as_command_line(corpus, corpus_file, store, command):
+    expected = run_command(command, corpus)
+    pipe = compile(command)
+    for source in [Corpus.from_lines(corpus), Corpus.from_file(corpus_file), Corpus.from_file(store)]:
+        assert as_printed(pipe, pipe(source)) == expected
+
+
+@pytest.mark.parametrize('command', COMMANDS)
+def test_runs_do_not_change_corpus(corpus, command):
+    source = Corpus.from_lines(corpus)
+    pipe = compile(command)
+    first = as_printed(pipe, pipe(source))
+    assert as_printed(pipe, pipe(source)) == first
+    assert list(trees2strs(source.trees())) == list(trees2strs(conllu2trees(corpus)))
+
+
+def test_corpus_from_trees(corpus):
+    # trees leave out the lines of multiword tokens and words not in the tree, which wordlines count
+    for lines, commands in [(corpus, ['extract_sentences', 'match_trees (LENGTH >5)', 'treetype_statistics POS']),
+                            (generated_corpus(100), ['statistics POS', 'trees2wordlines'])]:
+        source = Corpus.from_trees(conllu2trees(lines))
+        assert len(source) == len(Corpus.from_lines(lines))
+        for command in commands:
+            assert as_printed(compile(command), source.query(command)) == run_command(command, lines)
+
+
+def test_pipe_on_several_corpora(corpus):
+    pipe = compile('match_trees (LENGTH >5) | count_trees')
+    first, second = Corpus.from_lines(corpus), Corpus.from_lines(corpus[:200])
+    assert pipe(first) == run_command('match_trees (LENGTH >5) | count_trees', corpus)
+    assert pipe(second) == run_command('match_trees (LENGTH >5) | count_trees', corpus[:200])
+    assert pipe(first) == run_command('match_trees (LENGTH >5) | count_trees', corpus)
+
+
+def test_results_are_lazy(corpus):
+    results = compile('match_trees (LENGTH >5)')(Corpus.from_lines(corpus))
+    assert iter(results) is results
+    assert isinstance(next(results), DepTree)
+
+
+@pytest.mark.parametrize('command, error', [
+    ('no_such_command', ParseError), ('match_trees (POS NOUN) | statistics POS', TypeError),
+    ('statistics POS | count_trees', TypeError),
+    ])
+def test_errors_when_compiled(command, error):
+    with pytest.raises(error):
+        compile(command)
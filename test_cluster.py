@@ -0,0 +1,98 @@
+# commands run by worker servers on shards give the same results as on the whole corpus,
+# and workers run only the stages of parallel plans on the shards of their manifest
+
+import os
+import socket
+import threading
+import time
+import pytest
+from conftest import execute
+from cluster import WorkerError, distributed_results, read_manifest
+from operations import run_request, serve
+
+COMMANDS = [
+    'trees2conllu', 'extract_sentences', 'count_trees', 'count_wordlines', 'statistics POS DEPREL',
+    'match_trees (LENGTH >5) | count_trees', 'treetype_statistics --top 5 POS',
+    'change_subtrees (IF (DEPREL nsubj) (FORM * X)) | trees2conllu', 'statistics --approx 5 FORM',
+    ]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('localhost', 0))
+        return sock.getsockname()[1]
+
+
+def start_worker(manifest: str) -> str:
+    "a worker server in a thread of this process, and its address"
+    port = free_port()
+    threading.Thread(target=serve, args=(manifest, 'localhost', port), daemon=True).start()
+    for _ in range(100):
+        try:
+            socket.create_connection(('localhost', port), 1).close()
+            return 'localhost:' + str(port)
+        except OSError:
+            time.sleep(0.05)
+    raise TimeoutError('worker not started')
+
+
+@pytest.fixture
+def manifest(tmp_path, corpus_file) -> str:
+    directory = str(tmp_path / 'shards')
+    execute(['--input', corpus_file, 'split_shards ' + directory + ' 30'])
+    return os.path.join(directory, 'manifest.txt')
+
+
+@pytest.fixture
+def workers(manifest) -> str:
+    return ','.join(start_worker(manifest) for _ in range(2))
+
+
+def test_shards_cover_corpus(corpus_file, manifest):
+    shards = read_manifest(manifest)
+    assert len(shards) == 7
+    with open(corpus_file) as file:
+        assert ''.join(open(shard).read() for shard in shards) == file.read()
+
+
+@pytest.mark.parametrize('command', COMMANDS)
+def test_workers_same_as_one_process(corpus_file, manifest, workers, command):
+    assert execute(['--shards', manifest, '--workers', workers, command]) == \
+        execute(['--input', corpus_file, command])
+
+
+def test_failed_worker_replaced(corpus_file, manifest, workers):
+    workers = 'localhost:' + str(free_port()) + ',' + workers
+    assert execute(['--shards', manifest, '--workers', workers, 'count_trees']) == \
+        execute(['--input', corpus_file, 'count_trees'])
+
+
+def request(shard: str, command: str='', merged: str=None, source: str='conllu2trees') -> dict:
+    return {'shard': shard, 'source': source, 'command': command, 'merged': merged}
+
+
+def test_run_request(manifest):
+    shards = read_manifest(manifest)
+    assert run_request(request(shards[0], merged='count_trees'), set(shards)) == [30]
+    assert len(list(run_request(request(shards[0], 'trees2conllu'), set(shards)))) > 30
+
+
+@pytest.mark.parametrize('fields', [
+    {'shard': '/etc/passwd'},
+    {'source': 'from_script stopwords.oper'},
+    {'command': 'convert_corpus /tmp/x'},
+    {'command': 'split_shards /tmp/x 1'},
+    {'command': 'match_trees (LENGTH >5) | count_trees'},
+    {'merged': 'statistics --approx 5 POS'},
+    {'merged': 'take_trees 0 3'},
+    ])
+def test_run_request_rejected(manifest, fields):
+    shards = read_manifest(manifest)
+    with pytest.raises(WorkerError):
+        run_request({**request(shards[0]), **fields}, set(shards))
+
+
+def test_rejected_request_reported_to_coordinator(manifest, workers):
+    address = workers.split(',')[0].split(':')
+    with pytest.raises(WorkerError, match='not in the manifest'):
+        list(distributed_results([(address[0], int(address[1]))], [request('/etc/passwd')]))
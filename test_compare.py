@@ -0,0 +1,177 @@
+# compare joins gold and system stanzas by sent_id or position, in the same order or not, and
+# gives the same scores as counting the words of each pair of sentences read into memory
+
+import random
+import pytest
+from conftest import execute, generated_corpus
+from corpus import read_stanzas
+from evaluation import attachment_scores, differing_stanzas, joined_stanzas, SCORE_DIGITS
+from patterns import ParseError
+from trees import MATCH_MARK, comment_sent_id
+
+DEPRELS = ['nsubj', 'obj', 'det', 'amod']
+
+
+def stanzas(lines: list[str]) -> list[list[str]]:
+    "the lines of each stanza, with its empty line"
+    result, stanza = [], []
+    for line in lines:
+        stanza.append(line)
+        if not line.strip():
+            result.append(stanza)
+            stanza = []
+    return result
+
+
+def parsed(gold: list[str], seed: int, missing: int=0, extra: int=0, misaligned: int=0, shuffled: bool=False) -> list[str]:
+    "the gold lines with some HEADs and DEPRELs changed, some sentences left out, added or with a word less"
+    rand = random.Random(seed)
+    result = []
+    for stanza in stanzas(gold):
+        words = [line.split('\t') for line in stanza if line and not line.startswith('#')]
+        for fields in words:
+            if rand.random() < 0.2:
+                fields[6] = str(rand.randint(0, len(words)))
+            if rand.random() < 0.2:
+                fields[7] = rand.choice(DEPRELS)
+        result.append([line for line in stanza if line.startswith('#')] + ['\t'.join(f) for f in words] + [''])
+    for i in rand.sample(range(len(result)), misaligned):
+        result[i] = result[i][:-2] + ['']
+    for i in sorted(rand.sample(range(len(result)), missing), reverse=True):
+        del result[i]
+    result += stanzas(['# sent_id = extra' + str(e) if line.startswith('# sent_id') else line
+                       for e in range(extra) for line in generated_corpus(1, seed=e)])
+    if shuffled:
+        rand.shuffle(result)
+    return [line for stanza in result for line in stanza]
+
+
+def score(right: int, words: int) -> float:
+    return round(right / words, SCORE_DIGITS) if words else 0.0
+
+
+def expected_rows(gold: list[str], system: list[str], by_position: bool=False) -> dict:
+    "the rows of attachment_scores, counted from the pairs of sentences with the same key, as a dict"
+    def keyed(lines):
+        return {(None if by_position else comment_sent_id(comms)) or str(i): nodes
+                for i, (comms, nodes, _) in enumerate(read_stanzas(lines), 1)}
+    golds, systems = keyed(gold), keyed(system)
+    counts = {'sentences': 0, 'misaligned': 0}
+    tables = {}
+    for key, g in golds.items():
+        if key not in systems:
+            continue
+        counts['sentences'] += 1
+        g = [w for w in g if w.ID.isdigit()]
+        s = [w for w in systems[key] if w.ID.isdigit()]
+        if len(g) != len(s):
+            counts['misaligned'] += 1
+            continue
+        for gw, sw in zip(g, s):
+            for group in [(), ('DEPREL', gw.DEPREL), ('POS', gw.POS)]:
+                c = tables.setdefault(group, [0, 0, 0])
+                c[0] += 1
+                c[1] += gw.HEAD == sw.HEAD
+                c[2] += gw.HEAD == sw.HEAD and gw.DEPREL == sw.DEPREL
+    words, heads, labels = tables.get((), [0, 0, 0])
+    rows = {('sentences',): counts['sentences'], ('missing',): len(golds.keys() - systems.keys()),
+            ('extra',): len(systems.keys() - golds.keys()), ('misaligned',): counts['misaligned'],
+            ('words',): words, ('UAS',): score(heads, words), ('LAS',): score(labels, words)}
+    for group, (words, heads, labels) in tables.items():
+        if group:
+            rows.update({group + ('words',): words, group + ('UAS',): score(heads, words),
+                         group + ('LAS',): score(labels, words)})
+    return rows
+
+
+@pytest.fixture
+def gold() -> list[str]:
+    return generated_corpus(300)
+
+
+def test_same_as_gold(gold):
+    rows = dict(attachment_scores(gold, gold))
+    assert rows[('UAS',)] == rows[('LAS',)] == 1.0 and rows[('sentences',)] == 300
+    assert rows == expected_rows(gold, gold)
+
+
+@pytest.mark.parametrize('options', [
+    {}, {'missing': 10}, {'extra': 5}, {'misaligned': 7}, {'shuffled': True},
+    {'missing': 10, 'extra': 5, 'misaligned': 7, 'shuffled': True},
+    ])
+@pytest.mark.parametrize('seed', range(3))
+def test_scores_same_as_in_memory(gold, options, seed):
+    system = parsed(gold, seed, **options)
+    rows = attachment_scores(gold, system)
+    assert dict(rows) == expected_rows(gold, system)
+    assert [len(key) for key, _ in rows][:7] == [1] * 7
+    for name in ['DEPREL', 'POS']:
+        words = [value for key, value in rows if key[0] == name and key[2] == 'words']
+        assert words == sorted(words, reverse=True)
+
+
+def test_by_position(gold):
+    system = [line for line in parsed(gold, 1) if not line.startswith('# sent_id')]
+    assert dict(attachment_scores(gold, system, by_position=True)) == expected_rows(gold, system, by_position=True)
+    assert dict(attachment_scores(gold, system))[('missing',)] == 300
+
+
+def counted(lines: list[str], read: list):
+    "the lines, counting in read the lines given"
+    for line in lines:
+        read.append(line)
+        yield line
+
+
+def test_merge_join_in_order(gold):
+    # each pair is given as soon as its second stanza is read, when the streams are in the same order
+    system = parsed(gold, 2)
+    read_gold, read_system = [], []
+    for key, g, s in joined_stanzas(counted(gold, read_gold), counted(system, read_system)):
+        assert g and s
+        assert read_gold.count('') <= int(key[1:]) + 2 and read_system.count('') <= int(key[1:]) + 2
+
+
+def test_repeated_sent_ids(gold, capsys):
+    # a repetition that comes while the first stanza waits is reported, kept and joined with the next one
+    first, rest = stanzas(gold)[0], [line for stanza in stanzas(gold)[1:] for line in stanza]
+    repeated = first + first + rest
+    rows = dict(attachment_scores(repeated, rest + first + first))
+    assert rows[('sentences',)] == 301 and rows[('missing',)] == rows[('extra',)] == 0
+    assert capsys.readouterr().err.splitlines() == ['# compare: sent_id s0 repeated in the gold input']
+    rows = dict(attachment_scores(rest + first, repeated))
+    assert rows[('sentences',)] == 300 and rows[('missing',)] == 0 and rows[('extra',)] == 1
+    assert capsys.readouterr().err.splitlines() == ['# compare: sent_id s0 repeated in the system input']
+    # repetitions joined as they come are not reported
+    rows = dict(attachment_scores(repeated, repeated))
+    assert rows[('sentences',)] == 301 and rows[('UAS',)] == 1.0
+    assert capsys.readouterr().err == ''
+
+
+def test_diffs(gold):
+    system = parsed(gold, 3, misaligned=5)
+    lines = list(differing_stanzas(gold, system))
+    golds = {comment_sent_id(c): n for c, n, _ in read_stanzas(gold)}
+    diffs = list(read_stanzas(lines))
+    assert [c[-1] for c, _, _ in diffs] == ['# compare = gold', '# compare = system'] * (len(diffs) // 2)
+    wrong = 0
+    for (gc, gn, _), (sc, sn, _) in zip(diffs[::2], diffs[1::2]):
+        assert comment_sent_id(gc) == comment_sent_id(sc) and golds[comment_sent_id(gc)] == gn
+        marked = [s.ID for g, s in zip(gn, sn) if (g.HEAD, g.DEPREL) != (s.HEAD, s.DEPREL)]
+        assert marked and marked == [s.ID for s in sn if s.MISC.endswith(MATCH_MARK)]
+        wrong += len(marked)
+    rows = dict(attachment_scores(gold, system))
+    assert wrong == rows[('words',)] - round(rows[('LAS',)] * rows[('words',)])
+
+
+def test_compare_command(gold, tmp_path):
+    path = str(tmp_path / 'gold.conllu')
+    with open(path, 'w') as file:
+        file.write(''.join(line + '\n' for line in gold))
+    system = parsed(gold, 4, missing=3, shuffled=True)
+    assert execute(['compare ' + path], system) == [str(row) for row in attachment_scores(gold, system)]
+    assert execute(['compare --by-position ' + path], system) == \
+        [str(row) for row in attachment_scores(gold, system, by_position=True)]
+    assert execute(['compare --diffs ' + path], system) == list(differing_stanzas(gold, system))
+    with pytest.raises(ParseError):
+        execute(['compare --by-sent-id ' + path], system)
@@ -0,0 +1,80 @@
+# commands on a corpus store give the same results as on the CoNLL-U file it was made from
+
+import pytest
+from conftest import IRREGULAR, REPEATED_IDS, execute, generated_corpus
+from corpus import CorpusColumns, CorpusStore, corpus_columns, is_corpus
+from memo import file_digest
+from trees import wordline_statistics
+from operations import conllu2trees, trees2strs, conllu2wordlines
+
+COMMANDS = [
+    'trees2conllu', 'extract_sentences', 'trees2wordlines', 'count_trees', 'count_wordlines',
+    'statistics POS DEPREL', 'match_wordlines DEPREL nsubj | statistics POS',
+    'treetype_statistics POS', 'head_dep_statistics POS', 'match_trees (LENGTH >5) | extract_sentences',
+    'match_subtrees (AND (POS NOUN) (HAS_SUBTREE (DEPREL det)))', 'find_paths (POS NOUN) (POS ADJ)',
+    'change_subtrees (IF (DEPREL nsubj) (FORM * X)) | trees2conllu', 'underscore_fields FEATS MISC',
+    ]
+
+
+def outcome(args: list[str]):
+    try:
+        return execute(args)
+    except Exception as e:
+        return type(e)
+
+
+@pytest.mark.parametrize('command', COMMANDS)
+def test_store_same_as_file(corpus_file, store, command):
+    assert outcome(['--input', store, command]) == outcome(['--input', corpus_file, command])
+
+
+@pytest.mark.parametrize('stanzas', [IRREGULAR, REPEATED_IDS, generated_corpus(3)[:-1]])
+@pytest.mark.parametrize('command', ['trees2conllu', 'extract_sentences', 'trees2wordlines', 'count_trees',
+                                     'count_wordlines', 'statistics FORM'])
+def test_store_same_as_file_on_irregular_stanzas(tmp_path, stanzas, command):
+    path, directory = str(tmp_path / 'in.conllu'), str(tmp_path / 'in.store')
+    with open(path, 'w') as file:
+        file.write(''.join(line + '\n' for line in stanzas))
+    execute(['--input', path, 'convert_corpus ' + directory])
+    assert outcome(['--input', directory, command]) == outcome(['--input', path, command])
+
+
+def test_ngram_statistics_of_store(tmp_path):
+    path, directory = str(tmp_path / 'in.conllu'), str(tmp_path / 'in.store')
+    with open(path, 'w') as file:
+        file.write(''.join(line + '\n' for line in generated_corpus(100)))
+    execute(['--input', path, 'convert_corpus ' + directory])
+    for command in ['ngram_statistics 2 POS', 'tree_ngram_statistics 3 FORM']:
+        assert execute(['--input', directory, command]) == execute(['--input', path, command])
+
+
+def test_store_lines_and_digest(corpus_file, store):
+    assert is_corpus(store) and not is_corpus(corpus_file)
+    columns = CorpusStore(store)
+    with open(corpus_file) as file:
+        assert list(columns.lines()) == list(file)
+    assert columns.digest() == file_digest(corpus_file)
+
+
+def test_unterminated_last_stanza(tmp_path):
+    lines = [line + '\n' for line in generated_corpus(3)[:-1]]
+    columns = CorpusColumns(*corpus_columns(lines))
+    assert list(columns.lines()) == lines
+    assert len(columns) == 3 and columns.trees_end() == 2
+
+
+def test_stanzas_of_numbers(corpus):
+    columns = CorpusColumns(*corpus_columns(corpus))
+    trees = list(trees2strs(conllu2trees(corpus)))
+    stanzas = [[]]
+    for line in trees:
+        stanzas[-1].append(line)
+        if not line:
+            stanzas.append([])
+    numbers = [5, 0, 150, 3]
+    assert list(trees2strs(columns.trees_of(numbers))) == [line for n in numbers for line in stanzas[n]]
+
+
+def test_statistics_of_columns(corpus):
+    columns = CorpusColumns(*corpus_columns(corpus))
+    assert columns.statistics(['POS', 'FEATS'], 7) == wordline_statistics(['POS', 'FEATS'], conllu2wordlines(corpus))
@@ -0,0 +1,110 @@
+# commands that read their candidate trees through the indexes of a corpus store give the same
+# results as matching all trees, and the candidates include every sentence that matches
+
+import pytest
+from conftest import IRREGULAR, REPEATED_IDS, execute, generated_corpus
+from corpus import CorpusStore
+from corpusindex import SequenceIndex, EdgeIndex, StoreIndex, candidate_sentences
+from operations import conllu2trees
+from patterns import parse_pattern, deptree_predicate
+
+TREE_PATTERNS = [
+    'SUBSEQUENCE (LEMMA dog) (POS NOUN)', 'SEQUENCE (FORM the) (POS *)', 'SEQUENCE_ (LEMMA politi*) (POS VERB)',
+    'SUBSEQUENCE (POS IN ADP DET) (LEMMA cat)', 'SEQUENCE (FEATS *Past*) (DEPREL nsubj)',
+    'AND (LENGTH >5) (SUBSEQUENCE (FORM she) (FORM it))', 'OR (SEQUENCE (FORM big) (FORM dog)) (POS VERB)',
+    'POS NOUN', 'NOT (POS NOUN)', 'SEQUENCE (FORM de) (FORM la)', 'SEQUENCE (FORM the) (FORM dog) (FORM runs)',
+    ]
+
+SUBTREE_PATTERNS = [
+    'HAS_SUBTREE (POS DET)', 'AND (POS NOUN) (HAS_SUBTREE (DEPREL amod) (POS ADJ))',
+    'TREE_ (POS VERB) (DEPREL nsubj)', 'TREE (POS NOUN) (POS DET)', 'OR (POS ADJ) (HAS_SUBTREE (FORM big))',
+    'HAS_SUBTREE (AND)', 'LEMMA dog', 'X',
+    ]
+
+
+@pytest.fixture
+def files(tmp_path) -> tuple[str, str]:
+    "a CoNLL-U file with irregular stanzas among the others, and its corpus store"
+    path, directory = str(tmp_path / 'in.conllu'), str(tmp_path / 'in.store')
+    with open(path, 'w') as file:
+        lines = generated_corpus(150) + IRREGULAR + REPEATED_IDS + generated_corpus(50, seed=2)
+        file.write(''.join(line + '\n' for line in lines))
+    execute(['--input', path, 'convert_corpus ' + directory])
+    return path, directory
+
+
+def matching(path: str, match) -> list[int]:
+    with open(path) as lines:
+        return [i for i, tree in enumerate(conllu2trees(lines)) if match(tree)]
+
+
+def assert_candidates(store: str, name: str, patts: list, matched: list[int]):
+    candidates = candidate_sentences(CorpusStore(store), name, [parse_pattern(p) for p in patts])
+    if candidates is not None:
+        assert set(matched) <= set(candidates.tolist())
+
+
+@pytest.mark.parametrize('patt', TREE_PATTERNS)
+def test_match_trees_same_as_all_trees(files, patt):
+    path, store = files
+    command = 'match_trees ' + patt
+    assert execute(['--input', store, command]) == execute(['--input', path, command])
+    assert_candidates(store, 'match_trees', [patt], matching(path, deptree_predicate(parse_pattern(patt))))
+
+
+@pytest.mark.parametrize('patt', SUBTREE_PATTERNS)
+@pytest.mark.parametrize('name', ['match_subtrees', 'match_found_in_tree'])
+def test_match_subtrees_same_as_all_trees(files, name, patt):
+    path, store = files
+    command = name + ' ' + patt
+    assert execute(['--input', store, command]) == execute(['--input', path, command])
+    match = deptree_predicate(parse_pattern(patt))
+
+    def somewhere(tree):
+        return match(tree) or any(somewhere(t) for t in tree.subtrees)
+    assert_candidates(store, name, [patt], matching(path, somewhere))
+
+
+@pytest.mark.parametrize('patts', ['(POS NOUN) (POS ADJ)', '(POS NOUN) (DEPREL det) (POS ADJ)',
+                                   '(POS *) (HAS_SUBTREE (POS DET))', '(FORM casa) (FORM de)'])
+def test_find_partial_subtrees_same_as_all_trees(files, patts):
+    path, store = files
+    command = 'find_partial_subtrees ' + patts
+    assert execute(['--input', store, command]) == execute(['--input', path, command])
+
+
+@pytest.mark.parametrize('fields', ['POS', 'POS DEPREL', 'FORM LEMMA'])
+def test_head_dep_statistics_from_edges(files, fields):
+    path, store = files
+    command = 'head_dep_statistics ' + fields
+    assert execute(['--input', store, command]) == execute(['--input', path, command])
+
+
+def test_index_narrows_candidates(files):
+    path, store = files
+    columns = CorpusStore(store)
+    for name, patt in [('match_trees', 'SEQUENCE (FORM de) (FORM la)'), ('match_subtrees', 'TREE (LEMMA casa) (FORM big)')]:
+        candidates = candidate_sentences(columns, name, [parse_pattern(patt)])
+        assert 1 <= len(candidates) < 10
+
+
+def test_indexes_rebuilt_for_another_source(files, tmp_path):
+    path, store = files
+    execute(['--input', store, 'match_trees SEQUENCE (FORM de) (FORM la)'])
+    other = str(tmp_path / 'other.conllu')
+    with open(other, 'w') as file:
+        file.write(''.join(line + '\n' for line in generated_corpus(40, seed=5) + IRREGULAR))
+    execute(['--input', other, 'convert_corpus ' + store])
+    for command in ['match_trees SEQUENCE (FORM de) (FORM la)', 'match_subtrees HAS_SUBTREE (POS DET)',
+                    'head_dep_statistics POS']:
+        assert execute(['--input', store, command]) == execute(['--input', other, command])
+
+
+def test_store_index_is_abstract(files):
+    class NoBuild(StoreIndex):
+        META = 'none.json'
+        NAMES = []
+    with pytest.raises(TypeError):
+        NoBuild.open(CorpusStore(files[1]))
+    assert isinstance(SequenceIndex.open(CorpusStore(files[1])), StoreIndex)
+    assert isinstance(EdgeIndex.open(CorpusStore(files[1])), StoreIndex)
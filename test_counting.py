@@ -0,0 +1,99 @@
+# frequency tables: selection by --top and --min-count, approximate counts in bounded memory,
+# and exact counts with partial counts spilled to disk
+
+import os
+import random
+import tempfile
+import pytest
+import counting
+from conftest import generated_corpus, run_command
+from counting import (CountOptions, SpaceSaving, approximate_counts, count_keys, select_statistics,
+                      external_statistics)
+from operations import parse_count_options
+from patterns import ParseError
+
+
+@pytest.fixture
+def keys() -> list[str]:
+    "a stream with a few frequent keys and many rare ones"
+    rand = random.Random(3)
+    return [rand.choice('abcde') if rand.random() < 0.5 else str(rand.randrange(1000)) for _ in range(20000)]
+
+
+def test_select_statistics():
+    stats = {'a': 3, 'b': 5, 'c': 1, 'd': 3}
+    assert select_statistics(stats, CountOptions()) == [('b', 5), ('a', 3), ('d', 3), ('c', 1)]
+    assert select_statistics(stats, CountOptions(top=2)) == [('b', 5), ('a', 3)]
+    assert select_statistics(stats, CountOptions(min_count=3)) == [('b', 5), ('a', 3), ('d', 3)]
+    assert select_statistics(stats, CountOptions(top=1, min_count=6)) == []
+
+
+def test_space_saving_bounds(keys):
+    m = 50
+    summary = SpaceSaving(m)
+    for key in keys:
+        summary.add(key)
+    exact = count_keys(keys)
+    assert len(summary.counts) <= m
+    for key, count in summary.counts.items():
+        assert exact.get(key, 0) <= count <= exact.get(key, 0) + summary.errors[key]
+        assert summary.errors[key] <= summary.bound()
+    for key, count in exact.items():
+        if count > len(keys) / m:
+            assert key in summary.counts
+
+
+def test_approximate_counts_exact_with_enough_counters(keys):
+    assert approximate_counts(keys, 2000) == count_keys(keys)
+
+
+def test_top_and_min_count_commands(corpus):
+    exact = run_command('statistics POS DEPREL', corpus)
+    assert run_command('statistics --top 5 POS DEPREL', corpus) == exact[:5]
+    assert run_command('statistics --min-count 20 POS DEPREL', corpus) == [it for it in exact if it[1] >= 20]
+    assert run_command('statistics --approx 1000 POS DEPREL', corpus) == exact
+
+
+def test_approx_command_finds_frequent_keys(corpus):
+    exact = dict(run_command('statistics FORM', corpus))
+    approx = dict(run_command('statistics --approx 10 FORM', corpus))
+    total = sum(exact.values())
+    for key, count in exact.items():
+        if count > total / 10:
+            assert exact[key] <= approx[key] <= exact[key] + total // 10
+
+
+def test_count_options():
+    args, options = parse_count_options(['--top', '3', 'POS', '--min-count', '2'])
+    assert args == ['POS'] and options == CountOptions(top=3, min_count=2)
+    for words in [['--top'], ['--approx', 'many']]:
+        with pytest.raises(ParseError):
+            parse_count_options(words)
+
+
+@pytest.mark.parametrize('spill', [20, 300, 100000])
+def test_external_statistics_same_as_exact(keys, spill):
+    for options in [CountOptions(), CountOptions(top=10), CountOptions(min_count=5)]:
+        spilled = CountOptions(options.top, options.min_count, spill=spill)
+        assert list(external_statistics(keys, spilled)) == select_statistics(count_keys(keys), options)
+
+
+def test_merge_runs_in_rounds(monkeypatch, keys):
+    monkeypatch.setattr(counting, 'MAX_OPEN_RUNS', 3)
+    assert list(external_statistics(keys, CountOptions(spill=50))) == \
+        select_statistics(count_keys(keys), CountOptions())
+
+
+def test_spill_leaves_no_files(keys):
+    before = set(os.listdir(tempfile.gettempdir()))
+    list(external_statistics(keys, CountOptions(spill=100)))
+    assert set(os.listdir(tempfile.gettempdir())) == before
+
+
+@pytest.mark.parametrize('command', ['statistics POS DEPREL', 'statistics --top 4 FORM',
+                                     'ngram_statistics 2 POS', 'treetype_statistics POS',
+                                     'head_dep_statistics POS'])
+def test_spill_commands(command):
+    corpus = generated_corpus(200)
+    name, rest = command.split(' ', 1)
+    assert run_command(name + ' --spill 3 ' + rest, corpus) == run_command(command, corpus)
@@ -0,0 +1,79 @@
+# dedup_trees with exact, Bloom filter and MinHash filters, and its fused stages
+
+import pytest
+from conftest import IRREGULAR, REPEATED_IDS, REPEATED_ID_CYCLE, generated_corpus, run_command, outcome
+from dedup import ExactFilter, BloomFilter, MinHashFilter, duplicate_report
+from operations import parse_dedup_options
+from patterns import ParseError
+
+DEDUP_COMMANDS = [
+    'dedup_trees | trees2conllu',
+    'dedup_trees | trees2wordlines',
+    'dedup_trees LEMMA POS | extract_sentences',
+    'dedup_trees tree | trees2conllu',
+    'dedup_trees --bloom 1 | trees2wordlines',
+    'dedup_trees --minhash 0.8 | extract_sentences',
+    ]
+
+
+@pytest.fixture
+def duplicated() -> list[str]:
+    "a corpus where each tree is given twice, the second time with other sent_ids"
+    lines = generated_corpus(50) + IRREGULAR
+    return lines + [line.replace('sent_id = ', 'sent_id = again_') for line in lines]
+
+
+@pytest.mark.parametrize('command', DEDUP_COMMANDS)
+def test_fused_same_as_unfused(duplicated, command):
+    assert run_command(command, duplicated) == run_command(command, duplicated, optimize=False)
+
+
+@pytest.mark.parametrize('command', DEDUP_COMMANDS)
+def test_fused_same_as_unfused_on_repeated_ids(timeout, command):
+    for stanza in [REPEATED_IDS, REPEATED_ID_CYCLE]:
+        unfused = outcome(command, stanza, optimize=False)
+        assert unfused is not TimeoutError
+        assert outcome(command, stanza) == unfused
+
+
+def test_exact_dedup_keeps_first_of_each(duplicated):
+    sentences = run_command('extract_sentences', duplicated)
+    assert run_command('dedup_trees | extract_sentences', duplicated) == list(dict.fromkeys(sentences))
+
+
+def test_exact_filter():
+    filter = ExactFilter()
+    assert [filter.seen(k) for k in ['a', 'b', 'a', 'c', 'b']] == [False, False, True, False, True]
+    assert filter.note() == '3 distinct'
+
+
+def test_bloom_filter_finds_all_duplicates():
+    filter = BloomFilter(1)
+    keys = ['key ' + str(i) for i in range(5000)]
+    new = [filter.seen(k) for k in keys]
+    assert all(filter.seen(k) for k in keys)
+    assert sum(new) <= 5   # new keys taken for duplicates, expected about 0
+    assert filter.false_positive_rate() < 1e-6
+
+
+def test_minhash_filter():
+    filter = MinHashFilter(0.5)
+    words = 'the big dog saw a small cat in the house on the hill'.split()
+    assert not filter.seen(words)
+    assert filter.seen(words)
+    assert filter.seen(words[:-1])
+    assert not filter.seen('politics is not about that at all and she was right'.split())
+    assert filter.note() == '2 kept'
+
+
+def test_duplicate_report():
+    assert duplicate_report('dedup_trees', 4, 1, '3 distinct') == \
+        '# dedup_trees: 4 items, 1 duplicates (25.00%), 3 distinct'
+
+
+def test_dedup_options():
+    assert parse_dedup_options(['--bloom', '2', 'FORM', 'POS']) == (['FORM', 'POS'], {'bloom': 2})
+    assert parse_dedup_options(['--minhash', '0.7']) == ([], {'minhash': 0.7})
+    for words in [['--bloom'], ['--minhash', 'x'], ['WORD']]:
+        with pytest.raises(ParseError):
+            parse_dedup_options(words)
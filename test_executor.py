@@ -0,0 +1,54 @@
+# pipes run in threads give the same results as in one thread, and restore the switch interval
+
+import sys
+import pytest
+from executor import pipelined, threaded, QueueMetrics
+from operations import parse_operation_pipe, preprocess_operation, postprocess_operation, optimize_operation
+from conftest import run_command
+
+COMMANDS = ['trees2conllu', 'match_trees (LENGTH >5) | extract_sentences', 'statistics POS',
+            'change_subtrees (IF (DEPREL nsubj) (FORM * X)) | trees2wordlines']
+
+
+def stages(command: str) -> list:
+    op, _ = optimize_operation(postprocess_operation(preprocess_operation(parse_operation_pipe(command))))
+    return op.parts()
+
+
+@pytest.mark.parametrize('command', COMMANDS)
+@pytest.mark.parametrize('selected', ['all', 'read', 'conllu2trees,trees2strs'])
+def test_pipelined_same_as_sequential(corpus, command, selected):
+    results, metrics = pipelined(stages(command), iter(corpus), selected, queue_size=2, chunk_size=3)
+    assert list(results) == run_command(command, corpus)
+
+
+def test_metrics(corpus):
+    results, metrics = pipelined(stages('trees2wordlines'), iter(corpus), 'all')
+    results = list(results)
+    assert [m.stage for m in metrics] == ['read', 'conllu2treewordlines', 'wordlines2strs']
+    assert metrics[0].items == len(corpus)
+    assert metrics[-1].items == len(results)
+
+
+@pytest.mark.parametrize('command', ['trees2conllu', 'count_trees'])
+def test_switch_interval_restored(corpus, command):
+    interval = sys.getswitchinterval()
+    results, _ = pipelined(stages(command), iter(corpus))
+    list(results)
+    assert sys.getswitchinterval() == interval
+
+
+def test_switch_interval_restored_when_stopped(corpus):
+    interval = sys.getswitchinterval()
+    results, _ = pipelined(stages('trees2conllu'), iter(corpus))
+    next(results)
+    results.close()
+    assert sys.getswitchinterval() == interval
+
+
+def test_failure_passed_on():
+    def failing():
+        yield 1
+        raise ValueError('in the stage')
+    with pytest.raises(ValueError):
+        list(threaded(failing(), QueueMetrics('failing'), chunk_size=1))
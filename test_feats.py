@@ -0,0 +1,63 @@
+# FEATS strings parsed once give the features of the string, and FEAT matches the words whose
+# feature has the value, compiled, in match_wordline and on the index of a corpus store
+
+from fnmatch import fnmatch
+import pytest
+from conftest import FEATS, execute
+from corpus import CorpusStore
+from corpusindex import candidate_sentences
+from operations import conllu2trees, conllu2wordlines
+from patterns import parse_pattern, match_wordline, wordline_predicate, deptree_predicate
+from trees import parse_feats
+
+FEAT_PATTERNS = [
+    ('Tense', 'Past'), ('Tense', 'P*'), ('Number', 'Sing'), ('VerbForm', '*'), ('Mood', 'Imp'),
+    ('PronType', 'Art'), ('Case', '*'),
+    ]
+
+
+def feature_dict(feats: str) -> dict:
+    return {} if feats == '_' else dict(fv.split('=', 1) for fv in feats.split('|'))
+
+
+@pytest.mark.parametrize('feats', FEATS + ['Case=Nom|Number=Sing|Person=3', 'Typo=Yes=No'])
+def test_parse_feats(feats):
+    assert parse_feats(feats) == feature_dict(feats)
+    assert parse_feats(feats) is parse_feats(''.join(feats))
+    with pytest.raises(TypeError):
+        parse_feats(feats)['Number'] = 'Dual'
+
+
+def test_wordline_feats(corpus):
+    for word in conllu2wordlines(corpus):
+        assert word.feats() == feature_dict(word.FEATS)
+
+
+@pytest.mark.parametrize('feature, value', FEAT_PATTERNS)
+def test_feat_same_as_features(corpus, feature, value):
+    patt = parse_pattern('FEAT ' + feature + ' ' + value)
+    pred = wordline_predicate(patt)
+    for word in conllu2wordlines(corpus):
+        features = feature_dict(word.FEATS)
+        expected = feature in features and fnmatch(features[feature], value)
+        assert match_wordline(patt, word) == pred(word) == expected
+
+
+@pytest.mark.parametrize('feature, value', FEAT_PATTERNS)
+def test_feat_on_store(corpus_file, store, feature, value):
+    patt = 'FEAT ' + feature + ' ' + value
+    for command in ['match_wordlines ' + patt, 'match_trees SEQUENCE_ (' + patt + ') (POS *)',
+                    'match_subtrees HAS_SUBTREE (' + patt + ')']:
+        assert execute(['--input', store, command]) == execute(['--input', corpus_file, command])
+    with open(corpus_file) as lines:
+        pred = deptree_predicate(parse_pattern('SEQUENCE_ (' + patt + ')'))
+        matched = [i for i, tree in enumerate(conllu2trees(lines)) if pred(tree)]
+    candidates = candidate_sentences(CorpusStore(store), 'match_trees', [parse_pattern('SEQUENCE_ (' + patt + ')')])
+    if candidates is not None:
+        assert set(matched) <= set(candidates.tolist())
+
+
+def test_feat_same_as_feats_string(corpus):
+    # no other feature of the corpus has a name or value that contains Tense=Past
+    lines = execute(['match_wordlines FEAT Tense Past'], corpus)
+    assert lines and lines == execute(['match_wordlines FEATS *Tense=Past*'], corpus)
@@ -0,0 +1,56 @@
+# the fused stages of optimize_operation give the same results as the stages they replace,
+# and fail the same way on stanzas that are not trees
+
+import pytest
+from conftest import IRREGULAR, REPEATED_IDS, REPEATED_ID_CYCLE, run_command, outcome
+from operations import parse_operation_pipe, preprocess_operation, optimize_operation
+
+FUSED_COMMANDS = [
+    ('trees2conllu', 'conllu2conllu'),
+    ('extract_sentences', 'conllu2sentences'),
+    ('match_trees (LENGTH >0) | extract_sentences', 'trees2sentences'),
+    ('trees2wordlines', 'conllu2treewordlines'),
+    ('count_trees', 'conllu_count_trees'),
+    ('statistics POS DEPREL', 'conllu_statistics'),
+    ('match_wordlines DEPREL nsubj | statistics POS', 'conllu_statistics'),
+    ('change_wordlines LEMMA the that | change_wordlines POS DET X', 'rewrite_wordlines'),
+    ('change_subtrees (IF (DEPREL nsubj) (FORM * X)) | change_trees PRUNE 2 | trees2conllu',
+     'rewrite_trees'),
+    ]
+
+
+def plan(command: str) -> list[str]:
+    op, _ = optimize_operation(preprocess_operation(parse_operation_pipe(command)))
+    return [stage.name for stage in op.parts()]
+
+
+@pytest.mark.parametrize('command, fused', FUSED_COMMANDS)
+def test_fused_stage_is_used(command, fused):
+    assert fused in plan(command)
+
+
+@pytest.mark.parametrize('command, fused', FUSED_COMMANDS)
+def test_fused_same_as_unfused(corpus, command, fused):
+    assert run_command(command, corpus) == run_command(command, corpus, optimize=False)
+
+
+@pytest.mark.parametrize('command, fused', FUSED_COMMANDS)
+def test_fused_same_as_unfused_on_irregular_stanzas(command, fused):
+    for stanza in [IRREGULAR, REPEATED_IDS]:
+        assert outcome(command, stanza) == outcome(command, stanza, optimize=False)
+
+
+@pytest.mark.parametrize('command, fused', FUSED_COMMANDS[:5])
+def test_repeated_id_cycle_fails_as_unfused(timeout, command, fused):
+    unfused = outcome(command, REPEATED_ID_CYCLE, optimize=False)
+    assert isinstance(unfused, type) and unfused is not TimeoutError
+    assert outcome(command, REPEATED_ID_CYCLE) == unfused
+
+
+def test_sentences_of_irregular_stanzas():
+    assert run_command('extract_sentences', IRREGULAR) == [
+        'de la casa big', 'the dog big', 'the dog runs', 'the dog runs']
+
+
+def test_no_fusion_across_other_stages():
+    assert plan('match_trees (POS NOUN) | trees2conllu') == ['conllu2trees', 'match_trees', 'trees2conllu']
@@ -0,0 +1,129 @@
+# match_found_in_tree gives the trees where the pattern matches, marking each matching node
+# once in its MISC when the tree is written out, and not before
+
+import pytest
+from conftest import execute, generated_corpus, run_command
+from operations import conllu2trees
+from patterns import match_deptree, match_found_in_deptree, parse_pattern
+from treebin import decode_trees
+from trees import MATCH_MARK
+from visualize_ud import VisualStanza
+
+PATTERNS = [
+    'POS NOUN', 'DEPREL nsubj', 'HAS_SUBTREE (POS DET)', 'AND (POS VERB) (LENGTH >2)', 'FORM dog',
+    'TREE_ (POS *) (DEPREL amod)', 'LENGTH >30',
+    ]
+
+
+def subtrees(tree):
+    yield tree
+    for t in tree.subtrees:
+        yield from subtrees(t)
+
+
+def stanzas(lines: list[str]) -> list[list[str]]:
+    "the word lines of each stanza"
+    result, stanza = [], []
+    for line in lines:
+        if not line.strip():
+            if stanza:
+                result.append(stanza)
+            stanza = []
+        elif not line.startswith('#'):
+            stanza.append(line)
+    return result + [stanza] * bool(stanza)
+
+
+def marked_ids(stanza: list[str]) -> list[str]:
+    # trees2conllu adds the DEPREL of the root to its MISC after the mark
+    return [line.split('\t')[0] for line in stanza if MATCH_MARK in line.split('\t')[9]]
+
+
+def matching_ids(patt: str, lines: list[str]) -> list[list[str]]:
+    "the IDs of the matching nodes of each tree with some, as renumbered by trees2conllu"
+    result = []
+    for tree in conllu2trees(lines):
+        matched = [id(t.root) for t in subtrees(tree) if match_deptree(parse_pattern(patt), t)]
+        if matched:
+            result.append([str(i) for i, w in enumerate(tree.wordlines(), 1) if id(w) in matched])
+    return result
+
+
+@pytest.mark.parametrize('patt', PATTERNS)
+def test_marks_same_as_matching_nodes(corpus, patt):
+    lines = execute(['match_found_in_tree ' + patt + ' | trees2conllu'], corpus)
+    assert [marked_ids(s) for s in stanzas(lines)] == matching_ids(patt, corpus)
+
+
+@pytest.mark.parametrize('patt', PATTERNS)
+def test_marked_once(corpus, patt):
+    once = execute(['match_found_in_tree ' + patt + ' | trees2conllu'], corpus)
+    assert execute(['match_found_in_tree ' + patt + ' | match_found_in_tree ' + patt + ' | trees2conllu'],
+                   corpus) == once
+
+
+def premarked(lines: list[str]) -> list[str]:
+    "the lines with a mark in the MISC of every word"
+    return [line[:-1] + MATCH_MARK if line and not line.startswith('#') else line for line in lines]
+
+
+@pytest.mark.parametrize('patt', PATTERNS)
+def test_old_marks_not_repeated(corpus, patt):
+    lines = execute(['match_found_in_tree ' + patt + ' | trees2conllu'], premarked(corpus))
+    assert not any(MATCH_MARK + MATCH_MARK in line for line in lines)
+    assert [marked_ids(s) for s in stanzas(lines)] == [[line.split('\t')[0] for line in s] for s in stanzas(lines)]
+
+
+def test_marks_not_in_misc_before_output(corpus):
+    patt = parse_pattern('POS NOUN')
+    for tree in conllu2trees(corpus):
+        miscs = [w.MISC for w in tree.wordlines()]
+        match_found_in_deptree(patt, tree)
+        assert [w.MISC for w in tree.wordlines()] == miscs
+
+
+def test_old_marks_do_not_match(corpus):
+    lines = premarked(corpus)
+    assert execute(['match_found_in_tree LENGTH >30 | trees2conllu'], lines) == []
+    assert len(stanzas(execute(['match_found_in_tree FORM dog | trees2conllu'], lines))) == \
+        len(matching_ids('FORM dog', corpus))
+
+
+def test_marks_kept_by_later_stages(corpus):
+    # pruning leaves the marks of the nodes that are left
+    lines = execute(['match_found_in_tree POS NOUN | change_trees PRUNE 2 | trees2conllu'], corpus)
+    for stanza in stanzas(lines):
+        assert marked_ids(stanza) == [line.split('\t')[0] for line in stanza if line.split('\t')[3] == 'NOUN']
+
+
+def test_marks_in_visualization():
+    lines = execute(['match_found_in_tree POS NOUN | trees2conllu'], generated_corpus(30))
+    for stanza in stanzas(lines):
+        tokens = VisualStanza('\n'.join(stanza)).tokens
+        assert [t['match'] for t in tokens] == [line.split('\t')[3] == 'NOUN' for line in stanza]
+    assert 'red' in ''.join(run_command('match_found_in_tree POS NOUN | trees2conllu | visualize_conllu',
+                                        generated_corpus(3)))
+
+
+def test_marks_not_in_misc_of_memoized_trees(corpus_file, tmp_path):
+    # the marks are kept in memos apart from MISC, so later stages do not see them cold or warm
+    memo = str(tmp_path / 'memo')
+    command = 'match_found_in_tree (POS NOUN) | match_trees (MISC *MATCH*) | count_trees'
+    assert execute(['--input', corpus_file, command]) == ['0']
+    assert execute(['--input', corpus_file, '--processes', '2', command]) == ['0']
+    assert execute(['--memo', memo, '--input', corpus_file, command]) == ['0']
+    execute(['--memo', memo, '--input', corpus_file, 'match_found_in_tree (POS NOUN)'])
+    assert execute(['--memo', memo, '--input', corpus_file, command]) == ['0']
+    assert execute(['--memo', memo, '--input', corpus_file, 'match_found_in_tree (POS NOUN) | trees2conllu']) == \
+        execute(['--input', corpus_file, 'match_found_in_tree (POS NOUN) | trees2conllu'])
+
+
+def test_marks_in_bin_output(corpus, tmp_path):
+    # the bin format writes the marks into MISC, like the other formats of trees
+    path = str(tmp_path / 'trees.bin')
+    execute(['--format', 'bin', '--output', path, 'match_found_in_tree POS NOUN'], corpus)
+    with open(path, 'rb') as file:
+        trees = list(decode_trees(file))
+    assert not any(t.matched for tree in trees for t in subtrees(tree))
+    assert [[w.POS == 'NOUN' for w in tree.wordlines()] for tree in trees] == \
+        [[MATCH_MARK in w.MISC for w in tree.wordlines()] for tree in trees]
@@ -0,0 +1,49 @@
+# IN lists and IN_FILE word lists match the same words as trying each pattern with match_str
+
+import pytest
+from conftest import WORDS, execute
+from patterns import ValueSet, match_str, parse_pattern, match_wordline, wordline_predicate
+from operations import conllu2wordlines
+
+PATTERN_LISTS = [
+    ['the', 'a', 'dog'], ['th*', 'do*', 'd*'], ['*s', '*og', '*it'], ['*'], [''],
+    ['?og', '[a-c]*', '*o*', 's?e'], ['the', 'ca*', '*ing', 'b?g', 'politic[sz]', '*'],
+    ['a*b', 'x', '*[', 'th', 'he*'],
+    ]
+STRINGS = WORDS + ['', 'The', 'dogs', 'cats', 'bag', 'big', 'ab', 'axb', 'x', 'thing', 'doing', '[', 'a[']
+
+
+@pytest.mark.parametrize('patts', PATTERN_LISTS)
+def test_value_set_same_as_match_str(patts):
+    values = ValueSet(patts)
+    for word in STRINGS:
+        assert (word in values) == any(match_str(p, word) for p in patts), word
+
+
+@pytest.fixture
+def stopwords() -> list[str]:
+    "the values of the IN list of stopwords.oper"
+    with open('stopwords.oper') as file:
+        return file.read().splitlines()[1:-1]
+
+
+def test_in_file_same_as_in(corpus, stopwords, tmp_path):
+    path = str(tmp_path / 'stopwords.txt')
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write('\n'.join(stopwords + ['']))
+    in_list, in_file = parse_pattern('FORM IN ' + ' '.join(stopwords)), parse_pattern('FORM IN_FILE ' + path)
+    pred_list, pred_file = wordline_predicate(in_list), wordline_predicate(in_file)
+    for word in conllu2wordlines(corpus):
+        expected = any(match_str(p, word.FORM) for p in stopwords)
+        assert match_wordline(in_list, word) == match_wordline(in_file, word) == expected
+        assert pred_list(word) == pred_file(word) == expected
+    assert execute(['match_wordlines NOT (FORM IN_FILE ' + path + ')'], corpus) == \
+        execute(['from_script stopwords.oper'], corpus)
+
+
+def test_in_file_on_store(corpus_file, store, tmp_path):
+    path = str(tmp_path / 'words.txt')
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write('dog\nca*\n\n*ig\n')
+    for command in ['match_wordlines FORM IN_FILE ' + path, 'match_trees SUBSEQUENCE (FORM IN_FILE ' + path + ') (POS *)']:
+        assert execute(['--input', store, command]) == execute(['--input', corpus_file, command])
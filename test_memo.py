@@ -0,0 +1,83 @@
+# results of pipes with memoized prefixes are the same as computed from the input
+
+import os
+import pytest
+from conftest import execute
+from memo import MEMO_SUFFIX, file_digest, spooled_digest, evict_memos
+
+MATCH = 'match_trees (LENGTH >5)'
+CHANGE = 'change_subtrees (IF (DEPREL nsubj) (FORM * X))'
+
+
+def plan(args: list[str], lines=()) -> str:
+    return [line for line in execute(['--explain'] + args, lines) if line.startswith('# plan:')][0]
+
+
+def memos(directory) -> list[str]:
+    return [name for name in os.listdir(directory) if name.endswith(MEMO_SUFFIX)]
+
+
+@pytest.mark.parametrize('command', [MATCH + ' | trees2conllu', MATCH + ' | ' + CHANGE + ' | extract_sentences',
+                                     CHANGE + ' | treetype_statistics POS'])
+def test_memoized_same_as_computed(corpus_file, tmp_path, command):
+    memo = str(tmp_path / 'memo')
+    computed = execute(['--input', corpus_file, command])
+    assert execute(['--memo', memo, '--input', corpus_file, command]) == computed
+    assert memos(memo)
+    assert 'memo_read' in plan(['--memo', memo, '--input', corpus_file, command])
+    assert execute(['--memo', memo, '--input', corpus_file, command]) == computed
+
+
+def test_longest_prefix_read(corpus_file, tmp_path):
+    memo = str(tmp_path / 'memo')
+    execute(['--memo', memo, '--input', corpus_file, MATCH + ' | ' + CHANGE + ' | count_trees'])
+    assert len(memos(memo)) == 2
+    assert plan(['--memo', memo, '--input', corpus_file, MATCH + ' | ' + CHANGE + ' | trees2conllu']) == \
+        '# plan:  memo_read | trees2conllu'
+    assert plan(['--memo', memo, '--input', corpus_file, MATCH + ' | count_trees']).startswith('# plan:  memo_read')
+
+
+def test_memo_not_changed_by_later_stages(corpus_file, tmp_path):
+    memo = str(tmp_path / 'memo')
+    original = execute(['--input', corpus_file, MATCH + ' | trees2conllu'])
+    execute(['--memo', memo, '--input', corpus_file, MATCH + ' | ' + CHANGE + ' | trees2conllu'])
+    assert execute(['--memo', memo, '--input', corpus_file, MATCH + ' | trees2conllu']) == original
+
+
+@pytest.mark.parametrize('later', ['match_trees (MISC *MATCH*) | count_trees', 'trees2conllu',
+                                   'trees2wordlines | statistics MISC'])
+def test_found_in_tree_memoized_before_misc_stages(corpus_file, tmp_path, later):
+    # later stages see the same MISC whether the trees of match_found_in_tree are read from a memo or not
+    memo = str(tmp_path / 'memo')
+    prefix = 'match_found_in_tree (POS NOUN)'
+    computed = execute(['--input', corpus_file, prefix + ' | ' + later])
+    execute(['--memo', memo, '--input', corpus_file, prefix])
+    assert 'memo_read' in plan(['--memo', memo, '--input', corpus_file, prefix + ' | ' + later])
+    assert execute(['--memo', memo, '--input', corpus_file, prefix + ' | ' + later]) == computed
+
+
+def test_stdin_same_digest_as_file(corpus, corpus_file, tmp_path):
+    with open(corpus_file) as lines:
+        digest, spooled = spooled_digest(lines)
+    assert digest == file_digest(corpus_file)
+    with open(corpus_file) as lines:
+        assert spooled.read() == lines.read()
+    memo = str(tmp_path / 'memo')
+    execute(['--memo', memo, '--input', corpus_file, MATCH + ' | count_trees'])
+    with open(corpus_file) as lines:
+        assert execute(['--memo', memo, '--explain', MATCH + ' | count_trees'], lines)[-1].startswith('# plan:  memo_read')
+    with open(corpus_file) as lines:
+        assert execute(['--memo', memo, MATCH + ' | count_trees'], lines) == \
+            execute(['--input', corpus_file, MATCH + ' | count_trees'])
+
+
+def test_evict_least_recently_used(tmp_path):
+    for i, name in enumerate(['a', 'b', 'c']):
+        path = tmp_path / (name + MEMO_SUFFIX)
+        path.write_bytes(b'x' * (400 << 10))
+        os.utime(path, ns=(i * 10**9, i * 10**9))
+    (tmp_path / 'other').write_bytes(b'x' * (2 << 20))
+    evict_memos(str(tmp_path), 1)
+    assert sorted(os.listdir(tmp_path)) == ['b' + MEMO_SUFFIX, 'c' + MEMO_SUFFIX, 'other']
+    evict_memos(str(tmp_path), 0)
+    assert os.listdir(tmp_path) == ['other']
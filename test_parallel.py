@@ -0,0 +1,51 @@
+# commands run by worker processes on parts of a shared corpus give the same results as in one process
+
+from multiprocessing.shared_memory import SharedMemory
+import pytest
+from conftest import execute
+from arena import CorpusArena, attach
+from corpus import CorpusColumns, corpus_columns
+from operations import conllu2trees, trees2strs
+
+COMMANDS = [
+    'trees2conllu', 'extract_sentences', 'trees2wordlines', 'count_trees', 'count_wordlines',
+    'statistics POS DEPREL', 'match_wordlines DEPREL nsubj | statistics --top 3 POS',
+    'treetype_statistics POS', 'head_dep_statistics --min-count 2 POS',
+    'match_trees (LENGTH >5) | extract_sentences', 'match_trees (LENGTH >5) | count_trees',
+    'change_subtrees (IF (DEPREL nsubj) (FORM * X)) | trees2conllu',
+    'statistics --approx 5 FORM', 'statistics --spill 4 FORM', 'trees2wordlines | count_wordlines',
+    ]
+
+
+@pytest.mark.parametrize('command', COMMANDS)
+def test_processes_same_as_one(corpus_file, command):
+    assert execute(['--processes', '3', '--input', corpus_file, command]) == \
+        execute(['--input', corpus_file, command])
+
+
+@pytest.mark.parametrize('command', COMMANDS[:6])
+def test_processes_on_store_and_stdin(corpus, corpus_file, store, command):
+    expected = execute(['--input', corpus_file, command])
+    assert execute(['--processes', '2', '--input', store, command]) == expected
+    assert execute(['--processes', '2', command], corpus) == expected
+
+
+def test_explain_parts(corpus_file):
+    lines = execute(['--explain', '--processes', '2', '--input', corpus_file,
+                     'match_trees (LENGTH >5) | count_trees'])
+    assert '# parts: conllu2trees | match_trees | count_trees' in lines
+    assert '# then:  merge' in lines
+
+
+def test_arena_ranges_cover_corpus(corpus):
+    columns = CorpusColumns(*corpus_columns(corpus))
+    expected = list(trees2strs(conllu2trees(corpus)))
+    with CorpusArena(columns) as arena:
+        handles = arena.handles(7, columns.trees_end())
+        assert handles[0].begin == 0 and handles[-1].end == columns.trees_end()
+        assert all(h.end == k.begin for h, k in zip(handles, handles[1:]))
+        trees = [tree for h in handles for tree in attach(h).trees(h.begin, h.end)]
+        assert list(trees2strs(trees)) == expected
+        name = arena.shm.name
+    with pytest.raises(FileNotFoundError):
+        SharedMemory(name)
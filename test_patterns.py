@@ -0,0 +1,97 @@
+# pattern matching in one traversal of each tree, or one pass over trees, gives the same
+# matches as the recursive definitions
+
+import pytest
+from conftest import run_command
+from operations import conllu2trees
+from patterns import *
+
+
+def shape(tree: DepTree) -> tuple:
+    "the IDs and FORMs of the nodes of a tree, in its structure"
+    return tree.root.ID, tree.root.FORM, [shape(t) for t in tree.subtrees]
+
+
+@pytest.fixture
+def trees(corpus):
+    return list(conllu2trees(corpus))
+
+
+def paths_from_each_node(patts: list[Pattern], tree: DepTree) -> list[DepTree]:
+    "find_paths_in_tree from each node in preorder"
+    paths = find_paths_in_tree(patts, tree)
+    for t in tree.subtrees:
+        paths.extend(paths_from_each_node(patts, t))
+    return paths
+
+
+@pytest.mark.parametrize('patts', [
+    ['(POS VERB)', '(POS NOUN)'], ['(POS VERB)', '(POS *)', '(POS NOUN)'], ['(POS *)', '(POS *)'],
+    ['(DEPREL root)'], ['(POS *)'] * 4, ['(NOT (POS X))'] * 3, ['(POS NOUN)', '(POS ADJ)', '(POS NOUN)'],
+    ])
+def test_paths_same_as_from_each_node(trees, patts):
+    patts = [parse_pattern(p) for p in patts]
+    for tree in trees:
+        assert [shape(p) for p in find_paths_in_subtrees(patts, tree)] == \
+            [shape(p) for p in paths_from_each_node(patts, tree)]
+
+
+def test_find_paths_command(corpus):
+    lines = run_command('find_paths (DEPREL root) (POS *)', corpus)
+    trees = list(conllu2trees(corpus))
+    assert lines.count('') == sum(len(t.subtrees) for t in trees)
+
+
+def flat_patterns(patt: Pattern) -> list[Pattern]:
+    match patt:
+        case Pattern('SEGMENT', patts):
+            return [p for pt in patts for p in flat_patterns(pt)]
+        case Pattern('REPEAT', [n, pt]):
+            return [p for _ in range(int(n)) for p in flat_patterns(pt)]
+        case _:
+            return [patt]
+
+
+def segments_by_windows(patt: Pattern, trees: list[DepTree]) -> list[list[int]]:
+    "the positions of the trees in each segment, by matching each window of trees from the start"
+    match patt:
+        case Pattern('REPEAT', [n, pt]) if n[0] == '>':
+            segments, run = [], []
+            for i, tree in enumerate(trees + [None]):
+                if tree is not None and match_deptree(pt, tree):
+                    run.append(i)
+                else:
+                    if len(run) > int(n[1:]):
+                        segments.append(run)
+                    run = []
+            return segments
+    patts = flat_patterns(patt)
+    segments, i = [], 0
+    while i + len(patts) <= len(trees):
+        if all(match_deptree(p, t) for p, t in zip(patts, trees[i:])):
+            segments.append(list(range(i, i + len(patts))))
+            i += len(patts)
+        else:
+            i += 1
+    return segments
+
+
+@pytest.mark.parametrize('patt', [
+    'SEGMENT (AND) (HAS_SUBTREE (AND (DEPREL nsubj) (POS PRON)))',
+    'REPEAT >2 (LENGTH <12)', 'REPEAT >0 (LENGTH >15)', 'REPEAT 2 (LENGTH >8)',
+    'SEGMENT (LENGTH <5) (REPEAT 2 (LENGTH >10))', 'SEGMENT (LENGTH >3) (LENGTH >3) (LENGTH <3)',
+    'SEGMENT (REPEAT 2 (SEGMENT (LENGTH >5) (LENGTH <10)))',
+    ])
+def test_segments_same_as_windows(trees, patt):
+    patt = parse_pattern(patt)
+    positions = {id(t): i for i, t in enumerate(trees)}
+    assert [[positions[id(t)] for t in segment] for segment in matches_in_tree_stream(patt, trees)] == \
+        segments_by_windows(patt, trees)
+
+
+def test_match_segments_command(corpus):
+    lines = run_command('match_segments REPEAT >2 (LENGTH <12) | trees2conllu', corpus)
+    segments = segments_by_windows(parse_pattern('REPEAT >2 (LENGTH <12)'), list(conllu2trees(corpus)))
+    assert [line for line in lines if line.startswith('# FIRST')] == \
+        ['# FIRST IN SEGMENT length ' + str(len(s)) for s in segments]
+    assert lines.count('') == sum(map(len, segments))
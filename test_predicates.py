@@ -0,0 +1,93 @@
+# compiled patterns give the same matches as match_deptree and match_wordline, in whatever
+# order AND and OR try their parts
+
+import random
+import pytest
+from conftest import DEPRELS, POS, WORDS
+from operations import conllu2trees
+from patterns import *
+
+WORDLINE_PATTERNS = [
+    'POS NOUN', 'FORM th*', 'LEMMA *o*', 'DEPREL nmod:*', 'FEATS *Past*', 'ID 1', 'HEAD 0',
+    'HEAD_DISTANCE >1', 'HEAD_DISTANCE <0', 'FORM [a-c]*', 'DEPREL IN nsubj obj', 'POS IN *N* ADJ',
+    ]
+TREE_PATTERNS = [
+    'LENGTH >3', 'LENGTH <2', 'DEPTH >2', 'DEPTH =1', 'METADATA *s1*', 'IS_NONPROJECTIVE',
+    'SEQUENCE (POS *) (POS NOUN)', 'SUBSEQUENCE (FORM the) (POS NOUN)', 'SEQUENCE_ (POS VERB) (FORM dog)',
+    'HAS_SUBTREE (DEPREL det)', 'HAS_NO_SUBTREE (POS PUNCT)', 'TREE (POS *) (POS *)',
+    'TREE_ (POS NOUN) (DEPREL amod)', 'CONTAINS_SUBTREE (POS ADJ)',
+    ]
+
+
+def random_pattern(rand: random.Random, depth: int, tree: bool) -> str:
+    "a random pattern of nested AND, OR and NOT, of wordline patterns, or tree patterns too"
+    if depth == 0 or rand.random() < 0.3:
+        if rand.random() < 0.3:
+            return rand.choice([
+                'POS ' + rand.choice(POS), 'DEPREL ' + rand.choice(DEPRELS), 'FORM ' + rand.choice(WORDS)])
+        return rand.choice(WORDLINE_PATTERNS + (TREE_PATTERNS if tree else []))
+    op = rand.choice(['AND', 'OR', 'NOT'])
+    n = 1 if op == 'NOT' else rand.randint(1, 4)
+    return op + ' ' + ' '.join('(' + random_pattern(rand, depth - 1, tree) + ')' for _ in range(n))
+
+
+def subtrees(tree):
+    yield tree
+    for t in tree.subtrees:
+        yield from subtrees(t)
+
+
+@pytest.fixture
+def nodes(corpus):
+    return [t for tree in conllu2trees(corpus) for t in subtrees(tree)]
+
+
+@pytest.mark.parametrize('patt', WORDLINE_PATTERNS + TREE_PATTERNS)
+def test_predicate_same_as_match_deptree(nodes, patt):
+    patt = parse_pattern(patt)
+    pred = deptree_predicate(patt)
+    assert [pred(t) for t in nodes] == [bool(match_deptree(patt, t)) for t in nodes]
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_random_patterns_same_as_match_deptree(nodes, seed):
+    patt = parse_pattern(random_pattern(random.Random(seed), 3, True))
+    pred = deptree_predicate(patt)
+    assert [pred(t) for t in nodes] == [bool(match_deptree(patt, t)) for t in nodes], str(patt)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_random_patterns_same_as_match_wordline(nodes, seed):
+    patt = parse_pattern(random_pattern(random.Random(seed), 3, False))
+    pred = wordline_predicate(patt)
+    assert [pred(t.root) for t in nodes] == [match_wordline(patt, t.root) for t in nodes], str(patt)
+
+
+def test_same_after_reorder(nodes, monkeypatch):
+    monkeypatch.setattr(Branches, 'REORDER', 7)
+    for patt in ['AND (IS_NONPROJECTIVE) (LENGTH >2) (POS NOUN) (DEPREL det)',
+                 'OR (SUBSEQUENCE (FORM the) (POS NOUN)) (DEPTH >3) (FORM dog) (POS VERB)']:
+        patt = parse_pattern(patt)
+        pred = deptree_predicate(patt)
+        assert [pred(t) for t in nodes * 3] == [bool(match_deptree(patt, t)) for t in nodes * 3]
+
+
+def test_cheap_branches_first():
+    calls = []
+
+    def counted(name, result):
+        def pred(x):
+            calls.append(name)
+            return result
+        return pred
+    branches = Branches([counted('slow', False), counted('fast', False)], [50, 1], True)
+    assert not branches(None) and calls == ['fast']
+
+
+def test_decisive_branches_first():
+    # of two branches of the same cost, the one that more often decides the AND is tried first
+    branches = Branches([lambda x: x % 10 != 0, lambda x: x % 2 == 0], [1, 1], True)
+    assert branches.order == [0, 1]
+    assert [branches(x) for x in range(Branches.REORDER)] == \
+        [x % 10 != 0 and x % 2 == 0 for x in range(Branches.REORDER)]
+    assert branches.order == [1, 0]
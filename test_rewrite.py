@@ -0,0 +1,120 @@
+# changes made in place in one traversal give the same trees as changing a copy of each
+# node top-down, and to a fixed point the same as repeating the change until nothing changes
+
+import copy
+import pytest
+from conftest import run_command
+from operations import conllu2trees, trees2strs
+from patterns import Pattern, Rewriter, match_deptree, match_str, parse_pattern
+from trees import WORDLINE_FIELDS, DepTree, WordLine, prune_subtrees_below
+
+CHANGES = [
+    'IF (DEPREL nsubj) (FORM * X)', 'POS NOUN N', 'AND (LEMMA the that) (FORM the that)',
+    'IF (HAS_SUBTREE (POS ADJ)) (POS * HAS_ADJ)', 'PRUNE 3', 'FILTER_SUBTREES (NOT (DEPREL punct))',
+    'AND (IF (DEPREL amod) (PRUNE 1)) (IF (POS VERB) (FILTER_SUBTREES (LENGTH <4)))',
+    'IF (AND (POS NOUN) (HAS_SUBTREE (DEPREL det))) (AND (FORM * NP) (FILTER_SUBTREES (NOT (DEPREL det))))',
+    'IF (HAS_SUBTREE (POS VERB)) (POS * VERB)',
+    ]
+
+
+def changed_root(patt: Pattern, tree: DepTree) -> DepTree:
+    "a tree changed at its root, leaving the given tree as it is"
+    match patt:
+        case Pattern('IF', [cond, change]):
+            return changed_root(change, tree) if match_deptree(cond, tree) else tree
+        case Pattern('PRUNE', [depth]):
+            return prune_subtrees_below(copy.deepcopy(tree), int(depth))
+        case Pattern('FILTER_SUBTREES', [cond]):
+            return DepTree(tree.root, [t for t in tree.subtrees if match_deptree(cond, t)], tree.comments)
+        case Pattern('AND', patts):
+            for p in patts:
+                tree = changed_root(p, tree)
+            return tree
+        case Pattern(field, [old, new]) if field in WORDLINE_FIELDS and match_str(old, getattr(tree.root, field)):
+            return DepTree(WordLine(**{**tree.root.as_dict(), field: new}), tree.subtrees, tree.comments)
+        case _:
+            return tree
+
+
+def changed_subtrees(patt: Pattern, tree: DepTree) -> DepTree:
+    "a tree changed at its root and then in each of its changed subtrees"
+    t = changed_root(patt, tree)
+    return DepTree(t.root, [changed_subtrees(patt, st) for st in t.subtrees], t.comments)
+
+
+def strs(trees) -> list[str]:
+    "the trees as strings, printing copies since printing adds the lines of a tree to its comments"
+    return list(trees2strs(map(copy.deepcopy, trees)))
+
+
+@pytest.fixture
+def trees(corpus):
+    return list(conllu2trees(corpus))
+
+
+@pytest.mark.parametrize('change', CHANGES)
+def test_in_place_same_as_copies(corpus, change):
+    patt = parse_pattern(change)
+    expected = strs(changed_subtrees(patt, t) for t in conllu2trees(corpus))
+    rewrite = Rewriter().add(patt)
+    trees = list(conllu2trees(corpus))
+    assert all(rewrite(t) is t for t in trees)
+    assert strs(trees) == expected
+    assert run_command('change_subtrees ' + change + ' | trees2conllu', corpus) == \
+        run_command('change_subtrees ' + change + ' | trees2conllu', corpus, optimize=False)
+
+
+@pytest.mark.parametrize('change', CHANGES)
+def test_change_trees_only_at_root(corpus, change):
+    patt = parse_pattern(change)
+    expected = strs(changed_root(patt, t) for t in conllu2trees(corpus))
+    assert strs(map(Rewriter().add(patt, recursive=False), conllu2trees(corpus))) == expected
+
+
+def changed_to_fixpoint(patt: Pattern, tree: DepTree) -> DepTree:
+    "a tree changed with changed_subtrees until it stays the same"
+    previous = None
+    while (s := strs([tree])) != previous:
+        previous, tree = s, changed_subtrees(patt, tree)
+    return tree
+
+
+STEPS = {'change_subtrees': changed_subtrees, 'change_trees': changed_root,
+         'change_subtrees --fixpoint': changed_to_fixpoint}
+
+
+@pytest.mark.parametrize('change', CHANGES)
+def test_fixpoint_same_as_repeating(corpus, change):
+    patt = parse_pattern(change)
+    expected = strs(changed_to_fixpoint(patt, t) for t in conllu2trees(corpus))
+    assert strs(map(Rewriter().add(patt, fixpoint=True), conllu2trees(corpus))) == expected
+    assert run_command('change_subtrees --fixpoint ' + change, corpus) == expected
+
+
+def test_fixpoint_reaches_deeper_changes(trees):
+    # a head becomes VERB when some subtree is one, so one traversal only changes the lowest heads
+    patt = parse_pattern('IF (HAS_SUBTREE (POS VERB)) (POS * VERB)')
+    once = strs(map(Rewriter().add(patt), copy.deepcopy(trees)))
+    fixed = strs(map(Rewriter().add(patt, fixpoint=True), copy.deepcopy(trees)))
+    assert once != fixed
+
+
+@pytest.mark.parametrize('steps', [
+    CHANGES[:3], CHANGES[3:6], CHANGES[5:], ['POS NOUN N', 'IF (POS N) (FORM * NOUN)', 'PRUNE 2'],
+    ['IF (DEPREL nsubj) (FORM * X)', 'IF (FORM X) (LEMMA * Y)', 'IF (HAS_SUBTREE (LEMMA Y)) (POS * Z)'],
+    ])
+def test_steps_in_one_loop_same_as_in_sequence(corpus, steps):
+    kinds = list(STEPS)
+    command = ' | '.join(kinds[i % 3] + ' ' + step for i, step in enumerate(steps))
+    expected = []
+    for tree in conllu2trees(corpus):
+        for i, step in enumerate(steps):
+            tree = STEPS[kinds[i % 3]](parse_pattern(step), tree)
+        expected.extend(strs([tree]))
+    assert run_command(command, corpus) == expected
+    assert run_command(command, corpus, optimize=False) == expected
+
+
+def test_predicates_script(corpus):
+    lines = run_command('from_script predicates.oper', corpus)
+    assert lines and lines == run_command('from_script predicates.oper', corpus, optimize=False)
@@ -0,0 +1,70 @@
+# output in blocks, to files, and in the tsv, jsonl and bin formats
+
+import io
+import json
+import pytest
+from conftest import execute, run_command
+from operations import conllu2trees, trees2strs
+from patterns import ParseError
+from sinks import write_lines, write_bytes
+from treebin import encode_trees, decode_trees
+
+
+@pytest.mark.parametrize('block_size', [1, 10, 1 << 20])
+def test_write_lines(block_size):
+    lines = ['a', '', 'bcd', 3, 'efgh' * 5]
+    file = io.StringIO()
+    write_lines(lines, file, block_size)
+    assert file.getvalue() == 'a\n\nbcd\n3\n' + 'efgh' * 5 + '\n'
+
+
+@pytest.mark.parametrize('block_size', [1, 10, 1 << 20])
+def test_write_bytes(block_size):
+    file = io.BytesIO()
+    write_bytes([b'ab', b'', b'cdefg' * 4], file, block_size)
+    assert file.getvalue() == b'ab' + b'cdefg' * 4
+
+
+@pytest.mark.parametrize('block_size', [100, 1 << 20])
+def test_bin_round_trip(corpus, block_size):
+    data = b''.join(encode_trees(conllu2trees(corpus), block_size))
+    assert list(trees2strs(decode_trees(io.BytesIO(data)))) == list(trees2strs(conllu2trees(corpus)))
+
+
+def test_bin_output_file(corpus, tmp_path):
+    path = str(tmp_path / 'trees.bin')
+    execute(['--format', 'bin', '--output', path, 'match_trees (LENGTH >5)'], corpus)
+    with open(path, 'rb') as file:
+        assert list(trees2strs(decode_trees(file))) == run_command('match_trees (LENGTH >5)', corpus)
+
+
+def test_output_file_same_as_stdout(corpus, tmp_path):
+    path = tmp_path / 'out.conllu'
+    execute(['--output', str(path), 'trees2conllu'], corpus)
+    lines = path.read_text().split('\n')[:-1]
+    assert lines[1:] == execute(['trees2conllu'], corpus)
+
+
+def test_tsv(corpus):
+    stats = run_command('statistics POS DEPREL', corpus)
+    assert execute(['--format', 'tsv', 'statistics POS DEPREL'], corpus) == \
+        ['\t'.join([pos, deprel, str(count)]) for (pos, deprel), count in stats]
+    assert execute(['--format', 'tsv', 'count_trees'], corpus) == [str(run_command('count_trees', corpus)[0])]
+
+
+def test_jsonl(corpus):
+    stats = run_command('statistics POS DEPREL', corpus)
+    rows = [json.loads(line) for line in execute(['--format', 'jsonl', 'statistics POS DEPREL'], corpus)]
+    assert [(tuple(row['key']), row['count']) for row in rows] == stats
+    trees = [json.loads(line) for line in execute(['--format', 'jsonl', 'match_trees (LENGTH >5)'], corpus)]
+    assert len(trees) == len([line for line in run_command('match_trees (LENGTH >5)', corpus) if not line])
+    assert all(tree['comments'][0].startswith('# sent_id') for tree in trees)
+    words = [json.loads(line) for line in execute(['--format', 'jsonl', 'conllu2wordlines'], corpus)]
+    assert [w['FORM'] for w in words] == [line.split('\t')[1] for line in corpus if line[:1].isdigit()]
+
+
+def test_unknown_or_impossible_format(corpus):
+    with pytest.raises(ParseError):
+        execute(['--format', 'xml', 'trees2conllu'], corpus)
+    with pytest.raises(TypeError):
+        execute(['--format', 'bin', 'statistics POS'], corpus)
@@ -0,0 +1,56 @@
+# trees read from the cache of a file are the same as parsed from the file
+
+import os
+import pytest
+from conftest import execute
+from operations import conllu2trees, trees2strs
+from treecache import cache_path, valid_cache, cached_trees
+
+COMMANDS = ['trees2conllu', 'match_trees (LENGTH >5) | extract_sentences', 'treetype_statistics POS',
+            'change_subtrees (IF (DEPREL nsubj) (FORM * X)) | trees2conllu']
+
+
+@pytest.mark.parametrize('command', COMMANDS)
+def test_cached_same_as_parsed(corpus_file, command):
+    parsed = execute(['--input', corpus_file, command])
+    assert execute(['--cache', '--input', corpus_file, command]) == parsed
+    assert valid_cache(corpus_file)
+    assert execute(['--cache', '--input', corpus_file, command]) == parsed
+
+
+def test_cache_not_changed_by_later_stages(corpus_file):
+    original = execute(['--input', corpus_file, 'trees2conllu'])
+    execute(['--cache', '--input', corpus_file, 'change_subtrees (IF (DEPREL nsubj) (FORM * X)) | trees2conllu'])
+    assert execute(['--cache', '--input', corpus_file, 'trees2conllu']) == original
+
+
+def test_cache_invalid_after_change(corpus_file):
+    execute(['--cache', '--input', corpus_file, 'count_trees'])
+    with open(corpus_file, 'a') as file:
+        file.write('# sent_id = new\n1\tnew\tnew\tX\t_\t_\t0\troot\t_\t_\n\n')
+    assert not valid_cache(corpus_file)
+    assert execute(['--cache', '--input', corpus_file, 'extract_sentences'])[-1] == 'new'
+    assert execute(['--cache', '--input', corpus_file, 'extract_sentences'])[-1] == 'new'
+
+
+def test_no_cache_from_partial_read(corpus_file):
+    trees = cached_trees(corpus_file, conllu2trees)
+    next(trees)
+    trees.close()
+    assert not os.path.exists(cache_path(corpus_file))
+    assert [f for f in os.listdir(os.path.dirname(corpus_file)) if '.treecache' in f] == []
+
+
+def test_no_cache_from_failed_parse(tmp_path, timeout):
+    path = tmp_path / 'cycle.conllu'
+    path.write_text('1\ta\ta\tX\t_\t_\t0\troot\t_\t_\n1\tb\tb\tX\t_\t_\t1\tdep\t_\t_\n\n')
+    with pytest.raises(Exception):
+        list(cached_trees(str(path), conllu2trees))
+    assert not valid_cache(str(path))
+
+
+def test_cached_trees(corpus_file):
+    with open(corpus_file) as lines:
+        parsed = list(trees2strs(conllu2trees(lines)))
+    list(cached_trees(corpus_file, conllu2trees))
+    assert list(trees2strs(cached_trees(corpus_file, conllu2trees))) == parsed
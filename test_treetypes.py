@@ -0,0 +1,106 @@
+# tree types counted from tuple keys are the same as built from each subtree, and the
+# dictionary of tree types keeps its ids across corpora
+
+import json
+import pytest
+from conftest import IRREGULAR, execute, generated_corpus
+from operations import conllu2trees
+from treetypes import (TreeType, TreeTypeDictionary, deptree2treetype, deptree2treetypes,
+                       treetype_statistics_dict, head_dep_statistics_dict)
+from trees import comment_sent_id
+
+FIELDS = [['POS'], ['POS', 'DEPREL'], []]
+
+
+def subtrees(tree):
+    "a tree and all its subtrees in preorder"
+    yield tree
+    for t in tree.subtrees:
+        yield from subtrees(t)
+
+
+@pytest.fixture
+def trees(corpus):
+    return list(conllu2trees(corpus))
+
+
+@pytest.mark.parametrize('fields', FIELDS)
+def test_types_same_as_of_each_subtree(trees, fields):
+    for tree in trees:
+        assert deptree2treetypes(tree, fields) == [deptree2treetype(t, fields) for t in subtrees(tree)]
+
+
+@pytest.mark.parametrize('fields', FIELDS)
+def test_statistics_same_as_of_each_subtree(trees, fields):
+    expected = {}
+    for tree in trees:
+        for t in subtrees(tree):
+            key = deptree2treetype(t, fields)
+            expected[key] = expected.get(key, 0) + 1
+    assert list(treetype_statistics_dict(trees, fields).items()) == list(expected.items())
+
+
+def test_head_dep_statistics(trees):
+    expected = {}
+    for tree in trees:
+        for t in subtrees(tree):
+            for d in t.subtrees:
+                key = ((t.root.POS,), (d.root.POS,))
+                expected[key] = expected.get(key, 0) + 1
+    assert list(head_dep_statistics_dict(trees, ['POS']).items()) == list(expected.items())
+
+
+def test_dictionary_keeps_ids(tmp_path):
+    path = str(tmp_path / 'types.json')
+    first, second = generated_corpus(50, seed=1), generated_corpus(50, seed=2) + IRREGULAR
+    dictionary = TreeTypeDictionary.load(path, ['POS'])
+    counts = dictionary.add(conllu2trees(first))
+    dictionary.save(path)
+    ids = dict(dictionary.ids)
+    assert {dictionary.types()[i]: n for i, n in counts.items()} == \
+        treetype_statistics_dict(conllu2trees(first), ['POS'])
+
+    dictionary = TreeTypeDictionary.load(path, ['POS'])
+    assert dictionary.ids == ids
+    counts = dictionary.add(conllu2trees(second))
+    assert {key: i for key, i in dictionary.ids.items() if key in ids} == ids
+    assert sorted(dictionary.ids.values()) == list(range(len(dictionary.ids)))
+    assert {dictionary.types()[i]: n for i, n in counts.items()} == \
+        treetype_statistics_dict(conllu2trees(second), ['POS'])
+
+
+def test_dictionary_examples(tmp_path):
+    path = str(tmp_path / 'types.json')
+    trees = list(conllu2trees(generated_corpus(50)))
+    dictionary = TreeTypeDictionary(['POS'])
+    dictionary.add(trees)
+    for (head, deps), i in dictionary.ids.items():
+        examples = dictionary.examples[i]
+        assert 1 <= len(examples) <= 3 and len(set(examples)) == len(examples)
+        for example in examples:
+            tree = [t for t in trees if comment_sent_id(t.comments) == example][0]
+            assert TreeType(head, deps) in [deptree2treetype(t, ['POS']) for t in subtrees(tree)]
+
+
+def test_dictionary_other_fields(tmp_path):
+    path = str(tmp_path / 'types.json')
+    TreeTypeDictionary(['POS']).save(path)
+    with pytest.raises(ValueError):
+        TreeTypeDictionary.load(path, ['DEPREL'])
+
+
+def test_dictionary_command(tmp_path, corpus):
+    path = str(tmp_path / 'types.json')
+    lines = execute(['treetype_dictionary ' + path + ' POS'], corpus)
+    stats = execute(['treetype_statistics POS'], corpus)
+    assert len(lines) == len(stats)
+    with open(path) as file:
+        data = json.load(file)
+    assert data['fields'] == ['POS'] and len(data['types']) == len(lines)
+    assert execute(['treetype_dictionary ' + path + ' POS'], corpus) == lines
+
+
+def test_comment_sent_id():
+    assert comment_sent_id(['# text = a b', '# sent_id = s 1 ', '# sent_id = s2']) == 's 1'
+    assert comment_sent_id(['# sent_id=x=y']) == 'x=y'
+    assert comment_sent_id(['# text = a']) is None
@@ -0,0 +1,114 @@
+# validate gives each error of the input with its line and sent_id, the same when the input
+# file is checked in parts by processes, and --skip-invalid skips the stanzas with errors
+
+import pytest
+import validation
+from conftest import IRREGULAR, execute, generated_corpus
+from validation import ConlluError, conllu_errors, file_errors
+
+ORDER = IRREGULAR.index('# sent_id = order')
+UNREACHABLE = IRREGULAR.index('# sent_id = unreachable')
+VALID_IRREGULAR = IRREGULAR[:ORDER]   # with a multiword token and an empty node
+WORD = '\t'.join(['{}', 'w', 'w', 'X', '_', '_', '{}', 'dep', '_', '_'])
+
+
+def stanza(sent_id: str, *words) -> list[str]:
+    "a stanza of words given as ID and HEAD, or as a whole line"
+    return (['# sent_id = ' + sent_id] +
+            [w if isinstance(w, str) else WORD.format(*w) for w in words] + [''])
+
+
+# stanzas with errors, and the line of each error in the stanza, counting the sent_id as line 1
+INVALID = [
+    (stanza('fields', (1, 0), '2\tw\tw\tX\t_\t_\t1\tdep'), [(3, '8 fields instead of 10')]),
+    (stanza('gap', (1, 0), (3, 1)), [(3, 'ID 3 after 1')]),
+    (stanza('twice', (1, 0), (2, 1), (2, 1)), [(4, 'ID 2 after 2')]),
+    (stanza('badid', (1, 0), ('x', 1)), [(3, 'ID x is not a word, a range or an empty node')]),
+    (stanza('range', (1, 0), ('3-4', '_'), (2, 1)), [(3, 'range 3-4 does not begin at the next word 2')]),
+    (stanza('rangeend', ('1-3', '_'), (1, 0), (2, 1)), [(2, 'range 1-3 ends after the last word 2')]),
+    (stanza('rangehead', ('1-2', 1), (1, 0), (2, 1)), [(2, 'HEAD of range 1-2 is 1 instead of _')]),
+    (stanza('empty', (1, 0), ('1.2', '_'), (2, 1)), [(3, 'empty node 1.2 after 1.0')]),
+    (stanza('emptyhead', (1, 0), ('1.1', 1), (2, 1)), [(3, 'HEAD of empty node 1.1 is 1 instead of _')]),
+    (stanza('head', (1, 0), (2, 5)), [(3, 'HEAD 5 of word 2 is not 0 or the ID of a word')]),
+    (stanza('own', (1, 0), (2, 2)), [(3, 'word 2 is its own head')]),
+    (stanza('noroot', (1, 2), (2, 1)), [(1, 'no root'), (2, 'cycle of words 1 2')]),
+    (stanza('roots', (1, 0), (2, 0)), [(3, 'another root after word 1')]),
+    (stanza('cycle', (1, 0), (2, 3), (3, 4), (4, 2)), [(3, 'cycle of words 2 3 4')]),
+    (['# sent_id = nowords', '# text = nothing', ''], [(1, 'no words')]),
+    (IRREGULAR[ORDER:UNREACHABLE], [(2, 'ID 2 after 0'), (3, 'ID 1 after 2'), (4, 'ID 3 after 1')]),
+    (IRREGULAR[UNREACHABLE:], [(4, 'cycle of words 3 4')]),
+    ]
+
+
+def corpus_with_errors() -> tuple[list[str], list[ConlluError]]:
+    "valid stanzas with the invalid ones among them, and the errors in the order of the lines"
+    lines, errors = [], []
+    for k, (lines_, errs) in enumerate(INVALID):
+        lines += generated_corpus(7, seed=k)
+        sent_id = lines_[0][len('# sent_id = '):]
+        errors += [ConlluError(len(lines) + n, sent_id, message) for n, message in errs]
+        lines += lines_
+    return lines + VALID_IRREGULAR, errors
+
+
+def test_valid_corpus():
+    assert list(conllu_errors(generated_corpus(200) + VALID_IRREGULAR)) == []
+
+
+@pytest.mark.parametrize('lines, errors', INVALID)
+def test_errors_of_stanza(lines, errors):
+    sent_id = lines[0][len('# sent_id = '):]
+    assert list(conllu_errors(lines)) == [ConlluError(n, sent_id, message) for n, message in errors]
+
+
+def test_last_stanza_not_ended():
+    lines = generated_corpus(3)[:-1]
+    assert list(conllu_errors(lines)) == [ConlluError(len(lines), 's2', 'no empty line after the last sentence')]
+
+
+def test_errors_in_corpus():
+    lines, errors = corpus_with_errors()
+    assert list(conllu_errors(lines)) == errors
+
+
+@pytest.fixture
+def invalid_file(tmp_path) -> str:
+    path = str(tmp_path / 'invalid.conllu')
+    with open(path, 'w') as file:
+        file.write(''.join(line + '\n' for line in corpus_with_errors()[0]))
+    return path
+
+
+@pytest.mark.parametrize('processes', [1, 3])
+@pytest.mark.parametrize('part_bytes', [1 << 26, 1000, 1])
+def test_file_in_parts(invalid_file, monkeypatch, processes, part_bytes):
+    monkeypatch.setattr(validation, 'PART_BYTES', part_bytes)
+    assert list(file_errors(invalid_file, processes)) == corpus_with_errors()[1]
+
+
+def test_validate_command(invalid_file):
+    lines, errors = corpus_with_errors()
+    expected = [invalid_file + ':' + str(e.line) + ': ' + e.sent_id + ': ' + e.message for e in errors]
+    assert execute(['--input', invalid_file, '--processes', '2', 'validate']) == expected
+    assert execute(['validate'], lines) == [line.replace(invalid_file, '<stdin>', 1) for line in expected]
+
+
+def test_skip_invalid(invalid_file, capsys):
+    lines, errors = corpus_with_errors()
+    valid = [line for k in range(len(INVALID)) for line in generated_corpus(7, seed=k)] + VALID_IRREGULAR
+    for command in ['extract_sentences', 'match_trees (LENGTH >5) | count_trees', 'treetype_statistics POS']:
+        assert execute(['--skip-invalid', command], lines) == execute([command], valid)
+        assert execute(['--skip-invalid', '--input', invalid_file, command]) == execute([command], valid)
+    # each stanza with errors is reported in each run, with its first error
+    first = {}
+    for e in errors:
+        first.setdefault(e.sent_id, e)
+    expected = [':'.join([source, str(e.line), ' ' + e.sent_id, ' ' + e.message, ' stanza skipped'])
+                for source in ['<stdin>', invalid_file] for e in first.values()] * 3
+    assert capsys.readouterr().err.splitlines() == expected
+
+
+def test_invalid_fails_without_skip():
+    lines, _ = corpus_with_errors()
+    with pytest.raises(Exception):
+        execute(['extract_sentences'], lines)
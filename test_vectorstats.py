@@ -0,0 +1,61 @@
+# the integer-coded numpy frequency tables are the same as the ones counted in plain Python
+
+import numpy as np
+import pytest
+import vectorstats
+from conftest import run_command
+from operations import conllu2wordlines, conllu2stanzas
+from trees import wordline_statistics, wordline_ngram_statistics, wordline_ngrams, WORDLINE_FIELD_INDEX
+from vectorstats import (coded_wordline_statistics, coded_column_statistics, coded_ngram_statistics,
+                         ngram_starts)
+
+FIELDS = [['POS'], ['POS', 'DEPREL'], ['FORM', 'FEATS', 'HEAD'], ['ID', 'LEMMA']]
+
+
+@pytest.fixture
+def wordlines(corpus):
+    return list(conllu2wordlines(corpus))
+
+
+@pytest.fixture
+def stanzas(corpus):
+    return [nodes for _, nodes in conllu2stanzas(corpus)]
+
+
+@pytest.mark.parametrize('fields', FIELDS)
+@pytest.mark.parametrize('batch_size', [7, vectorstats.BATCH_SIZE])
+def test_wordline_statistics(wordlines, fields, batch_size):
+    assert list(coded_wordline_statistics(fields, wordlines, batch_size).items()) == \
+        list(wordline_statistics(fields, wordlines).items())
+
+
+@pytest.mark.parametrize('fields', FIELDS)
+def test_column_statistics(corpus, wordlines, fields):
+    rows = [line.split('\t') for line in corpus if line[:1].isdigit()]
+    indices = [WORDLINE_FIELD_INDEX[f] for f in fields]
+    assert coded_column_statistics(indices, rows, 11) == wordline_statistics(fields, wordlines)
+
+
+@pytest.mark.parametrize('fields', FIELDS)
+@pytest.mark.parametrize('n', [1, 2, 3])
+@pytest.mark.parametrize('batch_size', [5, vectorstats.BATCH_SIZE])
+def test_ngram_statistics(stanzas, fields, n, batch_size):
+    assert list(coded_ngram_statistics(n, fields, stanzas, batch_size).items()) == \
+        list(wordline_ngram_statistics(fields, wordline_ngrams(n, stanzas)).items())
+
+
+def test_keys_too_large_for_int64(monkeypatch, wordlines, stanzas):
+    monkeypatch.setattr(vectorstats, 'MAX_KEY', 2)
+    fields = ['FORM', 'POS', 'DEPREL']
+    assert coded_wordline_statistics(fields, wordlines) == wordline_statistics(fields, wordlines)
+    assert coded_ngram_statistics(2, fields, stanzas) == \
+        wordline_ngram_statistics(fields, wordline_ngrams(2, stanzas))
+
+
+def test_ngram_starts():
+    assert ngram_starts(np.array([4, 1, 3]), 2).tolist() == [0, 1, 5]
+
+
+def test_statistics_command(corpus, wordlines):
+    assert run_command('conllu2wordlines | statistics POS', corpus) == \
+        sorted(wordline_statistics(['POS'], wordlines).items(), key=lambda it: -it[1])
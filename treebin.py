@@ -0,0 +1,146 @@
+# a compact binary format for streams of deptrees
+#
+# The stream starts with MAGIC and consists of blocks, each a length-prefixed pickle of
+# new strings and two compressed integer arrays, shapes and codes. Strings are coded by
+# their position in a table that grows block by block. For each tree, the shapes are
+#   number of comments, number of nodes, and for each node in preorder, twice its number
+#   of subtrees, plus 1 if it is marked as a match
+# and the codes are
+#   comments, and for each node in preorder, its 10 fields.
+# This keeps the exact tree structure, which may differ from the HEAD fields after changes,
+# and the marks of match_found_in_tree without writing them into MISC.
+
+import pickle
+import struct
+import zlib
+from array import array
+from typing import Iterable, BinaryIO
+from trees import *
+
+MAGIC = b'DEPTREEPY-TREES-1\n'
+BLOCK_SIZE = 1000   # trees per block
+
+
+class StringTable:
+    "codes for strings, assigned in order of first occurrence"
+
+    def __init__(self):
+        self.codes = {}
+        self.new = []
+
+    def code(self, s: str) -> int:
+        if (c := self.codes.get(s)) is None:
+            c = self.codes[s] = len(self.codes)
+            self.new.append(s)
+        return c
+
+    def take_new(self) -> list[str]:
+        "the strings coded since the last call"
+        new, self.new = self.new, []
+        return new
+
+
+def tree_integers(tree: DepTree, table: StringTable, shapes: array, codes: array):
+    shapes.append(len(tree.comments))
+    shapes.append(len(tree))
+    codes.extend(table.code(c) for c in tree.comments)
+    stack = [tree]
+    while stack:
+        t = stack.pop()
+        shapes.append(len(t.subtrees) << 1 | t.matched)
+        codes.extend(table.code(v) for v in t.root.as_dict().values())
+        stack.extend(reversed(t.subtrees))
+
+
+class TreeEncoder:
+    "encoding trees one by one, giving a block of bytes after every block_size trees"
+
+    def __init__(self, block_size: int=BLOCK_SIZE):
+        self.block_size = block_size
+        self.table = StringTable()
+        self.shapes = array('q')
+        self.codes = array('q')
+        self.n = 0
+
+    def add(self, tree: DepTree) -> bytes:
+        "encode a tree, return a block if it is full, otherwise None"
+        tree_integers(tree, self.table, self.shapes, self.codes)
+        self.n += 1
+        if self.n >= self.block_size:
+            return self.flush()
+
+    def flush(self) -> bytes:
+        "the block of the trees encoded since the last block, empty if there are none"
+        if not self.n:
+            return b''
+        data = pickle.dumps((self.table.take_new(), compress_ints(self.shapes), compress_ints(self.codes)),
+                            pickle.HIGHEST_PROTOCOL)
+        self.shapes = array('q')
+        self.codes = array('q')
+        self.n = 0
+        return struct.pack('<Q', len(data)) + data
+
+
+def encode_trees(trees: Iterable[DepTree], block_size: int=BLOCK_SIZE) -> Iterable[bytes]:
+    "the binary format as a stream of byte strings, beginning with MAGIC"
+    yield MAGIC
+    encoder = TreeEncoder(block_size)
+    for tree in trees:
+        if block := encoder.add(tree):
+            yield block
+    yield encoder.flush()
+
+
+def compress_ints(ints: array) -> tuple[str, bytes]:
+    "integers stored in the smallest of 1, 2, 4, 8 bytes that fits them all, compressed"
+    top = max(ints, default=0)
+    typecode = next(tc for tc in 'BHIQ' if top < 1 << (8 * array(tc).itemsize))
+    return typecode, zlib.compress(array(typecode, ints).tobytes(), 1)
+
+
+def decompress_ints(typecode: str, data: bytes) -> list[int]:
+    ints = array(typecode)
+    ints.frombytes(zlib.decompress(data))
+    return ints.tolist()
+
+
+def decode_trees(file: BinaryIO) -> Iterable[DepTree]:
+    "read trees written by encode_trees from a binary file"
+    if file.read(len(MAGIC)) != MAGIC:
+        raise ValueError('not a binary tree stream')
+    strings = []
+    while header := file.read(8):
+        new, shapes, codes = pickle.loads(file.read(struct.unpack('<Q', header)[0]))
+        strings.extend(new)
+        shapes = decompress_ints(*shapes)
+        values = list(map(strings.__getitem__, decompress_ints(*codes)))
+        i = j = 0
+        while i < len(shapes):
+            tree, i, j = decode_tree(shapes, values, i, j)
+            yield tree
+
+
+def decode_tree(shapes: list[int], values: list[str], i: int, j: int) -> tuple[DepTree, int, int]:
+    "decode the tree starting at positions i and j, return it and the positions after it"
+    ncomments, nnodes = shapes[i], shapes[i+1]
+    i += 2
+    comments = values[j:j+ncomments]
+    j += ncomments
+    nodes = []   # (tree, number of subtrees still to attach)
+    root = None
+    for shape in shapes[i:i+nnodes]:
+        nsubtrees = shape >> 1
+        t = DepTree(WordLine(*values[j:j+10]), [], [], bool(shape & 1))
+        j += 10
+        if nodes:
+            parent = nodes[-1]
+            parent[0].subtrees.append(t)
+            parent[1] -= 1
+            if not parent[1]:
+                nodes.pop()
+        else:
+            root = t
+        if nsubtrees:
+            nodes.append([t, nsubtrees])
+    root.comments = comments
+    return root, i + nnodes, j
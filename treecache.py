@@ -0,0 +1,73 @@
+# a cache of parsed trees next to a CoNLL-U file, valid as long as the file has the same size
+# and modification time, like .pyc files for Python sources
+
+import os
+import struct
+from typing import Iterable, Callable
+from trees import *
+from treebin import MAGIC, TreeEncoder, decode_trees
+
+CACHE_SUFFIX = '.treecache'
+CACHE_MAGIC = b'DEPTREEPY-CACHE-1\n'
+
+
+def cache_path(path: str) -> str:
+    return path + CACHE_SUFFIX
+
+
+def source_stamp(path: str) -> bytes:
+    "the size and modification time of a file, as stored in the cache"
+    st = os.stat(path)
+    return struct.pack('<QQ', st.st_size, st.st_mtime_ns)
+
+
+def valid_cache(path: str) -> bool:
+    "if the cache of a file exists and was made from the current version of the file"
+    try:
+        with open(cache_path(path), 'rb') as file:
+            header = file.read(len(CACHE_MAGIC) + 16)
+    except OSError:
+        return False
+    return header == CACHE_MAGIC + source_stamp(path)
+
+
+def read_cached_trees(path: str) -> Iterable[DepTree]:
+    with open(cache_path(path), 'rb') as file:
+        file.seek(len(CACHE_MAGIC) + 16)
+        for tree in decode_trees(file):
+            yield tree
+
+
+def caching_trees(path: str, trees: Iterable[DepTree]) -> Iterable[DepTree]:
+    """
+    pass on the trees parsed from a file, writing them into its cache before later stages can
+    change them; the cache is only put in place if all trees were parsed
+    """
+    stamp = source_stamp(path)
+    temp = cache_path(path) + '.' + str(os.getpid())
+    encoder = TreeEncoder()
+    try:
+        with open(temp, 'wb') as file:
+            file.write(CACHE_MAGIC + stamp + MAGIC)
+            for tree in trees:
+                file.write(encoder.add(tree) or b'')
+                yield tree
+            file.write(encoder.flush())
+        if source_stamp(path) == stamp:  # the file did not change while it was read
+            os.replace(temp, cache_path(path))
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+
+
+def parsed_trees(path: str, parse: Callable) -> Iterable[DepTree]:
+    with open(path) as lines:
+        for tree in parse(lines):
+            yield tree
+
+
+def cached_trees(path: str, parse: Callable) -> Iterable[DepTree]:
+    "the trees of a CoNLL-U file, from its cache if valid, otherwise parsed and cached"
+    if valid_cache(path):
+        return read_cached_trees(path)
+    return caching_trees(path, parsed_trees(path, parse))
@@ -1,5 +1,7 @@
 import sys
 from dataclasses import dataclass
+from functools import lru_cache
+from types import MappingProxyType
 from typing import Iterable
 
 @dataclass
@@ -27,12 +29,24 @@ class WordLine:
     def __str__(self):
         return '\t'.join(self.as_dict().values())
 
-    def feats(self) -> dict:
-        featvals = [fv.split('=') for fv in self.FEATS.split('|')]
-        return {fv[0]: fv[1] for fv in featvals}
+    def feats(self) -> MappingProxyType:
+        return parse_feats(self.FEATS)
+
+
+@lru_cache(maxsize=None)
+def parse_feats(feats: str) -> MappingProxyType:
+    "the features of a FEATS string as a read-only dict, shared by all wordlines with the same string"
+    if feats == '_':
+        return MappingProxyType({})
+    featvals = [fv.partition('=') for fv in feats.split('|')]
+    return MappingProxyType({fv[0]: fv[2] for fv in featvals})
+
 
 WORDLINE_FIELDS = set('ID FORM LEMMA POS XPOS FEATS HEAD DEPREL DEPS MISC'.split())
 
+# the position of each field in a CoNLL-U line
+WORDLINE_FIELD_INDEX = {field: i for i, field in enumerate(WordLine.__dataclass_fields__)}
+
 ROOT_LABEL = 'root'
 
 def ifint(id: str) ->int:
@@ -92,6 +106,26 @@ def replace_by_underscores(fields, wordline):
     return WordLine(**ldict)
 
     
+def comment_sent_id(comments: Iterable[str]) -> str:
+    "the sent_id given in comments, None if there is none"
+    for comment in comments:
+        if comment.startswith('# sent_id'):
+            return comment.split('=', 1)[-1].strip()
+    return None
+
+
+def wordline_keys(fields, wordlines):
+    "the combination of fields in each wordline, as tuples"
+    for word in wordlines:
+        yield tuple(getattr(word, field) for field in fields)
+
+
+def wordline_ngram_keys(fields, wordlinengrams):
+    "the combination of fields in each wordline of each n-gram, as tuples of tuples"
+    for ngram in wordlinengrams:
+        yield tuple(tuple(getattr(word, field) for field in fields) for word in ngram)
+
+
 def wordline_statistics(fields, wordlines):
     "frequency table of a combination of fields, as dictionary"
     stats = {}
@@ -163,6 +197,7 @@ def prune_subtrees_below(tree: Tree, depth: int) -> Tree:
 class DepTree(Tree):
     "depencency trees: rose trees with word lines as nodes"
     comments: list[str]
+    matched: bool = False   # marked by match_found_in_tree, written into MISC by mark_matches
     
     def __str__(self):
         lines = self.comments
@@ -187,6 +222,27 @@ class DepTree(Tree):
         
 
     
+MATCH_MARK = '+MATCH'
+
+
+def marked_misc(tree: DepTree) -> str:
+    "the MISC of the root, ending with MATCH_MARK if the tree is marked as a match"
+    misc = tree.root.MISC
+    return misc + MATCH_MARK if tree.matched and not misc.endswith(MATCH_MARK) else misc
+
+
+def mark_matches(tree: DepTree) -> DepTree:
+    "write the marks of matching subtrees into their MISC, when the tree is written out"
+    stack = [tree]
+    while stack:
+        t = stack.pop()
+        if t.matched:
+            t.root.MISC = marked_misc(t)
+            t.matched = False
+        stack.extend(t.subtrees)
+    return tree
+
+
 def build_deptree(ns: list[WordLine]) -> DepTree:
     "build a dependency tree from a list of word lines"
     def build_subtree(ns, root):
@@ -225,6 +281,48 @@ def relabel_deptree(tree: DepTree) -> DepTree:
     return r
 
 
+def repeated_ids(ns: list[WordLine]) -> bool:
+    "if some ID is repeated, in which case the tree must be built by build_deptree, which fails on cycles"
+    return len({n.ID for n in ns}) < len(ns)
+
+
+def stanza_wordlines(ns: list[WordLine]) -> list[WordLine]:
+    "the wordlines of build_deptree(ns) in the order of DepTree.wordlines, without building the tree"
+    roots = [n for n in ns if n.HEAD == '0']
+    if not roots:
+        raise NotValidTree(str(ns))
+    if repeated_ids(ns):
+        return build_deptree(ns).wordlines()
+    children = {}
+    for n in ns:
+        children.setdefault(n.HEAD, []).append(n)
+    words = []
+    stack = [roots[0]]
+    while stack:
+        n = stack.pop()
+        words.append(n)
+        stack.extend(reversed(children.get(n.ID, [])))
+    words.sort(key=lambda w: ifint(w.ID))
+    return words
+
+
+def relabel_wordlines(ns: list[WordLine]) -> list[WordLine]:
+    "the same as relabel_deptree(build_deptree(ns)).wordlines(), without building the tree"
+    if repeated_ids(ns):
+        return relabel_deptree(build_deptree(ns)).wordlines()
+    words = stanza_wordlines(ns)
+    root = [n for n in ns if n.HEAD == '0'][0]
+    root.MISC = root.MISC + '('+root.DEPREL+')'
+    root.DEPREL = 'root'
+    numbers = {w.ID:  str(i) for w, i in zip(words, range(1, len(words) + 1))}
+    numbers[root.HEAD] = '0'
+    for w in words:
+        if w.ID.isdigit():
+            w.ID = numbers[w.ID]
+        w.HEAD = numbers[w.HEAD]
+    return words
+
+
 def nonprojective(tree: DepTree) -> bool:
     "if a subtree is not projective, i.e. does not span over a continuous sequence"
     ids = [int(w.ID) for w in tree.wordlines() if w.ID.isdigit()]
@@ -1,64 +1,135 @@
+import json
+import os
 from dataclasses import dataclass
 from typing import Iterable
 
 from trees import *
+from counting import count_keys
 
-@dataclass
+@dataclass(frozen=True)
 class TreeType:
     "the 'type' of a deptree: (POS, DEPREL)[(POS, DEPREL)*] of head and dependents"
     head: tuple[str]
-    deps: list[tuple[str]]   # POS, DEPREL
+    deps: tuple[tuple[str]]   # POS, DEPREL
+
 
-    
     def __str__(self):
-        return str(self.head) + str(self.deps)
+        return str(self.head) + str(list(self.deps))
 
-    def __hash__(self):
-        return self.__str__().__hash__()
+    def __repr__(self):
+        return 'TreeType(head=' + repr(self.head) + ', deps=' + repr(list(self.deps)) + ')'
 
 
 def deptree2treetype(tree: DepTree, fields: list[str]) -> TreeType:
 #    if fs := [f not in WORDLINE_FIELDS for f in fields]:
  #       raise TypeError('invalid fields ' + str(fs))
     head = tuple(tree.root.as_dict()[f] for f in fields)
-    deps = [tuple(t.root.as_dict()[f] for f in fields) for t in tree.subtrees]
+    deps = tuple(tuple(t.root.as_dict()[f] for f in fields) for t in tree.subtrees)
     return TreeType(head, deps)
 
 
 def deptree2treetypes(tree: DepTree, fields: list[str]) -> list[TreeType]:
-    typs = [deptree2treetype(tree, fields)]
-    for t in tree.subtrees:
-        for typ in deptree2treetypes(t, fields):
-            typs.append(typ)
-    return typs
+    return [TreeType(head, deps) for head, deps in type_keys(tree, fields)]
 
 
-def treetype_statistics_dict(trees: Iterable[DepTree], fields: list[str]) -> dict[TreeType, int]:
-    dict = {}
-    for tree in trees:
-        for typ in deptree2treetypes(tree, fields):
-            if typ in dict:
-                dict[typ] += 1
-            else:
-                dict[typ] = 1
+def type_keys(tree: DepTree, fields: list[str]) -> Iterable[tuple[tuple[str], tuple[tuple[str]]]]:
+    """
+    the types of a tree and its subtrees in preorder, as (head, deps) tuples,
+    reading the fields of each node once
+    """
+    def values(t):
+        return tuple(getattr(t.root, f) for f in fields)
 
-    return dict
+    stack = [(tree, values(tree))]
+    while stack:
+        t, head = stack.pop()
+        deps = tuple(map(values, t.subtrees))
+        yield head, deps
+        stack.extend(reversed(list(zip(t.subtrees, deps))))
 
 
-def head_dep_statistics_dict(trees: Iterable[DepTree], fields: list[str]) -> dict[tuple[tuple[str], tuple[str]], int]:
-    dict = {}
+def treetype_keys(trees: Iterable[DepTree], fields: list[str]) -> Iterable[TreeType]:
+    "the types of all trees and their subtrees"
     for tree in trees:
-        for typ in deptree2treetypes(tree, fields):
-            for item in typ.deps:
-                dtyp = (typ.head, item)
-                if dtyp in dict:
-                    dict[dtyp] += 1
-                else:
-                    dict[dtyp] = 1
+        for head, deps in type_keys(tree, fields):
+            yield TreeType(head, deps)
 
-    return dict
 
+def head_dep_keys(trees: Iterable[DepTree], fields: list[str]) -> Iterable[tuple[tuple[str], tuple[str]]]:
+    "the head-dependent pairs of all trees and their subtrees"
+    for tree in trees:
+        for head, deps in type_keys(tree, fields):
+            for dep in deps:
+                yield (head, dep)
 
 
+def treetype_statistics_dict(trees: Iterable[DepTree], fields: list[str]) -> dict[TreeType, int]:
+    "counted with tuples as keys, making one TreeType for each distinct type"
+    counts = count_keys(key for tree in trees for key in type_keys(tree, fields))
+    return {TreeType(head, deps): n for (head, deps), n in counts.items()}
 
 
+def head_dep_statistics_dict(trees: Iterable[DepTree], fields: list[str]) -> dict[tuple[tuple[str], tuple[str]], int]:
+    return count_keys(head_dep_keys(trees, fields))
+
+
+# a persistent dictionary of tree types: each type gets an integer id, which it keeps when
+# the dictionary is updated with other corpora, and the sent_ids of some example sentences
+
+MAX_EXAMPLES = 3
+
+
+def sent_id(tree: DepTree, number: int) -> str:
+    "the sent_id of a tree from its comments, or its number in the input"
+    id = comment_sent_id(tree.comments)
+    return str(number) if id is None else id
+
+
+class TreeTypeDictionary:
+    "tree types of given fields with ids and examples, stored in a JSON file"
+
+    def __init__(self, fields: list[str]):
+        self.fields = fields
+        self.ids = {}        # (head, deps): id
+        self.examples = {}   # id: sent_ids
+
+    @classmethod
+    def load(cls, path: str, fields: list[str]):
+        "the dictionary in the file, or a new one if the file does not exist"
+        dictionary = cls(fields)
+        if os.path.exists(path):
+            with open(path) as file:
+                data = json.load(file)
+            if data['fields'] != fields:
+                raise ValueError('the dictionary ' + path + ' has fields ' + ' '.join(data['fields']))
+            for entry in data['types']:
+                key = tuple(entry['head']), tuple(map(tuple, entry['deps']))
+                dictionary.ids[key] = entry['id']
+                dictionary.examples[entry['id']] = entry['examples']
+        return dictionary
+
+    def save(self, path: str):
+        types = [{'id': i, 'head': head, 'deps': deps, 'examples': self.examples[i]}
+                     for (head, deps), i in self.ids.items()]
+        with open(path + '.tmp', 'w') as file:
+            json.dump({'fields': self.fields, 'types': types}, file, ensure_ascii=False)
+        os.replace(path + '.tmp', path)
+
+    def add(self, trees: Iterable[DepTree]) -> dict[int, int]:
+        "add the types of trees, return the number of occurrences of each type id in them"
+        counts = {}
+        for number, tree in enumerate(trees):
+            example = None
+            for key in type_keys(tree, self.fields):
+                if (i := self.ids.get(key)) is None:
+                    i = self.ids[key] = len(self.ids)
+                    self.examples[i] = []
+                counts[i] = counts.get(i, 0) + 1
+                if len(examples := self.examples[i]) < MAX_EXAMPLES:
+                    example = example or sent_id(tree, number)
+                    if example not in examples:
+                        examples.append(example)
+        return counts
+
+    def types(self) -> dict[int, TreeType]:
+        return {i: TreeType(head, deps) for (head, deps), i in self.ids.items()}
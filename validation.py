@@ -0,0 +1,203 @@
+# validation of CoNLL-U input: the fields and IDs of each stanza, its multiword token ranges
+# and empty nodes, and if its HEADs make a tree with one root and no cycles
+#
+# Each error is reported with its line number and the sent_id of its stanza. A file can be
+# checked in parts by several processes: the parts are byte ranges that begin after an
+# empty line, read by each process itself, and their errors are given in the order of the file.
+
+import multiprocessing
+import os
+from dataclasses import dataclass
+from functools import partial
+from typing import Iterable
+from trees import comment_sent_id
+
+PART_BYTES = 1 << 26   # the largest part of a file checked by one process at a time
+PARTS_PER_PROCESS = 4
+
+
+@dataclass
+class ConlluError:
+    line: int
+    sent_id: str
+    message: str
+
+
+def error_message(source: str, error: ConlluError) -> str:
+    "an error as file:line: sent_id: message"
+    return ':'.join([source, str(error.line), ' ' + error.sent_id, ' ' + error.message])
+
+
+def numbered_stanzas(lines: Iterable[str], first: int=1) -> Iterable[tuple[list[tuple[int, str]], bool]]:
+    """
+    the lines of each stanza with their line numbers, starting from first, and if the stanza
+    was ended by an empty line; the last stanza is given even if it is not ended
+    """
+    stanza = []
+    for number, line in enumerate(lines, first):
+        if line.strip():
+            stanza.append((number, line.rstrip('\r\n')))
+        elif stanza:
+            yield stanza, True
+            stanza = []
+    if stanza:
+        yield stanza, False
+
+
+def stanza_sent_id(stanza: list[tuple[int, str]]) -> str:
+    "the sent_id in the comments of a stanza, _ if none"
+    id = comment_sent_id(line for _, line in stanza)
+    return '_' if id is None else id
+
+
+def stanza_errors(stanza: list[tuple[int, str]]) -> list[ConlluError]:
+    "the errors in the lines of a stanza, in the order of the lines"
+    sent_id = stanza_sent_id(stanza)
+    errors = []
+
+    def error(number, message):
+        errors.append(ConlluError(number, sent_id, message))
+
+    heads = {}       # ID of each word: its line number and HEAD
+    ranges = []      # line number and end of each multiword token range
+    last, empty, range_end = 0, 0, 0
+    unread = False   # if some word line could not be read, in which case the tree is not checked
+    for number, line in stanza:
+        if line.startswith('#'):
+            continue
+        fields = line.split('\t')
+        if len(fields) != 10:
+            error(number, str(len(fields)) + ' fields instead of 10')
+            unread = True
+            last = int(fields[0]) if fields[0].isdigit() else last
+            continue
+        id, head = fields[0], fields[6]
+        if id.isdigit():
+            if int(id) != last + 1:
+                error(number, 'ID ' + id + ' after ' + str(last))
+            last, empty = int(id), 0
+            heads[id] = number, head
+        elif '-' in id:
+            begin, _, end = id.partition('-')
+            if not (begin.isdigit() and end.isdigit()):
+                error(number, 'ID ' + id + ' is not a word, a range or an empty node')
+            elif int(begin) != last + 1:
+                error(number, 'range ' + id + ' does not begin at the next word ' + str(last + 1))
+            elif int(end) <= int(begin):
+                error(number, 'range ' + id + ' does not end after its beginning')
+            elif int(begin) <= range_end:
+                error(number, 'range ' + id + ' overlaps the range before it')
+            else:
+                range_end = int(end)
+                ranges.append((number, id, range_end))
+            if head != '_':
+                error(number, 'HEAD of range ' + id + ' is ' + head + ' instead of _')
+        elif '.' in id:
+            word, _, k = id.partition('.')
+            if not (word.isdigit() and k.isdigit()):
+                error(number, 'ID ' + id + ' is not a word, a range or an empty node')
+            elif int(word) != last:
+                error(number, 'empty node ' + id + ' after word ' + str(last))
+            elif int(k) != empty + 1:
+                error(number, 'empty node ' + id + ' after ' + word + '.' + str(empty))
+            else:
+                empty = int(k)
+            if head != '_':
+                error(number, 'HEAD of empty node ' + id + ' is ' + head + ' instead of _')
+        else:
+            error(number, 'ID ' + id + ' is not a word, a range or an empty node')
+            unread = True
+
+    for number, id, end in ranges:
+        if end > last:
+            error(number, 'range ' + id + ' ends after the last word ' + str(last))
+    if unread:
+        return errors
+    if not heads:
+        error(stanza[0][0], 'no words')
+        return errors
+
+    roots = []   # line number and ID of each root
+    for id, (number, head) in heads.items():
+        if head == '0':
+            roots.append((number, id))
+        elif head == id:
+            error(number, 'word ' + id + ' is its own head')
+        elif head not in heads:
+            error(number, 'HEAD ' + head + ' of word ' + id + ' is not 0 or the ID of a word')
+    if not roots:
+        error(stanza[0][0], 'no root')
+    for number, _ in roots[1:]:
+        error(number, 'another root after word ' + roots[0][1])
+
+    # follow the heads from each word, until a word known to reach the root or not, or a cycle
+    reaches = {'0': True}
+    for id in heads:
+        path = []
+        while id not in reaches:
+            reaches[id] = None   # on the path being followed
+            path.append(id)
+            id = heads[id][1] if heads[id][1] in heads else '0'
+        if reaches[id] is None and (cycle := path[path.index(id):])[1:]:   # one word is its own head
+            error(heads[cycle[0]][0], 'cycle of words ' + ' '.join(cycle))
+        for p in path:
+            reaches[p] = reaches[id] is True
+    errors.sort(key=lambda e: e.line)
+    return errors
+
+
+def conllu_errors(lines: Iterable[str], first: int=1) -> Iterable[ConlluError]:
+    "the errors in CoNLL-U lines, numbered from first"
+    for stanza, terminated in numbered_stanzas(lines, first):
+        yield from stanza_errors(stanza)
+        if not terminated:
+            yield ConlluError(stanza[-1][0], stanza_sent_id(stanza), 'no empty line after the last sentence')
+
+
+def file_parts(path: str, parts: int) -> list[tuple[int, int]]:
+    "byte ranges of a file, about as many as parts, each beginning at a stanza"
+    size = os.path.getsize(path)
+    begins = [0]
+    with open(path, 'rb') as file:
+        for k in range(1, parts):
+            file.seek(max(size * k // parts, begins[-1]))
+            file.readline()   # the rest of the line, which may begin before
+            while line := file.readline():
+                if not line.strip():
+                    break
+            if begins[-1] < file.tell() < size:
+                begins.append(file.tell())
+    return list(zip(begins, begins[1:] + [size]))
+
+
+def part_errors(part: tuple[int, int], path: str) -> tuple[int, list[ConlluError]]:
+    "the number of lines in a part of a file and their errors, with line numbers in the part"
+    begin, end = part
+    with open(path, 'rb') as file:
+        file.seek(begin)
+        text = file.read(end - begin).decode('utf-8', errors='replace')
+    lines = text.split('\n')
+    if not lines[-1]:
+        lines.pop()
+    return len(lines), list(conllu_errors(lines))
+
+
+def file_errors(path: str, processes: int=1) -> Iterable[ConlluError]:
+    "the errors in a CoNLL-U file, checked in parts by processes, in the order of the file"
+    parts = file_parts(path, max(processes * PARTS_PER_PROCESS, os.path.getsize(path) // PART_BYTES))
+    check = partial(part_errors, path=path)
+    if processes > 1:
+        with multiprocessing.get_context('fork').Pool(processes) as pool:
+            yield from numbered_errors(pool.imap(check, parts))
+    else:
+        yield from numbered_errors(map(check, parts))
+
+
+def numbered_errors(parts: Iterable[tuple[int, list[ConlluError]]]) -> Iterable[ConlluError]:
+    "the errors of consecutive parts, with line numbers in the file"
+    offset = 0
+    for count, errors in parts:
+        for e in errors:
+            e.line += offset
+            yield e
+        offset += count
@@ -0,0 +1,160 @@
+# vectorized frequency tables: field values are integer-coded in batches and counted with numpy
+
+from typing import Iterable
+import numpy as np
+from trees import *
+from counting import count_keys
+
+BATCH_SIZE = 100000   # approximate number of wordlines coded and counted at a time
+MAX_KEY = 2**62       # combined row keys must stay below this to fit in int64
+
+
+class FieldCoder:
+    "integer codes of the values of one field, assigned in order of first occurrence"
+
+    def __init__(self):
+        self.codes = {}
+
+    def encode(self, values: list[str]) -> np.ndarray:
+        codes = self.codes
+        return np.fromiter((codes.setdefault(v, len(codes)) for v in values),
+                           dtype=np.int64, count=len(values))
+
+    def decoder(self) -> list[str]:
+        "the values indexed by their codes, to be called only when the coding is complete"
+        return list(self.codes)
+
+
+def code_matrix(coders: list[FieldCoder], columns: list[list[str]]) -> np.ndarray:
+    "one row of codes per wordline, one column per field"
+    return np.column_stack([coder.encode(column) for coder, column in zip(coders, columns)])
+
+
+def field_columns(fields: list[str], words: list[WordLine]) -> list[list[str]]:
+    return [[getattr(w, field) for w in words] for field in fields]
+
+
+def row_keys(matrix: np.ndarray):
+    "one integer key per row of a code matrix, None if the keys could overflow"
+    radices = (matrix.max(axis=0) + 1).tolist() if len(matrix) else []
+    size = 1
+    for r in radices:
+        size *= r
+    if size >= MAX_KEY:
+        return None
+    keys = np.zeros(len(matrix), dtype=np.int64)
+    for j, r in enumerate(radices):
+        keys = keys * r + matrix[:, j]
+    return keys
+
+
+def count_rows(matrix: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    "indices of the first occurrences of distinct rows and their counts, in order of occurrence"
+    if (keys := row_keys(matrix)) is None:
+        _, first, counts = np.unique(matrix, axis=0, return_index=True, return_counts=True)
+    else:
+        _, first, counts = np.unique(keys, return_index=True, return_counts=True)
+    order = np.argsort(first)
+    return first[order], counts[order]
+
+
+def batches(items: Iterable, size: int, weight=lambda x: 1) -> Iterable[list]:
+    "split a stream into lists whose total weight is about size"
+    batch = []
+    total = 0
+    for item in items:
+        batch.append(item)
+        total += weight(item)
+        if total >= size:
+            yield batch
+            batch = []
+            total = 0
+    if batch:
+        yield batch
+
+
+def add_counts(stats: dict, keys: Iterable, counts: Iterable[int]):
+    for key, count in zip(keys, counts):
+        stats[key] = stats.get(key, 0) + count
+
+
+def decode_statistics(coders: list[FieldCoder], stats: dict, ngrams=False) -> dict:
+    "replace field codes by field values in the keys of a frequency table"
+    values = [coder.decoder() for coder in coders]
+
+    def decode(codes):
+        return tuple(vals[c] for vals, c in zip(values, codes))
+
+    if ngrams:
+        return {tuple(decode(gram) for gram in key): count for key, count in stats.items()}
+    else:
+        return {decode(key): count for key, count in stats.items()}
+
+
+def coded_wordline_statistics(fields: list[str], wordlines: Iterable[WordLine],
+                              batch_size: int=BATCH_SIZE) -> dict:
+    "frequency table of a combination of fields, the same as wordline_statistics"
+    if not fields:
+        return wordline_statistics(fields, wordlines)
+    coders = [FieldCoder() for _ in fields]
+    stats = {}
+    for batch in batches(wordlines, batch_size):
+        matrix = code_matrix(coders, field_columns(fields, batch))
+        first, counts = count_rows(matrix)
+        add_counts(stats, map(tuple, matrix[first].tolist()), counts.tolist())
+    return decode_statistics(coders, stats)
+
+
+def coded_column_statistics(indices: list[int], rows: Iterable[list[str]],
+                            batch_size: int=BATCH_SIZE) -> dict:
+    "frequency table of a combination of columns in rows of split wordlines"
+    if not indices:
+        return count_keys(() for _ in rows)
+    coders = [FieldCoder() for _ in indices]
+    stats = {}
+    for batch in batches(rows, batch_size):
+        matrix = code_matrix(coders, [[row[i] for row in batch] for i in indices])
+        first, counts = count_rows(matrix)
+        add_counts(stats, map(tuple, matrix[first].tolist()), counts.tolist())
+    return decode_statistics(coders, stats)
+
+
+def ngram_starts(lengths: np.ndarray, n: int) -> np.ndarray:
+    """
+    start positions of n-grams in concatenated sentences of given lengths,
+    with len-n n-grams per sentence as in wordline_ngrams
+    """
+    offsets = np.cumsum(lengths) - lengths
+    nums = np.maximum(lengths - n, 0)
+    firsts = np.cumsum(nums) - nums
+    steps = np.arange(nums.sum()) - np.repeat(firsts, nums)
+    return np.repeat(offsets, nums) + steps
+
+
+def coded_ngram_statistics(n: int, fields: list[str], wordliness: Iterable[list[WordLine]],
+                           batch_size: int=BATCH_SIZE) -> dict:
+    """
+    frequency table of n-grams of field combinations inside sentences,
+    the same as wordline_ngram_statistics of wordline_ngrams
+    """
+    if not fields or n < 1:
+        return wordline_ngram_statistics(fields, wordline_ngrams(n, wordliness))
+    coders = [FieldCoder() for _ in fields]
+    stats = {}
+    for batch in batches(wordliness, batch_size, len):
+        lengths = np.array([len(ws) for ws in batch], dtype=np.int64)
+        starts = ngram_starts(lengths, n)
+        if not len(starts):
+            continue
+        matrix = code_matrix(coders, field_columns(fields, [w for ws in batch for w in ws]))
+        if (tokens := row_keys(matrix)) is None:
+            _, tokens = np.unique(matrix, axis=0, return_inverse=True)
+        _, tokens = np.unique(tokens.reshape(-1), return_inverse=True)  # compact token codes
+        grams = np.column_stack([tokens[starts + j] for j in range(n)])
+        first, counts = count_rows(grams)
+        positions = starts[first]
+        rows = [matrix[positions + j].tolist() for j in range(n)]
+        add_counts(stats,
+                   (tuple(map(tuple, gram)) for gram in zip(*rows)),
+                   counts.tolist())
+    return decode_statistics(coders, stats, ngrams=True)
@@ -4,7 +4,7 @@ from itertools import chain, repeat, islice
 from typing import Iterable
 from drawsvg import *
 
-from trees import read_wordlines
+from trees import read_wordlines, MATCH_MARK
 
 # default measures
 SPACE_LEN = 15
@@ -14,6 +14,7 @@ NORMAL_TEXT_SIZE = 16
 TINY_TEXT_SIZE = 10
 SCALE = 5
 ARC_BASE_YPOS = 30
+MATCH_COLOR = 'red'  # of the words marked by match_found_in_tree
 
 class VisualStanza:
   """class to visualize a CoNNL-U stanza; partly corresponding to Dep in the
@@ -24,7 +25,8 @@ class VisualStanza:
                  if wl.ID.isdigit()] # ignore tokens whose ID is not an int
 
     # token-wise info to be visualized (form + pos), cf. Dep's tokens
-    self.tokens = [({"form": wl.FORM, "pos": wl.POS}) for wl in wordlines] 
+    self.tokens = [({"form": wl.FORM, "pos": wl.POS, "match": MATCH_MARK in wl.MISC})
+                   for wl in wordlines] 
       
     # list of dependency relations: [((from,to), label)], cf. Dep's deps
     self.deprels = [
@@ -87,8 +89,9 @@ class VisualStanza:
     for (i,token) in enumerate(self.tokens):
       x = self.token_xpos(i)
       y = tot_h - 5
-      svg.append(Text(token["form"], NORMAL_TEXT_SIZE, x=x, y=y))
-      svg.append(Text(token["pos"], TINY_TEXT_SIZE, x=x, y=tot_h-20))
+      color = {"fill": MATCH_COLOR} if token["match"] else {}
+      svg.append(Text(token["form"], NORMAL_TEXT_SIZE, x=x, y=y, **color))
+      svg.append(Text(token["pos"], TINY_TEXT_SIZE, x=x, y=tot_h-20, **color))
 
     # draw deprels (arcs + labels)
     for ((src,trg),label) in self.deprels: